@@ -0,0 +1,59 @@
+"""Microbenchmark of the formatting of the tweets' dates
+
+Compares datetime.strptime() and strftime(), as the services used to
+format every tweet, against tweets.dates on the dates of the mocked
+twitter responses.
+
+Run it from the twitterapi directory:
+
+    python -m benchmarks.dates
+"""
+import datetime
+import json
+import pathlib
+import timeit
+
+from tweets import dates
+
+
+MOCKED_DATA_DIR = pathlib.Path(__file__).resolve().parent.parent.joinpath(
+    'tweets', 'tests', 'mocked_data'
+)
+DATE_FORMAT = '%-H:%M %p - %-d %b %Y'
+
+
+def load(filename):
+    return json.loads(MOCKED_DATA_DIR.joinpath(filename).read_bytes())
+
+
+def bench(name, fn, number):
+    seconds = min(timeit.repeat(fn, number=number, repeat=5))
+    print(f'  {name:<32}{seconds / number * 1e6:>10.1f} us')
+
+
+def main(number=200):
+    search = [
+        x['created_at'] for x in
+        load('twitter_search_api_mocked_data.json')['data']
+    ]
+    timeline = [
+        x['created_at'] for x in
+        load('twitter_user_timeline_api_mocked_data.json')
+    ]
+
+    for name, values, layout, parse in (
+        ('v2', search, dates.V2_FORMAT, dates.parse_v2),
+        ('v1.1', timeline, '%a %b %d %H:%M:%S +0000 %Y', dates.parse_v1),
+    ):
+        print(f'{len(values)} {name} dates')
+        bench('strptime + strftime', lambda: [
+            datetime.datetime.strptime(x, layout).strftime(DATE_FORMAT)
+            for x in values
+        ], number)
+        bench('tweets.dates', lambda: [
+            dates.format_date(parse(x)) for x in values
+        ], number)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Microbenchmark of the decoding of the upstream responses
+
+Compares parsing the mocked twitter responses through res.json() on
+every access, as the services used to, against parsing them once with
+the json module and with orjson, then the rendering of the formatted
+tweets by the JSONRenderer of rest_framework and by tweets.codec.
+
+Run it from the twitterapi directory:
+
+    python -m benchmarks.decode
+"""
+import json
+import os
+import pathlib
+import timeit
+
+import requests
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+MOCKED_DATA_DIR = pathlib.Path(__file__).resolve().parent.parent.joinpath(
+    'tweets', 'tests', 'mocked_data'
+)
+FIXTURES = (
+    'twitter_search_api_mocked_data.json',
+    'twitter_user_timeline_api_mocked_data.json',
+    'twitter_tweets_api_mocked_data.json',
+)
+
+
+def make_response(body):
+    res = requests.Response()
+    res._content = body
+    res.status_code = 200
+    res.encoding = 'utf-8'
+    return res
+
+
+def bench(name, fn, number):
+    seconds = min(timeit.repeat(fn, number=number, repeat=5))
+    print(f'  {name:<32}{seconds / number * 1e6:>10.1f} us')
+
+
+def main(number=200):
+    for fixture in FIXTURES:
+        body = MOCKED_DATA_DIR.joinpath(fixture).read_bytes()
+        res = make_response(body)
+        print(f'{fixture} ({len(body) / 1024:.0f} KiB)')
+
+        # the search service used to parse the body 4 times
+        bench('res.json() x4', lambda: [res.json() for _ in range(4)], number)
+        bench('res.json() x1', res.json, number)
+        bench('json.loads(bytes)', lambda: json.loads(body), number)
+        if orjson is not None:
+            bench('orjson.loads(bytes)', lambda: orjson.loads(body), number)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'twitterapi.settings')
+    import django
+    django.setup()
+
+    from rest_framework.renderers import JSONRenderer
+    from tweets.renderers import FastJSONRenderer
+    from tweets.services import TwitterSearchAPIService
+    from tweets.tests.utils import mocked_twitter_api
+
+    service = TwitterSearchAPIService(hashtag='python', count=30)
+    service._process_response(
+        mocked_twitter_api(TwitterSearchAPIService.RECENT_SEARCH_API)
+    )
+    tweets = [x.to_dict() for x in service.get_tweets()] * 10
+    print(f'rendering {len(tweets)} formatted tweets')
+    bench('JSONRenderer', lambda: JSONRenderer().render(tweets), number)
+    bench('FastJSONRenderer', lambda: FastJSONRenderer().render(tweets),
+          number)
+
+
+if __name__ == '__main__':
+    main()
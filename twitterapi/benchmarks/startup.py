@@ -0,0 +1,81 @@
+"""Startup and per-request overhead of the settings profiles
+
+Every profile is started in fresh interpreters, which report the time
+taken by the imports and django.setup() up to the first request, the
+number of modules loaded, and the time django spends on requests
+answered from the response cache, with the upstream calls mocked.
+
+Run it from the twitterapi directory:
+
+    python -m benchmarks.startup
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+PROFILES = ('full', 'api')
+
+CHILD = '''
+import json
+import os
+import sys
+import time
+
+started_at = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'twitterapi.settings')
+import django
+from django.core.handlers.wsgi import WSGIHandler
+django.setup()
+handler = WSGIHandler()
+
+from unittest import mock
+from django.test import Client
+from tweets.tests.utils import mocked_twitter_api
+
+client = Client()
+with mock.patch('requests.Session.get', side_effect=mocked_twitter_api):
+    client.get('/hashtags/python')
+    startup = time.perf_counter() - started_at
+
+    requests = int(sys.argv[1])
+    started_at = time.perf_counter()
+    for _ in range(requests):
+        client.get('/hashtags/python')
+    request = (time.perf_counter() - started_at) / requests
+
+print(json.dumps({
+    'startup': startup,
+    'modules': len(sys.modules),
+    'request': request,
+}))
+'''
+
+
+def run(profile, requests):
+    env = dict(os.environ, DJANGO_SETTINGS_PROFILE=profile)
+    out = subprocess.run(
+        [sys.executable, '-c', CHILD, str(requests)],
+        env=env,
+        check=True,
+        stdout=subprocess.PIPE
+    ).stdout
+    return json.loads(out)
+
+
+def main(runs=5, requests=500):
+    print(f'{"profile":<10}{"startup":>12}{"modules":>10}{"request":>12}')
+    for profile in PROFILES:
+        results = [run(profile, requests) for _ in range(runs)]
+        startup = statistics.median(x['startup'] for x in results)
+        request = statistics.median(x['request'] for x in results)
+        print(
+            f'{profile:<10}{startup * 1e3:>10.0f}ms'
+            f'{results[0]["modules"]:>10}{request * 1e6:>10.0f}us'
+        )
+
+
+if __name__ == '__main__':
+    main()
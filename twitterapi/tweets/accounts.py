@@ -0,0 +1,95 @@
+"""Authors of the tweets shared across the responses
+
+The names of an author rarely change, the Account of an author is kept
+by id and handed out again as long as its name and username are the
+same, so that every tweet of one author shares one Account in memory,
+whichever response or service the tweet came from.
+
+With RESOLVE_AUTHORS the recent search no longer expands the authors of
+the tweets, the cached ones are resolved locally and only the others
+are fetched through the users lookup api.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from tweets.backends import configured_by
+from tweets.entities import Account
+
+
+class AccountCache:
+    """Bounded cache of the accounts by id, the least recently used
+       evicted first
+
+       :param ttl: seconds an account is resolved locally before it has
+                   to be fetched again
+    """
+
+    def __init__(self, max_entries=10000, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def intern(self, id, fullname, username):
+        """Return the Account of an author seen upstream"""
+        with self._lock:
+            item = self._data.get(id)
+            account = item and item[0]
+            # a renamed author gets a new account, the one shared by the
+            # tweets already built is left as it is
+            if account is None or account.fullname != fullname or \
+                    account.username != username:
+                account = Account(id, fullname, username)
+            self._data[id] = (account, time.monotonic() + self.ttl)
+            self._data.move_to_end(id)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+        return account
+
+    def get_many(self, ids):
+        """Return the accounts of the ids that are still fresh"""
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for id in ids:
+                item = self._data.get(id)
+                if item is not None and item[1] > now:
+                    found[id] = item[0]
+                    self._data.move_to_end(id)
+        return found
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+@configured_by('TWEETS_ACCOUNT_CACHE')
+def get_account_cache():
+    """Return the account cache configured by settings.TWEETS_ACCOUNT_CACHE
+
+    :return: None when the accounts are not interned
+    """
+    conf = settings.TWEETS_ACCOUNT_CACHE
+    if not conf.get('MAX_ENTRIES'):
+        return None
+    return AccountCache(
+        max_entries=conf['MAX_ENTRIES'],
+        ttl=conf.get('TTL', 3600)
+    )
+
+
+def intern_account(id, fullname, username):
+    """Return the shared Account of an author, a new one when disabled"""
+    account_cache = get_account_cache()
+    if account_cache is None:
+        return Account(id, fullname, username)
+    return account_cache.intern(id, fullname, username)
+
+
+def resolves_authors():
+    """Whether the search resolves the cached authors locally"""
+    return bool(settings.TWEETS_ACCOUNT_CACHE.get('RESOLVE_AUTHORS')) and \
+        get_account_cache() is not None
@@ -0,0 +1,190 @@
+"""Backends of the state the tweets features keep
+
+The response cache, the rate limits, the hot keys, the counts, the
+stream buffers and the single flight locks each keep their state either
+in the memory of the process or in one of the django CACHES, shared by
+the workers. Each feature names its backend in its settings, out of its
+BACKENDS or as a dotted path, and is built again when they change.
+"""
+import functools
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.signals import setting_changed
+from django.utils.module_loading import import_string
+
+
+class LRUBackend:
+    """In-process cache backend with LRU eviction"""
+
+    def __init__(self, max_entries=1024, **kwargs):
+        self._max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key, now):
+        item = self._data.get(key)
+        if item is None:
+            return None
+
+        value, expires_at = item
+        if expires_at <= now:
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    def get(self, key):
+        with self._lock:
+            return self._get(key, time.monotonic())
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        with self._lock:
+            found = {x: self._get(x, now) for x in keys}
+        return {k: v for k, v in found.items() if v is not None}
+
+    def set(self, key, value, timeout):
+        self.set_many({key: value}, timeout)
+
+    def set_many(self, values, timeout):
+        expires_at = time.monotonic() + timeout
+        with self._lock:
+            for key, value in values.items():
+                self._data[key] = (value, expires_at)
+                self._data.move_to_end(key)
+            while len(self._data) > self._max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class DjangoCache:
+    """State shared by the workers through one of the django CACHES
+
+       The keys are prefixed, the features sharing an alias with each
+       other or with the rest of the site do not collide.
+    """
+    prefix = 'tweets:'
+
+    def __init__(self, alias='default', prefix=None, **kwargs):
+        from django.core.cache import caches
+        self._cache = caches[alias]
+        self._prefix = prefix or self.prefix
+
+
+class DjangoCacheBackend(DjangoCache):
+    """Cache backend built on one of the configured django CACHES
+
+       A django cache cannot list its keys, so they live in a namespace
+       of the prefix: clear() starts a new namespace and the keys of the
+       previous one expire, instead of clearing the whole alias. The
+       namespace is read along with the keys, which costs no round trip
+       while it does not change.
+    """
+
+    def __init__(self, alias='default', prefix=None, **kwargs):
+        super().__init__(alias, prefix)
+        self._namespace_key = f'{self._prefix}namespace'
+        # namespace of the last read
+        self._namespace = None
+
+    def _get_namespace(self):
+        namespace = self._cache.get(self._namespace_key)
+        if namespace is None:
+            # never used, or evicted which clears the keys as well
+            self._cache.add(self._namespace_key, uuid.uuid4().hex[:12], None)
+            namespace = self._cache.get(self._namespace_key)
+        self._namespace = namespace
+        return namespace
+
+    def _make_key(self, namespace, key):
+        return f'{self._prefix}{namespace}:{key}'
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        namespace = self._namespace or self._get_namespace()
+        found = self._cache.get_many(
+            [self._namespace_key] +
+            [self._make_key(namespace, x) for x in keys]
+        )
+        if found.pop(self._namespace_key, None) != namespace:
+            # cleared by another process since the last read
+            namespace = self._get_namespace()
+            found = self._cache.get_many(
+                [self._make_key(namespace, x) for x in keys]
+            )
+        size = len(self._make_key(namespace, ''))
+        return {key[size:]: value for key, value in found.items()}
+
+    def set(self, key, value, timeout):
+        self.set_many({key: value}, timeout)
+
+    def set_many(self, values, timeout):
+        namespace = self._get_namespace()
+        self._cache.set_many(
+            {self._make_key(namespace, k): v for k, v in values.items()},
+            timeout
+        )
+
+    def delete(self, key):
+        self._cache.delete(self._make_key(self._get_namespace(), key))
+
+    def clear(self):
+        self._cache.set(self._namespace_key, uuid.uuid4().hex[:12], None)
+        self._namespace = None
+
+
+def load_backend(conf, backends, name='BACKEND', default=None):
+    """Build the backend of a feature out of its settings
+
+    :param backends: backend classes by name, the other names are dotted
+                     paths to a class
+    :param name: key of conf naming the backend, built with the options
+                 of conf['OPTIONS']
+    :return: None when conf names no backend
+    """
+    backend_cls = conf.get(name, default)
+    if not backend_cls:
+        return None
+    if backend_cls in backends:
+        backend_cls = backends[backend_cls]
+    else:
+        backend_cls = import_string(backend_cls)
+    return backend_cls(**conf.get('OPTIONS', {}))
+
+
+def configured_by(*names):
+    """Build the object of the decorated factory once per configuration
+
+    The object, None for a disabled feature, is built by the first call
+    and again after one of the settings names changes, e.g. in the tests.
+    """
+    def decorator(factory):
+        built = []
+
+        @functools.wraps(factory)
+        def get():
+            if not built:
+                built.append(factory())
+            return built[0]
+
+        def reset(**kwargs):
+            if kwargs['setting'] in names:
+                built.clear()
+
+        get.reset = reset
+        setting_changed.connect(reset)
+        return get
+    return decorator
@@ -0,0 +1,235 @@
+"""Fan-out of the batch api
+
+The items of a batch are grouped by key so that a hashtag or a user
+asked several times is fetched once with the largest limit. The groups
+are fetched concurrently through TwitterServices, and therefore through
+the response cache and the single flight, and each item gets either its
+page of tweets or the error of its group.
+
+The first pages of the hashtags are fetched together with OR queries,
+see TwitterServices.get_hashtag_pages(), unless PACK_HASHTAGS is off.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from tweets.services import TwitterPackedSearchAPIService, TwitterServices
+from tweets.warmer import track_request
+
+
+# search_by of the item types
+TYPES = {
+    'hashtag': TwitterServices.HASHTAG,
+    'user': TwitterServices.USER,
+}
+
+# threads fetching the groups of the batch requests
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.TWEETS_BATCH['MAX_CONCURRENCY'],
+                    thread_name_prefix='tweets-batch'
+                )
+    return _executor
+
+
+class Result:
+    """Page of tweets or error of one item of a batch"""
+    __slots__ = ('index', 'item', 'tweets', 'cursor', 'error')
+
+    def __init__(self, index, item, tweets=(), cursor=None, error=None):
+        self.index = index
+        self.item = item
+        self.tweets = tweets
+        self.cursor = cursor
+        self.error = error
+
+
+class Group:
+    """Items of a batch asking for the same key and cursor"""
+    __slots__ = ('search_by', 'key', 'cursor', 'count', 'items')
+
+    def __init__(self, search_by, key, cursor):
+        self.search_by = search_by
+        self.key = key
+        self.cursor = cursor
+        self.count = 0
+        # (index, item) of the items of the group
+        self.items = []
+
+    def get_kwargs(self):
+        key_name = TwitterServices.ENDPOINTS[self.search_by][1]
+        return {
+            'search_by': self.search_by,
+            'count': self.count,
+            'cursor': self.cursor,
+            key_name: self.key,
+        }
+
+    def get_results(self, page=None, error=None):
+        """Slice the page of the group for each of its items
+
+        :param page: the tweets and the cursor fetched with the largest
+                     limit of the group
+        :param error: exception raised while fetching the page
+        """
+        if error is not None:
+            return [Result(i, item, error=error) for i, item in self.items]
+
+        results = []
+        tweets, cursor = page
+        for index, item in self.items:
+            limit = item.get('limit', 30)
+            if len(tweets) > limit:
+                # the next page of a smaller limit starts right after it
+                results.append(
+                    Result(index, item, tweets[:limit], tweets[limit - 1].id)
+                )
+            else:
+                results.append(Result(index, item, tweets, cursor))
+        return results
+
+
+def group_items(items):
+    """Group the validated items by search_by, key and cursor"""
+    groups = {}
+    for index, item in enumerate(items):
+        search_by = TYPES[item['type']]
+        cursor = item.get('cursor')
+        # hashtags and screen names are both case insensitive on twitter
+        group_key = (search_by, item['key'].lower(), cursor)
+        group = groups.get(group_key)
+        if group is None:
+            group = groups[group_key] = Group(search_by, item['key'], cursor)
+        group.count = max(group.count, item.get('limit', 30))
+        group.items.append((index, item))
+    return list(groups.values())
+
+
+def track_groups(groups):
+    """Count the first pages for the warmer like the other views"""
+    for group in groups:
+        if not group.cursor:
+            kwargs = group.get_kwargs()
+            track_request(kwargs.pop('search_by'), group.count, kwargs)
+
+
+def pack_groups(groups):
+    """Split the groups between the packed hashtags and the others
+
+    :return: the lists of groups fetched with one query each and the
+             groups fetched on their own
+    """
+    hashtags = {}
+    others = []
+    for group in groups:
+        if group.search_by == TwitterServices.HASHTAG and not group.cursor:
+            hashtags[group.key.lower()] = group
+        else:
+            others.append(group)
+
+    if len(hashtags) < 2 or \
+            not settings.TWEETS_BATCH.get('PACK_HASHTAGS', True):
+        return [], groups
+    packs = [
+        [hashtags[x] for x in pack]
+        for pack in TwitterPackedSearchAPIService.pack(list(hashtags))
+    ]
+    return packs, others
+
+
+def _get_packed_results(pack, pages=None, error=None):
+    results = []
+    for group in pack:
+        if error is not None:
+            results.extend(group.get_results(error=error))
+        else:
+            results.extend(group.get_results(pages[group.key.lower()]))
+    return results
+
+
+def _fetch_packed(pack):
+    try:
+        pages = TwitterServices.get_hashtag_pages(
+            {x.key.lower(): x.count for x in pack}
+        )
+    except Exception as e:
+        return _get_packed_results(pack, error=e)
+    return _get_packed_results(pack, pages)
+
+
+def _fetch(group):
+    try:
+        page = TwitterServices.get_page(**group.get_kwargs())
+    except Exception as e:
+        return group.get_results(error=e)
+    return group.get_results(page)
+
+
+def iter_results(items):
+    """Fetch the items concurrently and yield their results
+
+    The results are yielded as soon as their group is fetched, the index
+    of the item in the request tells which one it is.
+    """
+    groups = group_items(items)
+    track_groups(groups)
+    packs, groups = pack_groups(groups)
+
+    executor = _get_executor()
+    futures = [executor.submit(_fetch_packed, pack) for pack in packs]
+    futures += [executor.submit(_fetch, group) for group in groups]
+    for future in as_completed(futures):
+        yield from future.result()
+
+
+def get_results(items):
+    """Fetch the items concurrently, return the results in their order"""
+    results = list(iter_results(items))
+    results.sort(key=lambda x: x.index)
+    return results
+
+
+async def aget_results(items):
+    """Same as get_results() through the async services"""
+    groups = group_items(items)
+    await sync_to_async(track_groups)(groups)
+    packs, groups = pack_groups(groups)
+    semaphore = asyncio.Semaphore(settings.TWEETS_BATCH['MAX_CONCURRENCY'])
+
+    async def fetch_packed(pack):
+        async with semaphore:
+            try:
+                pages = await TwitterServices.aget_hashtag_pages(
+                    {x.key.lower(): x.count for x in pack}
+                )
+            except Exception as e:
+                return _get_packed_results(pack, error=e)
+            return _get_packed_results(pack, pages)
+
+    async def fetch(group):
+        async with semaphore:
+            try:
+                page = await TwitterServices.aget_page(**group.get_kwargs())
+            except Exception as e:
+                return group.get_results(error=e)
+            return group.get_results(page)
+
+    results = []
+    for group_results in await asyncio.gather(
+        *map(fetch_packed, packs),
+        *map(fetch, groups)
+    ):
+        results.extend(group_results)
+    results.sort(key=lambda x: x.index)
+    return results
@@ -0,0 +1,79 @@
+"""Ring buffers of the hashtags ingested from the filtered stream
+
+The ingester of tweets.ingest writes the newest tweets of each hashtag
+of TWEETS_INGEST to a buffer shared with the workers, the first pages
+of these hashtags are answered out of the buffers without calling
+twitter. The counts of the buffered tweets are the ones they were
+ingested with.
+"""
+from django.conf import settings
+
+from tweets import backends
+from tweets.backends import LRUBackend, configured_by, load_backend
+
+
+class LocalBackend(LRUBackend):
+    """Buffers kept in the memory of the process, e.g. for the tests"""
+
+
+class DjangoCacheBackend(backends.DjangoCacheBackend):
+    """Buffers shared with the workers through the django cache"""
+    prefix = 'tweets-ingest:'
+
+
+BACKENDS = {
+    'local': LocalBackend,
+    'django': DjangoCacheBackend,
+}
+
+
+class HashtagBuffers:
+    """Newest tweets of the ingested hashtags, as cache entries
+
+       The ingester writes the buffer of every hashtag again each
+       FLUSH_INTERVAL seconds, a buffer not written for TTL seconds is
+       gone and its hashtag is fetched upstream again.
+
+       :param size: tweets kept per hashtag
+    """
+
+    def __init__(self, backend, size=300, ttl=60):
+        self.backend = backend
+        self.size = size
+        self.ttl = ttl
+
+    def get_entry(self, hashtag):
+        return self.backend.get(hashtag.lower())
+
+    def set_entry(self, hashtag, entry):
+        self.backend.set(hashtag.lower(), entry, self.ttl)
+
+    def get_page(self, hashtag, count):
+        """Return the page of an ingested hashtag and its cursor
+
+        :return: None when the hashtag has no buffer covering count
+        """
+        entry = self.get_entry(hashtag)
+        if entry is None or not entry.covers(count):
+            return None
+        return entry.get_page(count)
+
+    def clear(self):
+        self.backend.clear()
+
+
+@configured_by('TWEETS_INGEST')
+def get_hashtag_buffers():
+    """Return the buffers configured by settings.TWEETS_INGEST
+
+    :return: None when no hashtag is ingested
+    """
+    conf = settings.TWEETS_INGEST
+    backend = load_backend(conf, BACKENDS)
+    if backend is None:
+        return None
+    return HashtagBuffers(
+        backend,
+        size=conf.get('SIZE', 300),
+        ttl=conf.get('TTL', 60)
+    )
@@ -0,0 +1,317 @@
+import asyncio
+import math
+import pickle
+import threading
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from tweets import backends
+from tweets.backends import LRUBackend, configured_by, load_backend
+from tweets.exceptions import RateLimitExceeded
+
+
+class DjangoCacheBackend(backends.DjangoCacheBackend):
+    """Cache backend built on one of the configured django CACHES"""
+    prefix = 'tweets-cache:'
+
+
+class RedisBackend:
+    """Cache backend that stores pickled entries in redis"""
+
+    def __init__(self, url='redis://localhost:6379/0', prefix='tweets:',
+                 **kwargs):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured(
+                'The redis package is required by RedisBackend'
+            )
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get(self, key):
+        data = self._client.get(self._prefix + key)
+        return None if data is None else pickle.loads(data)
+
+    def set(self, key, value, timeout):
+        self._client.set(
+            self._prefix + key,
+            pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+            ex=max(1, math.ceil(timeout))
+        )
+
+    def delete(self, key):
+        self._client.delete(self._prefix + key)
+
+    def clear(self):
+        keys = list(self._client.scan_iter(f'{self._prefix}*'))
+        if keys:
+            self._client.delete(*keys)
+
+
+# how a request can be answered from the cached entry
+HIT = 'hit'
+STALE = 'stale'
+MISS = 'miss'
+
+BACKENDS = {
+    'lru': LRUBackend,
+    'django': DjangoCacheBackend,
+    'redis': RedisBackend,
+}
+
+
+class CacheEntry:
+    """Tweets fetched for one key and the count they were fetched with"""
+    __slots__ = ('tweets', 'count', 'fetched_at')
+
+    def __init__(self, tweets, count, fetched_at=None):
+        self.tweets = tweets
+        self.count = count
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+
+    def __getstate__(self):
+        return (self.tweets, self.count, self.fetched_at)
+
+    def __setstate__(self, state):
+        self.tweets, self.count, self.fetched_at = state
+
+    @property
+    def age(self):
+        return time.time() - self.fetched_at
+
+    @property
+    def exhausted(self):
+        """Whether upstream returned fewer tweets than it was asked for"""
+        return len(self.tweets) < self.count
+
+    def covers(self, count):
+        """Whether the entry can answer a request of the given count
+
+        An exhausted entry has already returned everything upstream had,
+        so it covers any count.
+        """
+        return count <= self.count or self.exhausted
+
+    def get_page(self, count):
+        """Return the first count tweets and the cursor of the next page
+
+        The cursor is the id of the last returned tweet, the next page
+        asks upstream for the tweets older than it.
+        """
+        tweets = self.tweets[:count]
+        has_more = len(self.tweets) > count or not self.exhausted
+        if len(tweets) < count or not has_more:
+            return tweets, None
+        return tweets, tweets[-1].id
+
+
+class ResponseCache:
+    """Cache of the tweets returned by TwitterServices
+
+       Entries are keyed on (endpoint, key) and remember the count they
+       were fetched with, a request with a smaller limit is sliced out of
+       a larger entry. Entries older than the endpoint TTL are still
+       served for STALE_TTL seconds while one background refresh runs.
+
+       In incremental mode the refresh of a stale entry is given its
+       tweets, only the newer tweets are then fetched and the counts of
+       the kept ones are looked up once older than METRICS_MAX_AGE.
+    """
+
+    def __init__(self, backend, ttl, stale_ttl=0, incremental=False,
+                 metrics_max_age=0):
+        self.backend = backend
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.incremental = incremental
+        self.metrics_max_age = metrics_max_age
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(endpoint, key):
+        # hashtags and screen names are both case insensitive on twitter
+        return f'{endpoint}:{key.lower()}'
+
+    @staticmethod
+    def normalize_count(count):
+        """Round the count up so that nearby limits share one entry"""
+        # twitter never returns less than 10 tweets per call anyway
+        return max(10, int(math.ceil(count / 10.0)) * 10)
+
+    def get_ttl(self, endpoint):
+        return self.ttl.get(endpoint, self.ttl.get('default', 0))
+
+    def get_entry(self, endpoint, key):
+        return self.backend.get(self.make_key(endpoint, key))
+
+    def set_entry(self, endpoint, key, entry):
+        timeout = self.get_ttl(endpoint) + self.stale_ttl
+        self.backend.set(self.make_key(endpoint, key), entry, timeout)
+
+    def check(self, endpoint, entry, count):
+        """Decide how to answer a request of count tweets from entry
+
+        :return: a tuple of HIT, STALE or MISS and the count to fetch
+        """
+        ttl = self.get_ttl(endpoint)
+        if entry is None:
+            return MISS, count
+        if not entry.covers(count):
+            # fetch enough to keep answering the larger limit as well
+            return MISS, max(count, entry.count)
+        if entry.age < ttl:
+            return HIT, entry.count
+        if entry.age < ttl + self.stale_ttl:
+            return STALE, entry.count
+        return MISS, entry.count
+
+    def fetch(self, endpoint, key, count, fetch, previous=None):
+        """Fetch a fresh entry upstream and store it
+
+        :param previous: tweets of the entry refreshed incrementally
+        """
+        count = self.normalize_count(count)
+        if previous is not None:
+            entry = CacheEntry(fetch(count, previous), count)
+        else:
+            entry = CacheEntry(fetch(count), count)
+        self.set_entry(endpoint, key, entry)
+        return entry
+
+    def get_previous(self, entry):
+        """Tweets a stale entry is refreshed from in incremental mode"""
+        return entry.tweets if self.incremental else None
+
+    def get_page(self, endpoint, key, count, fetch):
+        """Return count tweets from the cache or fetch them
+
+        :param fetch: callable that takes a count and returns the tweets,
+                      in incremental mode the previous tweets are also
+                      passed when refreshing a stale entry
+        :return: the tweets and the cursor of the next page
+        """
+        if self.get_ttl(endpoint) <= 0:
+            return CacheEntry(fetch(count), count).get_page(count)
+
+        entry = self.get_entry(endpoint, key)
+        state, fetch_count = self.check(endpoint, entry, count)
+        if state == MISS:
+            try:
+                entry = self.fetch(endpoint, key, fetch_count, fetch)
+            except RateLimitExceeded:
+                # a shorter page beats no page while twitter is limited
+                if entry is None:
+                    raise
+        elif state == STALE:
+            self.refresh_in_background(
+                endpoint, key, fetch_count, fetch, self.get_previous(entry)
+            )
+
+        return entry.get_page(count)
+
+    def _start_refresh(self, cache_key):
+        with self._lock:
+            if cache_key in self._refreshing:
+                return False
+            self._refreshing.add(cache_key)
+            return True
+
+    def _end_refresh(self, cache_key):
+        with self._lock:
+            self._refreshing.discard(cache_key)
+
+    def refresh_in_background(self, endpoint, key, count, fetch,
+                              previous=None):
+        """Refresh an entry in a thread unless a refresh already runs"""
+        cache_key = self.make_key(endpoint, key)
+        if not self._start_refresh(cache_key):
+            return None
+
+        def refresh():
+            try:
+                self.fetch(endpoint, key, count, fetch, previous)
+            except RateLimitExceeded as e:
+                logging.warning(f'Failed to refresh {cache_key}: {e}')
+            except Exception as e:
+                logging.exception(f'Failed to refresh {cache_key}: {e}')
+            finally:
+                self._end_refresh(cache_key)
+
+        thread = threading.Thread(target=refresh, daemon=True)
+        thread.start()
+        return thread
+
+    async def afetch(self, endpoint, key, count, fetch, previous=None):
+        """Same as fetch() with a coroutine function fetch"""
+        count = self.normalize_count(count)
+        if previous is not None:
+            entry = CacheEntry(await fetch(count, previous), count)
+        else:
+            entry = CacheEntry(await fetch(count), count)
+        await sync_to_async(self.set_entry)(endpoint, key, entry)
+        return entry
+
+    async def aget_page(self, endpoint, key, count, fetch):
+        """Same as get_page() with a coroutine function fetch
+
+        The backend is called from a thread so that the django and redis
+        backends do not block the event loop.
+        """
+        if self.get_ttl(endpoint) <= 0:
+            return CacheEntry(await fetch(count), count).get_page(count)
+
+        entry = await sync_to_async(self.get_entry)(endpoint, key)
+        state, fetch_count = self.check(endpoint, entry, count)
+        if state == MISS:
+            try:
+                entry = await self.afetch(endpoint, key, fetch_count, fetch)
+            except RateLimitExceeded:
+                if entry is None:
+                    raise
+        elif state == STALE:
+            self.arefresh_in_background(
+                endpoint, key, fetch_count, fetch, self.get_previous(entry)
+            )
+
+        return entry.get_page(count)
+
+    def arefresh_in_background(self, endpoint, key, count, fetch,
+                               previous=None):
+        """Refresh an entry in a task unless a refresh already runs"""
+        cache_key = self.make_key(endpoint, key)
+        if not self._start_refresh(cache_key):
+            return None
+
+        async def refresh():
+            try:
+                await self.afetch(endpoint, key, count, fetch, previous)
+            except RateLimitExceeded as e:
+                logging.warning(f'Failed to refresh {cache_key}: {e}')
+            except Exception as e:
+                logging.exception(f'Failed to refresh {cache_key}: {e}')
+            finally:
+                self._end_refresh(cache_key)
+
+        return asyncio.ensure_future(refresh())
+
+    def clear(self):
+        self.backend.clear()
+
+
+@configured_by('TWEETS_CACHE')
+def get_response_cache():
+    """Return the response cache configured by settings.TWEETS_CACHE"""
+    conf = settings.TWEETS_CACHE
+    return ResponseCache(
+        load_backend(conf, BACKENDS),
+        ttl=conf['TTL'],
+        stale_ttl=conf.get('STALE_TTL', 0),
+        incremental=conf.get('INCREMENTAL', False),
+        metrics_max_age=conf.get('METRICS_MAX_AGE', 0)
+    )
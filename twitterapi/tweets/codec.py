@@ -0,0 +1,31 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(data):
+    """Decode JSON straight from bytes, through orjson when installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(data):
+    """Encode data to compact UTF-8 JSON, the same way as rest_framework
+
+    orjson is used when installed, values it can't encode fall back to
+    the json module.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(data)
+        except TypeError:
+            pass
+    return json.dumps(
+        data,
+        ensure_ascii=False,
+        separators=(',', ':')
+    ).encode('utf-8')
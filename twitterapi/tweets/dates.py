@@ -0,0 +1,89 @@
+"""Parsing and formatting of the tweets' dates
+
+Twitter sends the dates in two fixed layouts, they are parsed by slicing
+instead of datetime.strptime() which is much slower. The public format
+does not depend on the platform's strftime() (%-H and %-d are glibc
+extensions) nor on the locale, and is memoized since the tweets of one
+response are usually close in time.
+"""
+import datetime
+import functools
+
+
+# distinct dates kept by the memoized parsers and formatter
+CACHE_SIZE = 4096
+
+MONTHS = (
+    'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+    'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'
+)
+MONTH_NUMBERS = {name: i for i, name in enumerate(MONTHS, 1)}
+
+V2_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+V1_FORMAT = '%a %b %d %H:%M:%S %z %Y'
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def parse_v2(value):
+    """Parse a date of the v2 API, e.g. "2020-09-28T10:00:00.000Z"
+
+    :return: a naive datetime in UTC
+    """
+    if len(value) != 24 or value[-1] != 'Z':
+        return datetime.datetime.strptime(value, V2_FORMAT)
+
+    return datetime.datetime(
+        int(value[0:4]),
+        int(value[5:7]),
+        int(value[8:10]),
+        int(value[11:13]),
+        int(value[14:16]),
+        int(value[17:19]),
+        int(value[20:23]) * 1000
+    )
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def parse_v1(value):
+    """Parse a date of the v1.1 API, e.g. "Wed Sep 23 17:08:34 +0000 2020"
+
+    :return: a naive datetime in UTC
+    """
+    if len(value) != 30:
+        created_at = datetime.datetime.strptime(value, V1_FORMAT)
+        return created_at.astimezone(datetime.timezone.utc) \
+            .replace(tzinfo=None)
+
+    created_at = datetime.datetime(
+        int(value[26:30]),
+        MONTH_NUMBERS[value[4:7]],
+        int(value[8:10]),
+        int(value[11:13]),
+        int(value[14:16]),
+        int(value[17:19])
+    )
+
+    # twitter always sends +0000, any other offset is still honored
+    offset = value[20:25]
+    if offset != '+0000':
+        minutes = int(offset[1:3]) * 60 + int(offset[3:5])
+        if offset[0] == '-':
+            minutes = -minutes
+        created_at -= datetime.timedelta(minutes=minutes)
+    return created_at
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _format(year, month, day, hour, minute):
+    meridiem = 'AM' if hour < 12 else 'PM'
+    return f'{hour}:{minute:02d} {meridiem} - {day} {MONTHS[month - 1]} {year}'
+
+
+def format_date(value):
+    """Format a datetime as strftime('%-H:%M %p - %-d %b %Y') in C locale
+
+    e.g. "17:08 PM - 23 Sep 2020". The seconds are not part of the
+    format, so the results are memoized per minute.
+    """
+    return _format(value.year, value.month, value.day, value.hour,
+                   value.minute)
@@ -0,0 +1,240 @@
+import heapq
+import zlib
+from operator import attrgetter
+
+from tweets.dates import format_date, parse_v1, parse_v2
+
+
+# fields of the tweets of the public response, in their order
+FIELDS = ('account', 'date', 'hashtags', 'likes', 'replies', 'retweets',
+          'text')
+
+# public_metrics of the v2 tweets fetched without them
+NO_METRICS = {'like_count': 0, 'reply_count': 0, 'retweet_count': 0}
+
+
+class Account:
+    """Author of a tweet"""
+    __slots__ = ('id', 'fullname', 'username')
+
+    def __init__(self, id, fullname, username):
+        self.id = id
+        self.fullname = fullname
+        self.username = username
+
+    def __getstate__(self):
+        return (self.id, self.fullname, self.username)
+
+    def __setstate__(self, state):
+        self.id, self.fullname, self.username = state
+
+    def __eq__(self, other):
+        if not isinstance(other, Account):
+            return NotImplemented
+        return self.__getstate__() == other.__getstate__()
+
+    def __repr__(self):
+        return f'<Account {self.id} @{self.username}>'
+
+    @classmethod
+    def from_v2(cls, user):
+        """Build the account out of a user of the v2 API"""
+        return cls(user['id'], user['name'], user['username'])
+
+    @classmethod
+    def from_v1(cls, user):
+        """Build the account out of a user of the v1.1 API"""
+        return cls(user['id_str'], user['name'], user['screen_name'])
+
+    def to_dict(self):
+        return {
+            'fullname': self.fullname,
+            'href': f'/{self.username}',
+            'id': self.id
+        }
+
+
+class Tweet:
+    """Tweet normalized out of the v2 or the v1.1 APIs
+
+       Only the fields of the public response are kept, the raw upstream
+       payload can be dropped as soon as the tweet is built. The id is
+       always a string and the hashtags are stored without the '#'.
+       metrics_at is the time the counts were fetched at.
+
+       The tweets fetched for a selection of fields only carry those,
+       e.g. account is None when the author was not asked for.
+    """
+    __slots__ = (
+        'id', 'account', 'created_at', 'hashtags',
+        'likes', 'replies', 'retweets', 'text', 'metrics_at'
+    )
+
+    def __init__(self, id, account, created_at, hashtags=(), likes=0,
+                 replies=0, retweets=0, text='', metrics_at=0):
+        self.id = id
+        self.account = account
+        self.created_at = created_at
+        self.hashtags = hashtags
+        self.likes = likes
+        self.replies = replies
+        self.retweets = retweets
+        self.text = text
+        self.metrics_at = metrics_at
+
+    def __getstate__(self):
+        return (
+            self.id, self.account, self.created_at, self.hashtags,
+            self.likes, self.replies, self.retweets, self.text,
+            self.metrics_at
+        )
+
+    def __setstate__(self, state):
+        (self.id, self.account, self.created_at, self.hashtags,
+         self.likes, self.replies, self.retweets, self.text,
+         self.metrics_at) = state
+
+    def __eq__(self, other):
+        if not isinstance(other, Tweet):
+            return NotImplemented
+        # metrics_at is left out, it is not part of the content
+        return self.__getstate__()[:-1] == other.__getstate__()[:-1]
+
+    def __repr__(self):
+        return f'<Tweet {self.id}>'
+
+    @classmethod
+    def from_v2(cls, data, users, fetched_at=0):
+        """Build the tweet out of a tweet of the v2 API
+
+        :param users: accounts of the response by id, built out of its
+                      includes.users expansion
+        :param fetched_at: time the response was received at
+        """
+        metrics = data.get('public_metrics', NO_METRICS)
+        created_at = data.get('created_at')
+        return cls(
+            id=data['id'],
+            account=users.get(data.get('author_id')),
+            created_at=created_at and parse_v2(created_at),
+            hashtags=tuple(
+                x['tag']
+                for x in data.get('entities', {}).get('hashtags', ())
+            ),
+            likes=metrics['like_count'],
+            replies=metrics['reply_count'],
+            retweets=metrics['retweet_count'],
+            text=data['text'],
+            metrics_at=fetched_at
+        )
+
+    @classmethod
+    def from_v1(cls, data, users, fetched_at=0):
+        """Build the tweet out of a tweet of the v1.1 API
+
+        The v1.1 API does not return the replies count, it has to be
+        set afterwards from the v2 lookup API.
+
+        :param users: accounts already built by id, the account of the
+                      tweet is added to it so that the tweets of one
+                      author share the same Account
+        """
+        user = data['user']
+        account = users.get(user['id_str'])
+        # trimmed users only carry their id
+        if account is None and 'screen_name' in user:
+            account = users[user['id_str']] = Account.from_v1(user)
+
+        return cls(
+            id=data['id_str'],
+            account=account,
+            created_at=parse_v1(data['created_at']),
+            hashtags=tuple(
+                x['text'] for x in data.get('entities', {}).get('hashtags', ())
+            ),
+            likes=data['favorite_count'],
+            retweets=data['retweet_count'],
+            text=data['text'],
+            metrics_at=fetched_at
+        )
+
+    def get_date(self):
+        return format_date(self.created_at)
+
+    def to_dict(self, fields=None):
+        """Return the tweet in the shape of the public response
+
+        :param fields: only return these fields, in the order of FIELDS
+        """
+        if fields is not None:
+            return {x: FORMATTERS[x](self) for x in fields}
+        return {
+            'account': self.account.to_dict(),
+            'date': self.get_date(),
+            'hashtags': [f'#{x}' for x in self.hashtags],
+            'likes': self.likes,
+            'replies': self.replies,
+            'retweets': self.retweets,
+            'text': self.text
+        }
+
+
+# formatters of each field of the public response
+FORMATTERS = {
+    'account': lambda x: x.account.to_dict(),
+    'date': Tweet.get_date,
+    'hashtags': lambda x: [f'#{y}' for y in x.hashtags],
+    'likes': attrgetter('likes'),
+    'replies': attrgetter('replies'),
+    'retweets': attrgetter('retweets'),
+    'text': attrgetter('text'),
+}
+
+
+def normalize(data, users, fetched_at=0):
+    """Build a Tweet out of a tweet of either the v2 or the v1.1 API"""
+    # only the v1.1 API returns the ids as both numbers and strings
+    if 'id_str' in data:
+        return Tweet.from_v1(data, users, fetched_at)
+    return Tweet.from_v2(data, users, fetched_at)
+
+
+def fingerprint(tweets):
+    """Cheap checksum of the public content of the tweets
+
+    Only the ids, the counts and the authors are covered, the other
+    fields of a tweet never change once it is posted.
+    """
+    content = '\n'.join([
+        f'{x.id} {x.likes} {x.replies} {x.retweets} '
+        f'{x.account.username} {x.account.fullname}'
+        for x in tweets
+    ])
+    return zlib.crc32(content.encode('utf-8'))
+
+
+# field ranking the tweets of each sort of the tweets apis
+SORT_KEYS = {
+    'likes': attrgetter('likes'),
+    'retweets': attrgetter('retweets'),
+    'replies': attrgetter('replies'),
+    'recent': attrgetter('created_at'),
+}
+
+
+def top_tweets(tweets, sort, k):
+    """Return the k first tweets of a sort, the highest first
+
+    The tweets are selected with a heap of k tweets instead of sorting
+    all of them, ties keep the order of the tweets, i.e. the newest
+    first.
+    """
+    return heapq.nlargest(k, tweets, key=SORT_KEYS[sort])
+
+
+def to_dicts(tweets, fields=None):
+    """Serialize tweets to the shape of the public response
+
+    :param fields: only return these fields of the tweets
+    """
+    return [x.to_dict(fields) for x in tweets]
@@ -0,0 +1,19 @@
+class TwitterAPIError(Exception):
+    """Error response returned by one of the Twitter APIs"""
+
+    def __init__(self, detail, status_code=None):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+class RateLimitExceeded(TwitterAPIError):
+    """The rate limit budget of an endpoint is exhausted
+
+    :param retry_after: seconds until the budget is reset
+    """
+
+    def __init__(self, endpoint, retry_after):
+        super().__init__(f'Rate limit of {endpoint} exceeded', 429)
+        self.endpoint = endpoint
+        self.retry_after = retry_after
@@ -0,0 +1,137 @@
+import heapq
+import threading
+import time
+
+from django.conf import settings
+
+from tweets.backends import DjangoCache, configured_by, load_backend
+
+
+def _merge(counts, other):
+    """Add the hits of other to counts and keep the largest count"""
+    for key, (hits, count) in other.items():
+        current = counts.get(key)
+        if current is None:
+            counts[key] = (hits, count)
+        else:
+            counts[key] = (current[0] + hits, max(current[1], count))
+
+
+class LocalBackend:
+    """Request counts kept in the memory of the process
+
+    Only the warmer running in the same process sees them, e.g. under
+    runserver or in the tests.
+    """
+
+    def __init__(self, **kwargs):
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def add(self, window, counts, timeout):
+        with self._lock:
+            # only the current and the previous windows are ever read
+            for old in [x for x in self._windows if x < window - 1]:
+                del self._windows[old]
+            _merge(self._windows.setdefault(window, {}), counts)
+
+    def get(self, window):
+        with self._lock:
+            return dict(self._windows.get(window, {}))
+
+
+class DjangoCacheBackend(DjangoCache):
+    """Request counts shared by the workers through the django cache
+
+    The counts of a window are merged with a get and a set, two workers
+    flushing at once may lose a few hits, which does not matter to tell
+    the hot keys apart.
+    """
+    prefix = 'tweets-hot:'
+
+    def add(self, window, counts, timeout):
+        key = f'{self._prefix}{window}'
+        current = self._cache.get(key) or {}
+        _merge(current, counts)
+        self._cache.set(key, current, timeout)
+
+    def get(self, window):
+        return self._cache.get(f'{self._prefix}{window}') or {}
+
+
+BACKENDS = {
+    'local': LocalBackend,
+    'django': DjangoCacheBackend,
+}
+
+
+class HotKeyTracker:
+    """Frequency of the requests of each endpoint and key
+
+       The hits are counted per window of WINDOW seconds, the hot keys
+       are the most requested ones over the current and the previous
+       window. The views buffer their hits and flush them at most every
+       FLUSH_INTERVAL seconds, so that a request costs no cache call.
+    """
+
+    def __init__(self, backend, window=300, flush_interval=5):
+        self.backend = backend
+        self.window = window
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _get_window(self):
+        return int(time.time() // self.window)
+
+    def record(self, endpoint, key, count):
+        """Count one request of count tweets for key"""
+        key = (endpoint, key.lower())
+        with self._lock:
+            hits, max_count = self._pending.get(key, (0, 0))
+            self._pending[key] = (hits + 1, max(max_count, count))
+            if time.monotonic() - self._flushed_at < self.flush_interval:
+                return
+        self.flush()
+
+    def flush(self):
+        """Add the buffered hits to the counts of the current window"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flushed_at = time.monotonic()
+        if pending:
+            self.backend.add(self._get_window(), pending, self.window * 2)
+
+    def top(self, k):
+        """Return the k most requested keys, the most requested first
+
+        :return: a list of (endpoint, key, count) where count is the
+                 largest count the key was requested with
+        """
+        window = self._get_window()
+        counts = dict(self.backend.get(window - 1))
+        _merge(counts, self.backend.get(window))
+        return [
+            (endpoint, key, count)
+            for (endpoint, key), (hits, count) in heapq.nlargest(
+                k, counts.items(), key=lambda x: x[1][0]
+            )
+        ]
+
+
+@configured_by('TWEETS_WARM')
+def get_hot_key_tracker():
+    """Return the tracker configured by settings.TWEETS_WARM
+
+    :return: None when the requests are not tracked
+    """
+    conf = settings.TWEETS_WARM
+    backend = load_backend(conf, BACKENDS)
+    if backend is None:
+        return None
+    return HotKeyTracker(
+        backend,
+        window=conf.get('WINDOW', 300),
+        flush_interval=conf.get('FLUSH_INTERVAL', 5)
+    )
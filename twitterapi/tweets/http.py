@@ -0,0 +1,277 @@
+import asyncio
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from tweets import codec
+from tweets.exceptions import RateLimitExceeded
+from tweets.ratelimit import get_rate_limiter
+from tweets.tokens import get_token_pool
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+# upstream statuses worth retrying, 429 is left to the caller since
+# retrying it only burns the remaining rate limit budget
+RETRY_STATUSES = (500, 502, 503, 504)
+
+_session = None
+_session_lock = threading.Lock()
+
+# threads sending the concurrent requests of get_many()
+_executor = None
+
+# async clients are bound to the event loop they were created in
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _build_session():
+    """Build a keep-alive session with a pooled, retrying adapter"""
+    conf = settings.TWITTER_HTTP
+
+    # the default allowed methods of Retry only contain idempotent
+    # ones, so only GET requests will be retried here
+    retries = Retry(
+        total=conf['MAX_RETRIES'],
+        backoff_factor=conf['BACKOFF_FACTOR'],
+        status_forcelist=RETRY_STATUSES,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=conf['POOL_CONNECTIONS'],
+        pool_maxsize=conf['POOL_MAXSIZE'],
+        max_retries=retries
+    )
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['Connection'] = 'keep-alive'
+    return session
+
+
+def get_session():
+    """Return the session shared by every service of the process
+
+    The session is created lazily so that each gunicorn worker builds
+    its own pool after forking instead of sharing sockets with the master.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def close_session():
+    """Close the shared session and release all pooled connections"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def get_timeout():
+    """Return the (connect, read) timeout used for upstream calls"""
+    conf = settings.TWITTER_HTTP
+    return (conf['CONNECT_TIMEOUT'], conf['READ_TIMEOUT'])
+
+
+def _prepare(url, headers, tried):
+    """Pick the token of a request and take it out of its budget
+
+    Requests with an Authorization header of their own are sent as is,
+    the others get the token of the pool with the largest budget left.
+
+    :param tried: names of the tokens the request was already sent with
+    :return: the key of the rate limit budget, the headers, the token
+             (None for own credentials) and the seconds to wait
+    """
+    headers = headers or {}
+    if 'Authorization' in headers:
+        key, token = url, None
+    else:
+        pool = get_token_pool()
+        token = pool.pick(url, exclude=tried)
+        tried.add(token.name)
+        key = pool.get_key(url, token)
+        headers = dict(headers, **token.headers)
+
+    return key, headers, token, get_rate_limiter().acquire(key)
+
+
+def _record(url, key, token, res, tried):
+    """Record the response of a request sent with _prepare()
+
+    :return: whether to send the request again with another token
+    :raise RateLimitExceeded: on a 429 that is not sent again
+    """
+    limiter = get_rate_limiter()
+    if token is None:
+        limiter.update(key, res)
+        return False
+
+    pool = get_token_pool()
+    try:
+        limiter.update(key, res)
+    except RateLimitExceeded:
+        if pool.record(url, token, res) and len(tried) < len(pool):
+            return True
+        raise
+    return pool.record(url, token, res) and len(tried) < len(pool)
+
+
+def _send(method, url, headers, kwargs):
+    kwargs.setdefault('timeout', get_timeout())
+    tried = set()
+    while True:
+        key, auth_headers, token, wait = _prepare(url, headers, tried)
+        if wait:
+            time.sleep(wait)
+
+        send = getattr(get_session(), method)
+        res = send(url, headers=auth_headers, **kwargs)
+        if not _record(url, key, token, res, tried):
+            return res
+
+
+def get(url, headers=None, **kwargs):
+    """Send a GET request through the shared connection pool
+
+    Every request takes one request out of the rate limit budget of its
+    url and token, see tweets.ratelimit and tweets.tokens. A request
+    rejected with a 401 or a 429 is sent again with the other tokens.
+
+    :raise RateLimitExceeded: when the budgets of the url are exhausted
+                              or twitter answered with a 429
+    """
+    return _send('get', url, headers, kwargs)
+
+
+def post(url, headers=None, **kwargs):
+    """Send a POST request the same way as get(), it is never retried"""
+    return _send('post', url, headers, kwargs)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _session_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.TWITTER_HTTP['POOL_MAXSIZE'],
+                    thread_name_prefix='twitter-http'
+                )
+    return _executor
+
+
+def get_many(url, params_list, **kwargs):
+    """Send one GET request per params concurrently, keep their order"""
+    if len(params_list) == 1:
+        return [get(url, params=params_list[0], **kwargs)]
+
+    return list(_get_executor().map(
+        lambda params: get(url, params=params, **kwargs),
+        params_list
+    ))
+
+
+def is_ok(res):
+    """Whether a requests or httpx response is successful"""
+    return res.status_code < 400
+
+
+def decode(res):
+    """Parse the body of a requests or httpx response
+
+    The body is decoded from the raw bytes, call it once per response
+    and keep the result instead of calling res.json() repeatedly.
+    """
+    return codec.loads(res.content)
+
+
+def _build_async_client():
+    conf = settings.TWITTER_HTTP
+    limits = httpx.Limits(
+        max_connections=conf['ASYNC_MAX_CONNECTIONS'],
+        max_keepalive_connections=conf['POOL_MAXSIZE']
+    )
+    # the transport only retries failed connections, retries on 5xx
+    # responses are handled by aget()
+    transport = httpx.AsyncHTTPTransport(
+        limits=limits,
+        retries=conf['MAX_RETRIES']
+    )
+    return httpx.AsyncClient(
+        limits=limits,
+        timeout=httpx.Timeout(
+            conf['READ_TIMEOUT'],
+            connect=conf['CONNECT_TIMEOUT']
+        ),
+        transport=transport
+    )
+
+
+def get_async_client():
+    """Return the async client shared by the coroutines of the running loop"""
+    if httpx is None:
+        raise ImproperlyConfigured(
+            'The httpx package is required by the async services'
+        )
+
+    loop = asyncio.get_event_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = _build_async_client()
+    return client
+
+
+async def close_async_client():
+    """Close the async client of the running loop"""
+    client = _async_clients.pop(asyncio.get_event_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def aget(url, headers=None, **kwargs):
+    """Send a GET request through the async connection pool"""
+    conf = settings.TWITTER_HTTP
+    client = get_async_client()
+
+    tried = set()
+    while True:
+        # the budgets may live in a shared cache, keep it off the loop
+        key, auth_headers, token, wait = \
+            await sync_to_async(_prepare)(url, headers, tried)
+        if wait:
+            await asyncio.sleep(wait)
+
+        retries = conf['MAX_RETRIES']
+        for attempt in range(retries + 1):
+            res = await client.get(url, headers=auth_headers, **kwargs)
+            if res.status_code not in RETRY_STATUSES or attempt == retries:
+                break
+            await asyncio.sleep(conf['BACKOFF_FACTOR'] * (2 ** attempt))
+
+        if not await sync_to_async(_record)(url, key, token, res, tried):
+            return res
+
+
+async def aget_many(url, params_list, **kwargs):
+    """Same as get_many() through the async client"""
+    return await asyncio.gather(*[
+        aget(url, params=params, **kwargs) for params in params_list
+    ])
@@ -0,0 +1,224 @@
+"""Ingestion of the filtered stream into the hashtag buffers
+
+Polling the recent search for the most requested hashtags costs one
+upstream call per expired entry and the tweets are as old as the TTL.
+`python manage.py ingest_stream` instead keeps one connection to the v2
+filtered stream open for the hashtags of TWEETS_INGEST and writes their
+newest tweets to the buffers of tweets.buffers.
+"""
+import collections
+import logging
+import time
+from contextlib import closing
+
+import requests
+from django.conf import settings
+
+from tweets import http
+from tweets.accounts import intern_account
+from tweets.buffers import get_hashtag_buffers
+from tweets.cache import CacheEntry
+from tweets.codec import loads
+from tweets.entities import normalize
+from tweets.exceptions import RateLimitExceeded, TwitterAPIError
+from tweets.services import TwitterServices
+from tweets.tokens import get_token_pool
+
+
+class Ingester:
+    """Feed the buffers of the hashtags from the filtered stream
+
+       The rules of the stream tagged with RULE_TAG are the ones of the
+       ingester, they are replaced by a rule per hashtag. Each connection
+       starts from a recent search of every hashtag so that the buffers
+       have no gap, a connection idle for STALL_TIMEOUT seconds (twitter
+       sends a keep-alive every 20 seconds) is opened again.
+
+       The rules belong to the app of the bearer token, so the rules and
+       the stream are all requested with the one token picked when the
+       ingester is built instead of the token of the pool of each request.
+    """
+    STREAM_API = 'https://api.twitter.com/2/tweets/search/stream'
+    RULES_API = 'https://api.twitter.com/2/tweets/search/stream/rules'
+    RULE_TAG = 'tweets-ingest'
+    # seconds waited before opening a failed connection again, doubled
+    # after each failure
+    MIN_BACKOFF = 1
+    MAX_BACKOFF = 60
+
+    # the fields of the search service, the tweets are normalized alike
+    STREAM_PARAMS = {
+        'tweet.fields': 'entities,created_at,public_metrics',
+        'user.fields': 'name,username',
+        'expansions': 'author_id',
+    }
+
+    def __init__(self, buffers, hashtags, flush_interval=1,
+                 stall_timeout=90):
+        self.buffers = buffers
+        self.hashtags = sorted({x.lower() for x in hashtags})
+        self.flush_interval = flush_interval
+        self.stall_timeout = stall_timeout
+        self.token = get_token_pool().pick(self.STREAM_API)
+        # newest tweets first, the oldest ones drop out of the right
+        self._rings = {
+            x: collections.deque(maxlen=buffers.size) for x in self.hashtags
+        }
+        # whether the recent search had fewer tweets than the buffer
+        self._exhausted = dict.fromkeys(self.hashtags, False)
+        self._received = []
+        self._flushed_at = 0
+
+    def sync_rules(self):
+        """Replace the rules of the ingester by the ones of the hashtags"""
+        res = http.get(self.RULES_API, headers=self.token.headers)
+        data = http.decode(res)
+        if not http.is_ok(res):
+            raise TwitterAPIError(data, res.status_code)
+
+        wanted = {f'#{x}' for x in self.hashtags}
+        rules = [x for x in data.get('data', [])
+                 if x.get('tag') == self.RULE_TAG]
+        payloads = []
+        stale = [x['id'] for x in rules if x['value'] not in wanted]
+        if stale:
+            payloads.append({'delete': {'ids': stale}})
+        missing = wanted - {x['value'] for x in rules}
+        if missing:
+            payloads.append({'add': [
+                {'value': x, 'tag': self.RULE_TAG} for x in sorted(missing)
+            ]})
+
+        for payload in payloads:
+            res = http.post(self.RULES_API, headers=self.token.headers,
+                            json=payload)
+            if not http.is_ok(res):
+                raise TwitterAPIError(http.decode(res), res.status_code)
+
+    def backfill(self):
+        """Fill the buffers with the newest tweets of the recent search"""
+        for hashtag in self.hashtags:
+            tweets = TwitterServices.fetch_tweets(
+                TwitterServices.HASHTAG,
+                hashtag=hashtag,
+                count=self.buffers.size
+            )
+            ring = self._rings[hashtag]
+            ring.clear()
+            ring.extend(tweets)
+            self._exhausted[hashtag] = len(tweets) < self.buffers.size
+            self._received.extend(tweets)
+
+    def ingest(self, item):
+        """Add a tweet of the stream to the buffers of its hashtags"""
+        users = {
+            x['id']: intern_account(x['id'], x['name'], x['username'])
+            for x in item.get('includes', {}).get('users', ())
+        }
+        tweet = normalize(item['data'], users, time.time())
+        for hashtag in {x.lower() for x in tweet.hashtags}:
+            ring = self._rings.get(hashtag)
+            # the tweets of the stream already fetched by the backfill,
+            # or delivered late, would break the order of the buffer
+            if ring is None or (ring and int(tweet.id) <= int(ring[0].id)):
+                continue
+            ring.appendleft(tweet)
+        self._received.append(tweet)
+
+    def flush(self):
+        """Write the buffers for the workers"""
+        for hashtag, ring in self._rings.items():
+            tweets = list(ring)
+            # once the ring is full its oldest tweets drop out, the
+            # tweets of the recent search are no longer all there
+            if len(tweets) >= self.buffers.size:
+                self._exhausted[hashtag] = False
+            # an exhausted entry covers any count, see CacheEntry
+            count = len(tweets) + 1 if self._exhausted[hashtag] \
+                else len(tweets)
+            self.buffers.set_entry(hashtag, CacheEntry(tweets, count))
+        received, self._received = self._received, []
+        TwitterServices.store_tweets(received)
+        self._flushed_at = time.monotonic()
+
+    def consume(self, lines):
+        """Ingest the lines of a connection until it is closed"""
+        for line in lines:
+            if line:
+                try:
+                    item = loads(line)
+                    if 'data' in item:
+                        self.ingest(item)
+                    else:
+                        # twitter tells why it is about to close the
+                        # stream
+                        logging.warning(f'Stream message: {item}')
+                except (ValueError, KeyError, TypeError) as e:
+                    # a malformed line must not stop the ingester
+                    logging.warning(f'Skipped the stream line {line}: {e}')
+            # the keep-alive lines are flushed too, so that the buffers
+            # of the quiet hashtags do not expire
+            if time.monotonic() - self._flushed_at >= self.flush_interval:
+                self.flush()
+        self.flush()
+
+    def connect(self):
+        res = http.get(
+            self.STREAM_API,
+            headers=self.token.headers,
+            params=self.STREAM_PARAMS,
+            stream=True,
+            timeout=(http.get_timeout()[0], self.stall_timeout)
+        )
+        if not http.is_ok(res):
+            with closing(res):
+                raise TwitterAPIError(http.decode(res), res.status_code)
+        return res
+
+    def run(self, connections=None):
+        """Ingest the stream, opening it again forever by default
+
+        :param connections: stop after this number of connections
+        """
+        self.sync_rules()
+        done = 0
+        backoff = self.MIN_BACKOFF
+        while connections is None or done < connections:
+            done += 1
+            wait = backoff
+            try:
+                with closing(self.connect()) as res:
+                    self.backfill()
+                    self.flush()
+                    backoff = self.MIN_BACKOFF
+                    self.consume(res.iter_lines())
+                logging.warning('The stream was closed by twitter')
+            except RateLimitExceeded as e:
+                logging.warning(f'Failed to open the stream: {e}')
+                wait = e.retry_after
+            except (requests.RequestException, TwitterAPIError) as e:
+                logging.warning(f'The stream failed: {e}')
+                backoff = min(backoff * 2, self.MAX_BACKOFF)
+
+            if connections is None or done < connections:
+                time.sleep(wait)
+
+
+def get_ingester(**kwargs):
+    """Return an ingester configured by settings.TWEETS_INGEST
+
+    :param kwargs: overrides of the settings
+    :return: None when the buffers are not shared
+    """
+    buffers = get_hashtag_buffers()
+    if buffers is None:
+        return None
+
+    conf = settings.TWEETS_INGEST
+    options = {
+        'hashtags': conf.get('HASHTAGS', []),
+        'flush_interval': conf.get('FLUSH_INTERVAL', 1),
+        'stall_timeout': conf.get('STALL_TIMEOUT', 90),
+    }
+    options.update({k: v for k, v in kwargs.items() if v is not None})
+    return Ingester(buffers, **options)
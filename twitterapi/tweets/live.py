@@ -0,0 +1,306 @@
+"""Server-sent events of the new tweets of a hashtag or a user
+
+GET /live/hashtags/<hashtag> and /live/users/<screen_name> keep the
+response open and send an event with the tweets newer than the ones
+already sent, instead of the clients polling the whole page:
+
+    id: <id of the newest tweet>
+    event: tweets
+    data: [<tweets, newest first>]
+
+The subscribers of a key share one polling loop per worker, which reads
+the key through TwitterServices like the views (cache, single flight,
+stream buffers) and serializes every batch once for all of them. Each
+subscriber only keeps MAX_QUEUE batches: a client reading slower than
+the tweets arrive loses the oldest ones and is sent a "lagged" event
+telling how many batches were dropped.
+
+Django 3.1 iterates streaming responses synchronously, the endpoint is
+served by LiveApplication in front of the ASGI application instead.
+"""
+import asyncio
+import collections
+import logging
+import re
+import weakref
+
+from django.conf import settings
+from django.core.signals import setting_changed
+
+from tweets.codec import dumps
+from tweets.entities import to_dicts
+from tweets.exceptions import RateLimitExceeded
+from tweets.services import TwitterServices
+
+
+# comment line keeping the idle connections open through the proxies
+HEARTBEAT = b': keep-alive\n\n'
+
+
+def format_event(event, data, id=None):
+    """Build a server-sent event out of JSON serializable data"""
+    head = f'id: {id}\n' if id is not None else ''
+    return f'{head}event: {event}\ndata: '.encode('utf-8') + \
+        dumps(data) + b'\n\n'
+
+
+class Subscription:
+    """Events of a channel waiting to be sent to one client"""
+
+    def __init__(self, channel, max_queue=16):
+        self.channel = channel
+        self._events = collections.deque(maxlen=max_queue)
+        self._ready = asyncio.Event()
+        # batches dropped since the last get()
+        self.dropped = 0
+
+    def put(self, event):
+        """Queue an event, dropping the oldest one when full"""
+        if len(self._events) == self._events.maxlen:
+            self.dropped += 1
+        self._events.append(event)
+        self._ready.set()
+
+    async def get(self):
+        """Wait for events and return all the queued ones"""
+        await self._ready.wait()
+        self._ready.clear()
+        events = list(self._events)
+        self._events.clear()
+        if self.dropped:
+            events.insert(0, format_event('lagged', {'dropped': self.dropped}))
+            self.dropped = 0
+        return events
+
+
+class Channel:
+    """Polling loop of one key, fanning its new tweets out"""
+
+    def __init__(self, search_by, key, count=100, interval=5):
+        self.search_by = search_by
+        self.key = key
+        self.count = count
+        self.interval = interval
+        self.subscriptions = set()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._poll())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def publish(self, tweets):
+        event = format_event('tweets', to_dicts(tweets), id=tweets[0].id)
+        for subscription in self.subscriptions:
+            subscription.put(event)
+
+    async def _poll(self):
+        key_name = TwitterServices.ENDPOINTS[self.search_by][1]
+        # the tweets of the first poll with tweets are the ones the
+        # clients already have, only the newer ones are sent
+        last_id = None
+        while True:
+            wait = self.interval
+            try:
+                tweets, _ = await TwitterServices.aget_page(
+                    self.search_by,
+                    count=self.count,
+                    **{key_name: self.key}
+                )
+            except RateLimitExceeded as e:
+                logging.warning(f'Failed to poll {self.key}: {e}')
+                wait = max(wait, e.retry_after)
+            except Exception as e:
+                logging.exception(f'Failed to poll {self.key}: {e}')
+            else:
+                if last_id is not None:
+                    new = [x for x in tweets if int(x.id) > last_id]
+                    if new:
+                        self.publish(new)
+                if tweets:
+                    last_id = max(int(tweets[0].id), last_id or 0)
+            await asyncio.sleep(wait)
+
+
+class SubscriberLimitExceeded(Exception):
+    pass
+
+
+class LiveHub:
+    """Channels of the keys with subscribers, in one event loop
+
+       :param max_subscribers: subscriptions open at once, the memory of
+                               the hub is bounded by this many queues of
+                               max_queue events
+    """
+
+    def __init__(self, count=100, interval=5, max_queue=16,
+                 max_subscribers=1000, heartbeat=15):
+        self.count = count
+        self.interval = interval
+        self.max_queue = max_queue
+        self.max_subscribers = max_subscribers
+        self.heartbeat = heartbeat
+        self.channels = {}
+        self.subscribers = 0
+
+    def subscribe(self, search_by, key):
+        """Subscribe to the new tweets of a key
+
+        :raise SubscriberLimitExceeded: when max_subscribers are open
+        """
+        if self.subscribers >= self.max_subscribers:
+            raise SubscriberLimitExceeded()
+
+        # the keys are case insensitive like the cache keys
+        channel_key = (search_by, key.lower())
+        channel = self.channels.get(channel_key)
+        if channel is None:
+            channel = self.channels[channel_key] = Channel(
+                search_by, key, count=self.count, interval=self.interval
+            )
+            channel.start()
+        subscription = Subscription(channel, self.max_queue)
+        channel.subscriptions.add(subscription)
+        self.subscribers += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Close a subscription, and its channel after the last one"""
+        channel = subscription.channel
+        channel.subscriptions.discard(subscription)
+        self.subscribers -= 1
+        if not channel.subscriptions:
+            channel.stop()
+            del self.channels[(channel.search_by, channel.key.lower())]
+
+
+# the asyncio primitives of a hub are bound to its event loop
+_live_hubs = weakref.WeakKeyDictionary()
+
+
+def get_live_hub():
+    """Return the hub of the running event loop, see settings.TWEETS_LIVE"""
+    loop = asyncio.get_event_loop()
+    hub = _live_hubs.get(loop)
+    if hub is None:
+        conf = settings.TWEETS_LIVE
+        hub = _live_hubs[loop] = LiveHub(
+            count=conf.get('COUNT', 100),
+            interval=conf.get('INTERVAL', 5),
+            max_queue=conf.get('MAX_QUEUE', 16),
+            max_subscribers=conf.get('MAX_SUBSCRIBERS', 1000),
+            heartbeat=conf.get('HEARTBEAT', 15)
+        )
+    return hub
+
+
+def _reset_live_hubs(**kwargs):
+    if kwargs['setting'] == 'TWEETS_LIVE':
+        _live_hubs.clear()
+
+
+setting_changed.connect(_reset_live_hubs)
+
+
+async def _send_json(send, data, status, headers=()):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')] + list(headers),
+    })
+    await send({'type': 'http.response.body', 'body': dumps(data)})
+
+
+async def _wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def stream_events(search_by, key, receive, send):
+    """Send the new tweets of a key until the client disconnects"""
+    hub = get_live_hub()
+    try:
+        subscription = hub.subscribe(search_by, key)
+    except SubscriberLimitExceeded:
+        await _send_json(
+            send,
+            {'Too many subscribers': ['Retry later.']},
+            503,
+            [(b'retry-after', str(hub.heartbeat).encode('ascii'))]
+        )
+        return
+
+    disconnected = asyncio.ensure_future(_wait_disconnect(receive))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                # nginx would buffer the events otherwise
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': HEARTBEAT,
+            'more_body': True,
+        })
+        while True:
+            getter = asyncio.ensure_future(subscription.get())
+            done, _ = await asyncio.wait(
+                {getter, disconnected},
+                timeout=hub.heartbeat,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnected in done:
+                getter.cancel()
+                break
+            if getter in done:
+                body = b''.join(getter.result())
+            else:
+                getter.cancel()
+                body = HEARTBEAT
+            # the server holds this coroutine while the client is slow,
+            # its queue then drops the oldest events
+            await send({
+                'type': 'http.response.body',
+                'body': body,
+                'more_body': True,
+            })
+    finally:
+        disconnected.cancel()
+        hub.unsubscribe(subscription)
+
+
+class LiveApplication:
+    """Serve the live endpoints in front of an ASGI application"""
+
+    PATH = re.compile(r'^/live/(hashtags|users)/([-a-zA-Z0-9_]+)$')
+    SEARCH_BY = {
+        'hashtags': TwitterServices.HASHTAG,
+        'users': TwitterServices.USER,
+    }
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        match = scope['type'] == 'http' and self.PATH.match(scope['path'])
+        if not match:
+            return await self.application(scope, receive, send)
+
+        if scope['method'] != 'GET':
+            return await _send_json(
+                send,
+                {'detail': f'Method "{scope["method"]}" not allowed.'},
+                405,
+                [(b'allow', b'GET')]
+            )
+        await stream_events(
+            self.SEARCH_BY[match.group(1)], match.group(2), receive, send
+        )
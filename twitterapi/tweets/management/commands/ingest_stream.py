@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tweets.ingest import get_ingester
+
+
+class Command(BaseCommand):
+    help = (
+        'Ingest the tweets of the hashtags from the filtered stream into '
+        'the buffers read by the web workers'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'hashtags', nargs='*',
+            help='hashtags to ingest (TWEETS_INGEST_HASHTAGS)'
+        )
+        parser.add_argument(
+            '--connections', type=int,
+            help='stop after this number of connections to the stream'
+        )
+
+    def handle(self, *args, **options):
+        ingester = get_ingester(hashtags=options['hashtags'] or None)
+        if ingester is None:
+            raise CommandError(
+                'Set TWEETS_INGEST_BACKEND so that the workers read the '
+                'buffers'
+            )
+        if not ingester.hashtags:
+            raise CommandError('Set the hashtags to ingest')
+
+        self.stdout.write(
+            f'Ingesting {", ".join(ingester.hashtags)} from the stream'
+        )
+        try:
+            ingester.run(connections=options['connections'])
+        except KeyboardInterrupt:
+            pass
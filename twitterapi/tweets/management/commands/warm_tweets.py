@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tweets.warmer import get_warmer
+
+
+class Command(BaseCommand):
+    help = (
+        'Keep the cached tweets of the most requested hashtags and users '
+        'fresh, run it alongside the web workers'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top', type=int,
+            help='number of hot keys kept fresh (TWEETS_WARM_TOP)'
+        )
+        parser.add_argument(
+            '--interval', type=float,
+            help='seconds between two runs (TWEETS_WARM_INTERVAL)'
+        )
+        parser.add_argument(
+            '--iterations', type=int,
+            help='stop after this number of runs, e.g. 1 under cron'
+        )
+
+    def handle(self, *args, **options):
+        warmer = get_warmer(top=options['top'], interval=options['interval'])
+        if warmer is None:
+            raise CommandError(
+                'Set TWEETS_WARM_BACKEND so that the views track the hot keys'
+            )
+
+        self.stdout.write(
+            f'Warming the top {warmer.top} keys every {warmer.interval}s'
+        )
+        try:
+            warmer.run(iterations=options['iterations'])
+        except KeyboardInterrupt:
+            pass
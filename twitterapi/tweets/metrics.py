@@ -0,0 +1,79 @@
+"""Counts of the tweets by id, shared by the services
+
+The recent search returns the full public_metrics of its tweets while
+the v1.1 timeline has no replies count, which costs a call of the v2
+lookup api. The counts of every tweet fetched by either service are
+kept for a short TTL, the lookups are then only sent for the ids that
+are missing or whose counts are too old.
+"""
+import time
+
+from django.conf import settings
+
+from tweets import backends
+from tweets.backends import LRUBackend, configured_by, load_backend
+
+
+class LocalBackend(LRUBackend):
+    """Counts kept in the memory of the process, the oldest evicted"""
+
+    def __init__(self, max_entries=100000, **kwargs):
+        super().__init__(max_entries)
+
+
+class DjangoCacheBackend(backends.DjangoCacheBackend):
+    """Counts shared by the workers through the django cache"""
+    prefix = 'tweets-metrics:'
+
+
+BACKENDS = {
+    'local': LocalBackend,
+    'django': DjangoCacheBackend,
+}
+
+
+class MetricsCache:
+    """Likes, replies and retweets of the tweets by id
+
+       The counts are fresh for TTL seconds after they were fetched.
+    """
+
+    def __init__(self, backend, ttl=30):
+        self.backend = backend
+        self.ttl = ttl
+
+    def get_many(self, ids):
+        """Return the fresh counts of the ids
+
+        :return: (likes, replies, retweets, metrics_at) by id
+        """
+        fresh_after = time.time() - self.ttl
+        return {
+            key: value for key, value in self.backend.get_many(ids).items()
+            if value[3] > fresh_after
+        }
+
+    def set_many(self, tweets):
+        """Keep the counts of tweets carrying all of them"""
+        values = {
+            x.id: (x.likes, x.replies, x.retweets, x.metrics_at)
+            for x in tweets
+        }
+        if values:
+            self.backend.set_many(values, self.ttl)
+
+    def clear(self):
+        self.backend.clear()
+
+
+@configured_by('TWEETS_METRICS_CACHE')
+def get_metrics_cache():
+    """Return the counts cache configured by settings.TWEETS_METRICS_CACHE
+
+    :return: None when the counts are not shared
+    """
+    conf = settings.TWEETS_METRICS_CACHE
+    backend = load_backend(conf, BACKENDS)
+    if backend is None:
+        return None
+    return MetricsCache(backend, ttl=conf.get('TTL', 30))
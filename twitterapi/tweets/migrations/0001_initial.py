@@ -0,0 +1,54 @@
+# Generated by Django 3.1.1 on 2026-10-17 05:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredAccount',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('fullname', models.CharField(max_length=100)),
+                ('username', models.CharField(max_length=50)),
+                ('screen_name', models.CharField(db_index=True, max_length=50)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StoredTweet',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField()),
+                ('hashtags', models.TextField(blank=True)),
+                ('likes', models.IntegerField(default=0)),
+                ('replies', models.IntegerField(default=0)),
+                ('retweets', models.IntegerField(default=0)),
+                ('text', models.TextField()),
+                ('metrics_at', models.FloatField(default=0)),
+                ('account', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='tweets.storedaccount')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StoredHashtag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag', models.CharField(max_length=140)),
+                ('tweet', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='tweets.storedtweet')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='storedtweet',
+            index=models.Index(fields=['account', '-id'], name='tweets_timeline_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='storedhashtag',
+            unique_together={('tag', 'tweet')},
+        ),
+    ]
@@ -0,0 +1,56 @@
+from django.db import models
+
+
+class StoredAccount(models.Model):
+    """Author of the stored tweets"""
+    id = models.BigIntegerField(primary_key=True)
+    fullname = models.CharField(max_length=100)
+    username = models.CharField(max_length=50)
+    # lowercase username, the screen names are case insensitive
+    screen_name = models.CharField(max_length=50, db_index=True)
+
+
+class StoredTweet(models.Model):
+    """Tweet fetched upstream, see tweets.store
+
+    The hashtags are kept as returned, separated by spaces, the index of
+    the lowercase hashtags is StoredHashtag.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    # covered by the index of the timelines
+    account = models.ForeignKey(
+        StoredAccount,
+        on_delete=models.CASCADE,
+        db_index=False
+    )
+    created_at = models.DateTimeField()
+    hashtags = models.TextField(blank=True)
+    likes = models.IntegerField(default=0)
+    replies = models.IntegerField(default=0)
+    retweets = models.IntegerField(default=0)
+    text = models.TextField()
+    metrics_at = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['account', '-id'],
+                name='tweets_timeline_idx'
+            ),
+        ]
+
+
+class StoredHashtag(models.Model):
+    """Lowercase hashtag of a stored tweet
+
+    The pages of a hashtag are read out of the (tag, tweet) index alone.
+    """
+    tag = models.CharField(max_length=140)
+    tweet = models.ForeignKey(
+        StoredTweet,
+        on_delete=models.CASCADE,
+        db_index=False
+    )
+
+    class Meta:
+        unique_together = [('tag', 'tweet')]
@@ -0,0 +1,183 @@
+"""Hashtags and filters of the searches of the hashtag endpoint
+
+The filters are pushed into the recent search query wherever its
+operators support them: the hashtags, -is:retweet, lang: and the
+start_time and end_time params. The minimum counts have no operator on
+the standard search api, they are evaluated over the normalized tweets.
+"""
+import datetime
+
+from django.utils import timezone
+
+
+# length of the queries accepted by the recent search api
+MAX_QUERY_LENGTH = 512
+# twitter rejects an end_time less than 10 seconds old
+MIN_END_TIME_AGE = datetime.timedelta(seconds=10)
+# and a start_time out of the 7 days of the recent search, less a margin
+# for the clocks
+MAX_START_TIME_AGE = datetime.timedelta(days=7, minutes=-1)
+
+# count fields of the tweets and their filter
+MIN_COUNTS = (
+    ('likes', 'min_likes'),
+    ('retweets', 'min_retweets'),
+    ('replies', 'min_replies'),
+)
+
+
+def _to_utc(value):
+    """Return an aware datetime as a naive one in UTC, like the tweets"""
+    if value is None or timezone.is_naive(value):
+        return value
+    return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def _unique(hashtags):
+    """Return the hashtags without the repeated ones, in order
+
+    The hashtags are case insensitive, a repeated one would only take up
+    the length of the query.
+    """
+    seen = set()
+    unique = []
+    for hashtag in hashtags:
+        if hashtag.lower() not in seen:
+            seen.add(hashtag.lower())
+            unique.append(hashtag)
+    return tuple(unique)
+
+
+class TweetQuery:
+    """Hashtags matched with AND or OR semantics and the filters
+
+    :param hashtags: hashtags without the '#'
+    :param match: 'any' for the tweets with one of the hashtags, 'all'
+                  for the tweets with every one of them
+    :param since: only the tweets created from this datetime
+    :param until: only the tweets created before this datetime
+    """
+    __slots__ = (
+        'hashtags', 'match', 'min_likes', 'min_retweets', 'min_replies',
+        'exclude_retweets', 'lang', 'since', 'until', '_min_counts'
+    )
+
+    def __init__(self, hashtags, match='any', min_likes=0, min_retweets=0,
+                 min_replies=0, exclude_retweets=False, lang=None,
+                 since=None, until=None):
+        self.hashtags = _unique(hashtags)
+        self.match = match
+        self.min_likes = min_likes
+        self.min_retweets = min_retweets
+        self.min_replies = min_replies
+        self.exclude_retweets = exclude_retweets
+        self.lang = lang
+        self.since = _to_utc(since)
+        self.until = _to_utc(until)
+        # only the thresholds actually set are checked for each tweet
+        self._min_counts = tuple(
+            (field, getattr(self, name)) for field, name in MIN_COUNTS
+            if getattr(self, name) > 0
+        )
+
+    def __repr__(self):
+        return f'<TweetQuery {self.key}>'
+
+    @classmethod
+    def from_params(cls, hashtag, params):
+        """Build the query out of the validated params of a request
+
+        :return: None when the request only asks for hashtag
+        """
+        query = cls(
+            (hashtag,) + tuple(params.get('tags', ())),
+            match=params.get('match', 'any'),
+            min_likes=params.get('min_likes', 0),
+            min_retweets=params.get('min_retweets', 0),
+            min_replies=params.get('min_replies', 0),
+            exclude_retweets=params.get('exclude_retweets', False),
+            lang=params.get('lang'),
+            since=params.get('since'),
+            until=params.get('until')
+        )
+        return None if query.is_simple else query
+
+    @property
+    def is_simple(self):
+        """Whether the query is the plain search of one hashtag"""
+        return len(self.hashtags) == 1 and not self.has_filters
+
+    @property
+    def has_filters(self):
+        return bool(
+            self._min_counts or self.exclude_retweets or self.lang or
+            self.since or self.until
+        )
+
+    @property
+    def has_local_filters(self):
+        """Whether many tweets returned upstream may be filtered out"""
+        return bool(self._min_counts)
+
+    @property
+    def tweet_fields(self):
+        """tweet.fields of the recent search api needed by matches()"""
+        fields = set()
+        if self._min_counts:
+            fields.add('public_metrics')
+        if self.until:
+            fields.add('created_at')
+        return fields
+
+    @property
+    def key(self):
+        """Canonical form of the query, the hashtags are case insensitive"""
+        hashtags = sorted({x.lower() for x in self.hashtags})
+        parts = [self.match, ','.join(hashtags)]
+        parts += [f'{name}={getattr(self, name)}'
+                  for _, name in MIN_COUNTS if getattr(self, name)]
+        if self.exclude_retweets:
+            parts.append('-rt')
+        if self.lang:
+            parts.append(f'lang={self.lang}')
+        if self.since:
+            parts.append(f'since={self.since:%Y%m%d%H%M%S}')
+        if self.until:
+            parts.append(f'until={self.until:%Y%m%d%H%M%S}')
+        return '&'.join(parts)
+
+    def get_query(self):
+        """Build the query of the recent search api"""
+        hashtags = [f'#{x}' for x in self.hashtags]
+        if self.match == 'all' or len(hashtags) == 1:
+            query = ' '.join(hashtags)
+        else:
+            query = f'({" OR ".join(hashtags)})'
+        if self.exclude_retweets:
+            query += ' -is:retweet'
+        if self.lang:
+            query += f' lang:{self.lang}'
+        return query
+
+    def get_params(self):
+        """Build the params of the time window of the recent search api"""
+        params = {}
+        now = _to_utc(timezone.now())
+        if self.since:
+            # the requests only accept a since within the window, the
+            # refreshes of a cached query may fall out of it later on
+            since = max(self.since, now - MAX_START_TIME_AGE)
+            params['start_time'] = f'{since:%Y-%m-%dT%H:%M:%S}Z'
+        # a recent end_time, or one out of the window by the time of a
+        # refresh, is only checked over the tweets
+        window = (now - MAX_START_TIME_AGE, now - MIN_END_TIME_AGE)
+        if self.until and window[0] < self.until <= window[1]:
+            params['end_time'] = f'{self.until:%Y-%m-%dT%H:%M:%S}Z'
+        return params
+
+    def matches(self, tweet):
+        """Evaluate the filters not supported upstream over a tweet"""
+        for field, minimum in self._min_counts:
+            if getattr(tweet, field) < minimum:
+                return False
+        return self.until is None or tweet.created_at < self.until
@@ -0,0 +1,150 @@
+import threading
+import time
+
+from django.conf import settings
+
+from tweets.backends import DjangoCache, configured_by, load_backend
+from tweets.exceptions import RateLimitExceeded
+
+
+class LocalBackend:
+    """Rate limit budgets kept in the memory of the process"""
+
+    def __init__(self, **kwargs):
+        self._budgets = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the remaining requests and the reset time of key"""
+        with self._lock:
+            return self._budgets.get(key)
+
+    def set(self, key, remaining, reset):
+        with self._lock:
+            self._budgets[key] = (remaining, reset)
+
+    def decr(self, key):
+        with self._lock:
+            budget = self._budgets.get(key)
+            if budget is not None:
+                self._budgets[key] = (budget[0] - 1, budget[1])
+
+
+class DjangoCacheBackend(DjangoCache):
+    """Rate limit budgets shared by the workers through the django cache
+
+    The remaining requests are decremented with cache.decr(), which is
+    atomic on the memcached and redis backends.
+    """
+    prefix = 'tweets-ratelimit:'
+
+    def _keys(self, key):
+        return f'{self._prefix}{key}:remaining', f'{self._prefix}{key}:reset'
+
+    def get(self, key):
+        remaining_key, reset_key = self._keys(key)
+        values = self._cache.get_many([remaining_key, reset_key])
+        if len(values) != 2:
+            return None
+        return values[remaining_key], values[reset_key]
+
+    def set(self, key, remaining, reset):
+        remaining_key, reset_key = self._keys(key)
+        # the budget is useless once the window is reset
+        timeout = max(1, int(reset - time.time()) + 1)
+        self._cache.set_many(
+            {remaining_key: remaining, reset_key: reset},
+            timeout
+        )
+
+    def decr(self, key):
+        try:
+            self._cache.decr(self._keys(key)[0])
+        except ValueError:
+            # the budget expired in the meantime
+            pass
+
+
+BACKENDS = {
+    'local': LocalBackend,
+    'django': DjangoCacheBackend,
+}
+
+
+class RateLimiter:
+    """Budget of the requests left for each endpoint of the Twitter APIs
+
+       The budgets come from the x-rate-limit-remaining and
+       x-rate-limit-reset headers of the last response of each endpoint,
+       every request sent in the meantime takes one request out of it.
+       Once a budget is down to RESERVE requests, the requests wait up to
+       MAX_WAIT seconds for the reset of the window and fail with
+       RateLimitExceeded otherwise, before reaching Twitter.
+    """
+
+    REMAINING_HEADER = 'x-rate-limit-remaining'
+    RESET_HEADER = 'x-rate-limit-reset'
+    # window assumed when a 429 response has no reset header
+    DEFAULT_RETRY_AFTER = 60
+
+    def __init__(self, backend, reserve=0, max_wait=0):
+        self.backend = backend
+        self.reserve = reserve
+        self.max_wait = max_wait
+
+    def acquire(self, key):
+        """Take one request out of the budget of key
+
+        :return: seconds to wait before sending the request
+        :raise RateLimitExceeded: when the budget is not reset soon enough
+        """
+        budget = self.backend.get(key)
+        if budget is None:
+            return 0
+
+        remaining, reset = budget
+        retry_after = reset - time.time()
+        if retry_after <= 0:
+            # the window is over, the next response tells the new budget
+            return 0
+        if remaining > self.reserve:
+            self.backend.decr(key)
+            return 0
+        if retry_after <= self.max_wait:
+            return retry_after
+        raise RateLimitExceeded(key, retry_after)
+
+    def update(self, key, res):
+        """Update the budget of key from the headers of a response
+
+        :raise RateLimitExceeded: when the response is a 429
+        """
+        remaining = res.headers.get(self.REMAINING_HEADER)
+        reset = res.headers.get(self.RESET_HEADER)
+        try:
+            reset = int(reset)
+            if remaining is not None:
+                self.backend.set(key, int(remaining), reset)
+        except (TypeError, ValueError):
+            reset = None
+
+        if res.status_code == 429:
+            if reset is None:
+                reset = int(time.time()) + self.DEFAULT_RETRY_AFTER
+            self.backend.set(key, 0, reset)
+            raise RateLimitExceeded(key, max(1, reset - time.time()))
+
+    def get_budget(self, key):
+        """Return the remaining requests and the reset time of key"""
+        return self.backend.get(key)
+
+
+@configured_by('TWEETS_RATE_LIMIT')
+def get_rate_limiter():
+    """Return the rate limiter configured by settings.TWEETS_RATE_LIMIT"""
+    conf = settings.TWEETS_RATE_LIMIT
+    return RateLimiter(
+        load_backend(conf, BACKENDS, default='local'),
+        reserve=conf.get('RESERVE', 0),
+        max_wait=conf.get('MAX_WAIT', 0)
+    )
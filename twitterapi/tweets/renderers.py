@@ -0,0 +1,73 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from tweets.codec import dumps
+
+
+# streamed tweets are sent to the client by chunks of about this size
+STREAM_CHUNK_SIZE = 4 * 1024
+
+
+def _chunked(parts, chunk_size=STREAM_CHUNK_SIZE):
+    """Join the small encoded parts into chunks before sending them"""
+    buffer = []
+    size = 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def iter_json_array(items):
+    """Encode an iterable as a JSON array, one chunk at a time"""
+    def parts():
+        yield b'['
+        separator = b''
+        for item in items:
+            yield separator + dumps(item)
+            separator = b','
+        yield b']'
+    return _chunked(parts())
+
+
+def iter_ndjson(items, chunk_size=STREAM_CHUNK_SIZE):
+    """Encode an iterable as newline delimited JSON
+
+    :param chunk_size: 0 sends every item as soon as it is encoded
+    """
+    return _chunked((dumps(item) + b'\n' for item in items), chunk_size)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Render a list as newline delimited JSON, one item per line"""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if not isinstance(data, list):
+            data = [data]
+        return b''.join(iter_ndjson(data))
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer encoding through tweets.codec (orjson when installed)
+
+    Indented output, as asked by the browsable API, is still rendered by
+    the JSONRenderer of rest_framework.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context) is None:
+            return dumps(data)
+        return super().render(data, accepted_media_type, renderer_context)
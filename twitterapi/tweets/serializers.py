@@ -1,10 +1,134 @@
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
 
+from tweets.entities import FIELDS
+from tweets.queries import MAX_QUERY_LENGTH, MAX_START_TIME_AGE, TweetQuery
+
 
 class TweetSerializer(serializers.Serializer):
     """Serializers a limit field for Tweet api"""
     limit = serializers.IntegerField(
         required=False,
         min_value=1,
-        max_value=100
+        max_value=settings.TWEETS_MAX_LIMIT
+    )
+    # id of the last tweet of the previous page
+    cursor = serializers.RegexField(
+        r'^[0-9]+$',
+        required=False,
+        max_length=20
+    )
+    # stream the tweets while they are fetched instead of buffering them
+    stream = serializers.BooleanField(required=False, default=False)
+    # rank the newest tweets instead of returning them in order
+    sort = serializers.ChoiceField(
+        choices=('likes', 'retweets', 'replies', 'recent'),
+        required=False
+    )
+    # fields of the tweets returned, all of them by default
+    fields = serializers.RegexField(
+        r'^[a-z]+(,[a-z]+)*$',
+        required=False,
+        max_length=100
+    )
+
+    def validate_fields(self, value):
+        fields = set(value.split(','))
+        unknown = fields.difference(FIELDS)
+        if unknown:
+            raise serializers.ValidationError(
+                f'Unknown fields: {", ".join(sorted(unknown))}.'
+            )
+        return tuple(x for x in FIELDS if x in fields)
+
+    def validate(self, attrs):
+        if attrs.get('sort') and attrs.get('cursor'):
+            raise serializers.ValidationError(
+                {'cursor': ['A sorted page has no next page.']}
+            )
+        return attrs
+
+
+class HashtagSerializer(TweetSerializer):
+    """Serializers the tags and the filters of the hashtag api
+
+       The hashtag of the url is read from the context, to check the
+       length of the whole query.
+    """
+    # more hashtags searched along with the one of the url
+    tags = serializers.RegexField(
+        r'^[-\w]+(,[-\w]+)*$',
+        required=False,
+        max_length=400
     )
+    # whether the tweets have any or all of the hashtags
+    match = serializers.ChoiceField(
+        choices=('any', 'all'),
+        required=False,
+        default='any'
+    )
+    min_likes = serializers.IntegerField(required=False, min_value=0)
+    min_retweets = serializers.IntegerField(required=False, min_value=0)
+    min_replies = serializers.IntegerField(required=False, min_value=0)
+    exclude_retweets = serializers.BooleanField(required=False, default=False)
+    # BCP 47 language tag as returned by twitter, e.g. en
+    lang = serializers.RegexField(r'^[a-z]{2,3}(-[a-zA-Z]+)?$', required=False)
+    # time window of the creation of the tweets
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+
+    def validate_tags(self, value):
+        return value.split(',')
+
+    def validate_since(self, value):
+        # the recent search has no older tweets and rejects the query
+        if value < timezone.now() - MAX_START_TIME_AGE:
+            raise serializers.ValidationError(
+                'Ensure this value is within the last 7 days.'
+            )
+        return value
+
+    validate_until = validate_since
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        since = attrs.get('since')
+        until = attrs.get('until')
+        if since and until and since >= until:
+            raise serializers.ValidationError(
+                {'until': ['Ensure this value is after since.']}
+            )
+        hashtag = self.context.get('hashtag')
+        query = hashtag and TweetQuery.from_params(hashtag, attrs)
+        if query and len(query.get_query()) > MAX_QUERY_LENGTH:
+            raise serializers.ValidationError({'tags': [
+                f'Ensure the search of the hashtags has no more than '
+                f'{MAX_QUERY_LENGTH} characters.'
+            ]})
+        return attrs
+
+
+class BatchListSerializer(serializers.ListSerializer):
+    """Items of a batch request, at most TWEETS_BATCH['MAX_ITEMS']"""
+
+    def validate(self, attrs):
+        max_items = settings.TWEETS_BATCH['MAX_ITEMS']
+        if len(attrs) > max_items:
+            raise serializers.ValidationError(
+                f'Ensure this list has no more than {max_items} items.'
+            )
+        return attrs
+
+
+class BatchItemSerializer(TweetSerializer):
+    """Serializers an item of the batch api, a hashtag or a user"""
+    type = serializers.ChoiceField(choices=('hashtag', 'user'))
+    # hashtag or screen_name, validated as the urls of the tweets apis
+    key = serializers.SlugField(max_length=100)
+    # the items are streamed as a whole, not tweet by tweet
+    stream = None
+    sort = None
+
+    class Meta:
+        list_serializer_class = BatchListSerializer
@@ -1,7 +1,48 @@
-import requests
-import datetime
+import asyncio
+import copy
+import itertools
+import logging
+import math
+import time
 
-from twitterapi.settings import TWITTER_TOKEN
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from tweets import http
+from tweets.accounts import get_account_cache, intern_account, \
+    resolves_authors
+from tweets.buffers import get_hashtag_buffers
+from tweets.entities import normalize, top_tweets
+from tweets.exceptions import RateLimitExceeded, TwitterAPIError
+from tweets.cache import HIT, MISS, CacheEntry, get_response_cache
+from tweets.metrics import get_metrics_cache
+from tweets.queries import MAX_QUERY_LENGTH
+from tweets.singleflight import async_single_flight, get_single_flight
+from tweets.store import get_tweet_store, is_historical
+
+
+def _store_sync_to_async(func):
+    # the queries of the tweet store run on the thread of the
+    # connections of the sync code, as django requires for the ORM
+    return sync_to_async(func, thread_sensitive=True)
+
+
+def _share_metrics(tweets):
+    """Keep the counts of the tweets for the lookups of the other services"""
+    metrics_cache = get_metrics_cache()
+    if metrics_cache is not None:
+        metrics_cache.set_many(tweets)
+
+
+# tweet.fields of the v2 apis needed by each field of the public response,
+# the text and the id are always returned
+TWEET_FIELDS = {
+    'date': 'created_at',
+    'hashtags': 'entities',
+    'likes': 'public_metrics',
+    'replies': 'public_metrics',
+    'retweets': 'public_metrics',
+}
 
 
 class TwitterServices:
@@ -9,257 +50,1207 @@ class TwitterServices:
        All services will have two common methods:
 
        1. fetch_data() which fetch data through Twitter APIs
-       2. get_tweets() format the responses of Twitter's APIs
-          and return a list of tweets
+       2. get_tweets() return the tweets normalized out of the
+          responses as a list of tweets.entities.Tweet
 
-       NOTICE: You need to configure the Twitter API Bearer Token
-               before calling these services
+       NOTICE: You need to configure the Twitter API Bearer Tokens
+               before calling these services, each request is sent
+               with one of the tokens of tweets.tokens
     """
     HASHTAG = 0
     USER = 1
-    HEADERS = {'Authorization': f'Bearer {TWITTER_TOKEN}'}
+
+    # endpoint name and lookup key of each service, used by the cache
+    ENDPOINTS = {
+        HASHTAG: ('hashtags', 'hashtag'),
+        USER: ('users', 'screen_name'),
+    }
 
     def __init__(self, search_by, **kwargs):
         """Initialize the service instance base on param search_by"""
         if search_by == self.HASHTAG:
-            self._instance = TwitterSearchAPIService(self.HEADERS, **kwargs)
+            self._instance = TwitterSearchAPIService(**kwargs)
         elif search_by == self.USER:
-            self._instance = TwitterUserAPIService(self.HEADERS, **kwargs)
+            self._instance = TwitterUserAPIService(**kwargs)
+
+    @classmethod
+    def fetch_tweets(cls, search_by, **kwargs):
+        """Fetch the tweets upstream without going through the cache"""
+        service = cls(search_by, **kwargs)
+        service._instance.fetch_data()
+        return service._instance.get_tweets()
+
+    @classmethod
+    def _merge_newer(cls, previous, newer, count, metrics_max_age):
+        """Merge the newer tweets into the previous ones
+
+        :return: the count newest tweets and the kept previous tweets
+                 whose counts are older than metrics_max_age
+        """
+        kept = previous[:max(0, count - len(newer))]
+        # the cached tweets may be shared with other readers, the ones
+        # looked up again are copied instead of updated in place
+        stale_before = time.time() - metrics_max_age
+        kept = [
+            copy.copy(x) if x.metrics_at < stale_before else x
+            for x in kept
+        ]
+        return newer + kept, [x for x in kept if x.metrics_at < stale_before]
+
+    @classmethod
+    def fetch_newer_tweets(cls, search_by, previous, metrics_max_age=0,
+                           **kwargs):
+        """Refresh previously fetched tweets without fetching them again
+
+        Only the tweets newer than the newest previous tweet are fetched,
+        the previous tweets still in the window keep their content and
+        only get their counts looked up once older than metrics_max_age.
+
+        :param previous: tweets of the previous fetch, newest first
+        """
+        if not previous:
+            return cls.fetch_tweets(search_by, **kwargs)
+
+        tweets, stale = cls._merge_newer(
+            previous,
+            cls.fetch_tweets(search_by, since_id=previous[0].id, **kwargs),
+            kwargs['count'],
+            metrics_max_age
+        )
+        TwitterLookupAPIService(
+            stale,
+            headers=kwargs.get('headers')
+        ).fetch_data()
+        return tweets
+
+    @classmethod
+    def _get_cache_key(cls, search_by, kwargs):
+        """Pop the lookup key and the cursor out of kwargs"""
+        endpoint, key_name = cls.ENDPOINTS[search_by]
+        key = kwargs.pop(key_name)
+        cache_key = key
+        if kwargs.get('query') is not None:
+            # searches with filters are cached apart from the hashtag
+            cache_key = f'{key}?{kwargs["query"].key}'
+        cursor = kwargs.pop('cursor', None)
+        if cursor:
+            # older pages are cached apart from the first one
+            kwargs['until_id'] = cursor
+            return endpoint, key_name, key, f'{cache_key}<{cursor}'
+        return endpoint, key_name, key, cache_key
+
+    @classmethod
+    def _make_fetch(cls, search_by, cache, kwargs):
+        """Build the fetch callable of the cache for the key of kwargs"""
+        stored = cls._is_stored(search_by, kwargs)
+        endpoint, key_name, key, cache_key = \
+            cls._get_cache_key(search_by, kwargs)
+
+        def fetch(count, previous=None):
+            started_at = time.time()
+
+            def upstream():
+                kwargs[key_name] = key
+                if previous is not None:
+                    tweets = cls.fetch_newer_tweets(
+                        search_by, previous, cache.metrics_max_age,
+                        count=count, **kwargs
+                    )
+                else:
+                    tweets = cls.fetch_tweets(
+                        search_by, count=count, **kwargs
+                    )
+                if stored:
+                    cls.store_tweets(tweets)
+                return tweets
+
+            # result stored by a leader running in another worker
+            def shared_result():
+                entry = cache.get_entry(endpoint, cache_key)
+                if entry is not None and entry.fetched_at >= started_at \
+                        and entry.covers(count):
+                    return entry.tweets
+                return None
+
+            # concurrent callers of the same key share one upstream call
+            return get_single_flight().do(
+                f'{cache.make_key(endpoint, cache_key)}:{count}',
+                upstream,
+                shared_result
+            )
+
+        return endpoint, cache_key, fetch
+
+    @classmethod
+    def store_tweets(cls, tweets):
+        """Upsert the fetched tweets into the tweet store, if any
+
+        The store is a best effort, its errors never fail the request.
+        """
+        store = get_tweet_store()
+        if store is None:
+            return
+        try:
+            store.save(tweets)
+        except Exception as e:
+            logging.exception(f'Failed to store the tweets: {e}')
+
+    @classmethod
+    def _is_stored(cls, search_by, kwargs):
+        """Whether the page may be read out of the tweet store"""
+        # the filters of the queries are only evaluated upstream
+        return get_tweet_store() is not None and \
+            kwargs.get('query') is None
+
+    @classmethod
+    def _is_historical(cls, search_by, kwargs):
+        """Whether the page is older than what the recent search returns"""
+        return search_by == cls.HASHTAG and \
+            bool(kwargs.get('cursor')) and is_historical(kwargs['cursor'])
+
+    @classmethod
+    def get_stored_page(cls, search_by, count, key, cursor=None):
+        """Return a page of tweets read out of the tweet store"""
+        store = get_tweet_store()
+        if search_by == cls.HASHTAG:
+            return store.get_hashtag_page(key, count, cursor)
+        return store.get_user_page(key, count, cursor)
+
+    @classmethod
+    def get_buffered_page(cls, search_by, count, kwargs):
+        """Return the first page of a hashtag ingested from the stream
+
+        :return: None when the page is not in the hashtag buffers
+        """
+        buffers = get_hashtag_buffers()
+        if buffers is None or search_by != cls.HASHTAG or \
+                kwargs.get('cursor') or kwargs.get('query') is not None:
+            return None
+        return buffers.get_page(kwargs['hashtag'], count)
+
+    @classmethod
+    def get_window(cls, count, sort=None):
+        """Number of tweets fetched to return count tweets of a sort
+
+        The tweets are ranked among the TWEETS_SORT_WINDOW newest ones.
+        Both upstream apis return the newest tweets first, the most
+        recent tweets are the first count ones.
+        """
+        if sort is None or sort == 'recent':
+            return count
+        return min(
+            max(count, settings.TWEETS_SORT_WINDOW),
+            settings.TWEETS_MAX_LIMIT
+        )
+
+    @classmethod
+    def get_page(cls, search_by, sort=None, **kwargs):
+        """Return a page of tweets and the cursor of the next page
+
+        :param cursor: cursor returned along with the previous page
+        :param sort: return the count first tweets of the window
+                     instead, see tweets.entities.SORT_KEYS, a ranked
+                     page has no next page
+        """
+        if sort is not None:
+            # the window is cached like the pages of the plain requests
+            count = kwargs.pop('count')
+            tweets, _ = cls.get_page(
+                search_by, count=cls.get_window(count, sort), **kwargs
+            )
+            return top_tweets(tweets, sort, count), None
+
+        count = kwargs.pop('count')
+        page = cls.get_buffered_page(search_by, count, kwargs)
+        if page is not None:
+            return page
+
+        stored = cls._is_stored(search_by, kwargs)
+        key = kwargs[cls.ENDPOINTS[search_by][1]]
+        cursor = kwargs.get('cursor')
+        if stored and cls._is_historical(search_by, kwargs):
+            return cls.get_stored_page(search_by, count, key, cursor)
+
+        cache = get_response_cache()
+        endpoint, cache_key, fetch = cls._make_fetch(search_by, cache, kwargs)
+        try:
+            return cache.get_page(endpoint, cache_key, count, fetch)
+        except RateLimitExceeded as e:
+            # the stored tweets are better than no tweets at all
+            page = stored and cls.get_stored_page(
+                search_by, count, key, cursor
+            )
+            if not page or not page[0]:
+                raise
+            logging.warning(f'Answered {key} out of the tweet store: {e}')
+            return page
+
+    @classmethod
+    def refresh_page(cls, search_by, **kwargs):
+        """Fetch the tweets of a key into the cache ahead of the requests
+
+        The entry is refreshed incrementally when the cache is, and keeps
+        covering the largest count it was fetched with.
+        """
+        count = kwargs.pop('count')
+        cache = get_response_cache()
+        endpoint, cache_key, fetch = cls._make_fetch(search_by, cache, kwargs)
+
+        previous = None
+        entry = cache.get_entry(endpoint, cache_key)
+        if entry is not None and count <= entry.count:
+            count = entry.count
+            previous = cache.get_previous(entry)
+        # a larger count is fetched in full, the tweets newer than the
+        # entry alone would leave it short of the count
+        return cache.fetch(endpoint, cache_key, count, fetch, previous)
+
+    @classmethod
+    def get_max_age(cls, search_by, **kwargs):
+        """Return the seconds the cached page of kwargs is fresh for
+
+        :return: None when the responses of search_by are not cached
+        """
+        cache = get_response_cache()
+        endpoint, _, _, cache_key = \
+            cls._get_cache_key(search_by, dict(kwargs))
+        ttl = cache.get_ttl(endpoint)
+        if ttl <= 0:
+            return None
+        entry = cache.get_entry(endpoint, cache_key)
+        if entry is None:
+            return ttl
+        return max(0, math.ceil(ttl - entry.age))
 
     @classmethod
     def get_tweets(cls, search_by, **kwargs):
         """Universal interface to call the initialized service"""
+        return cls.get_page(search_by, **kwargs)[0]
+
+    @classmethod
+    def _get_packed_service(cls, counts, hashtags, headers):
+        # one upstream call for the hashtags of the query, the hashtags
+        # left short fetch the rest on their own
+        return TwitterPackedSearchAPIService(
+            hashtags,
+            count=min(
+                sum(counts[x] for x in hashtags),
+                TwitterPackedSearchAPIService.MAX_PAGE_SIZE
+            ),
+            headers=headers
+        )
+
+    @classmethod
+    def fetch_packed_tweets(cls, counts, headers=None):
+        """Fetch the tweets of several hashtags through OR queries
+
+        Each query costs one upstream call for all its hashtags, only the
+        hashtags with fewer tweets than their count in the combined
+        result fetch the older ones on their own.
+
+        :param counts: count of tweets of each lowercase hashtag
+        :return: the tweets of each hashtag
+        """
+        tweets = {}
+        for hashtags in TwitterPackedSearchAPIService.pack(list(counts)):
+            service = cls._get_packed_service(counts, hashtags, headers)
+            service.fetch_data()
+
+            found = service.get_tweets_by_hashtag(counts)
+            for hashtag in hashtags:
+                missing = counts[hashtag] - len(found[hashtag])
+                if missing > 0 and not service.exhausted:
+                    found[hashtag] += cls.fetch_tweets(
+                        cls.HASHTAG,
+                        hashtag=hashtag,
+                        count=missing,
+                        until_id=service.oldest_id,
+                        headers=headers
+                    )
+            tweets.update(found)
+        return tweets
+
+    @classmethod
+    def _split_hashtags(cls, counts):
+        """Split the hashtags between the cache and the packed queries
+
+        :return: the hashtags answered by the cache and the count to
+                 fetch of the other ones
+        """
+        cache = get_response_cache()
+        endpoint = cls.ENDPOINTS[cls.HASHTAG][0]
+        if cache.get_ttl(endpoint) <= 0:
+            return [], dict(counts)
+
+        cached = []
+        missing = {}
+        for hashtag, count in counts.items():
+            entry = cache.get_entry(endpoint, hashtag)
+            state, fetch_count = cache.check(endpoint, entry, count)
+            if state == MISS:
+                missing[hashtag] = cache.normalize_count(fetch_count)
+            else:
+                cached.append(hashtag)
+        return cached, missing
+
+    @classmethod
+    def _cache_pages(cls, counts, fetch_counts, tweets):
+        """Store the fetched tweets, return the page of each hashtag"""
+        cls.store_tweets(list(itertools.chain(*tweets.values())))
+        cache = get_response_cache()
+        endpoint = cls.ENDPOINTS[cls.HASHTAG][0]
+        pages = {}
+        for hashtag, found in tweets.items():
+            entry = CacheEntry(found, fetch_counts[hashtag])
+            if cache.get_ttl(endpoint) > 0:
+                cache.set_entry(endpoint, hashtag, entry)
+            pages[hashtag] = entry.get_page(counts[hashtag])
+        return pages
+
+    @classmethod
+    def get_hashtag_pages(cls, counts):
+        """Return the first page of several hashtags
+
+        The hashtags missing from the cache are fetched together through
+        fetch_packed_tweets() and cached one by one.
+
+        :param counts: count of tweets of each lowercase hashtag
+        :return: the tweets and the cursor of each hashtag
+        """
+        cached, missing = cls._split_hashtags(counts)
+        if len(missing) == 1:
+            # nothing to pack the hashtag with
+            cached += list(missing)
+            missing = {}
+
+        pages = {
+            x: cls.get_page(cls.HASHTAG, hashtag=x, count=counts[x])
+            for x in cached
+        }
+        if missing:
+            pages.update(cls._cache_pages(
+                counts, missing, cls.fetch_packed_tweets(missing)
+            ))
+        return pages
+
+    @classmethod
+    def iter_tweets(cls, search_by, sort=None, fields=None, **kwargs):
+        """Return an iterator of the tweets for streaming responses
+
+        A fresh cached entry is used when it covers count, otherwise the
+        tweets are normalized as the upstream pages arrive and are not
+        cached, so that they never need to be held in memory at once.
+        The whole window of a sort is ranked before the first tweet.
+
+        :param fields: fields of the response, the tweets that are not
+                       cached are only fetched with these fields
+        """
+        if sort is not None:
+            return iter(cls.get_page(search_by, sort, **kwargs)[0])
+
+        endpoint, key_name, key, cache_key = \
+            cls._get_cache_key(search_by, kwargs)
+        count = kwargs['count']
+        cache = get_response_cache()
+
+        entry = cache.get_entry(endpoint, cache_key)
+        if cache.check(endpoint, entry, count)[0] == HIT:
+            return iter(entry.get_page(count)[0])
+
+        kwargs[key_name] = key
+        return cls(search_by, fields=fields, **kwargs)._instance.iter_tweets()
+
+    @classmethod
+    async def afetch_tweets(cls, search_by, **kwargs):
+        """Same as fetch_tweets() through the async client"""
         service = cls(search_by, **kwargs)
-        service._instance.fetch_data()
+        await service._instance.afetch_data()
         return service._instance.get_tweets()
 
+    @classmethod
+    async def afetch_newer_tweets(cls, search_by, previous,
+                                  metrics_max_age=0, **kwargs):
+        """Same as fetch_newer_tweets() through the async client"""
+        if not previous:
+            return await cls.afetch_tweets(search_by, **kwargs)
+
+        tweets, stale = cls._merge_newer(
+            previous,
+            await cls.afetch_tweets(
+                search_by, since_id=previous[0].id, **kwargs
+            ),
+            kwargs['count'],
+            metrics_max_age
+        )
+        await TwitterLookupAPIService(
+            stale,
+            headers=kwargs.get('headers')
+        ).afetch_data()
+        return tweets
+
+    @classmethod
+    async def aget_page(cls, search_by, sort=None, **kwargs):
+        """Same as get_page() for the async views"""
+        if sort is not None:
+            count = kwargs.pop('count')
+            tweets, _ = await cls.aget_page(
+                search_by, count=cls.get_window(count, sort), **kwargs
+            )
+            return top_tweets(tweets, sort, count), None
+
+        page = await sync_to_async(cls.get_buffered_page)(
+            search_by, kwargs['count'], kwargs
+        )
+        if page is not None:
+            return page
+
+        stored = cls._is_stored(search_by, kwargs)
+        cursor = kwargs.get('cursor')
+        endpoint, key_name, key, cache_key = \
+            cls._get_cache_key(search_by, kwargs)
+        count = kwargs.pop('count')
+        cache = get_response_cache()
+        if stored and cls._is_historical(search_by, {'cursor': cursor}):
+            return await _store_sync_to_async(cls.get_stored_page)(
+                search_by, count, key, cursor
+            )
+
+        async def fetch(count, previous=None):
+            async def upstream():
+                kwargs[key_name] = key
+                if previous is not None:
+                    tweets = await cls.afetch_newer_tweets(
+                        search_by, previous, cache.metrics_max_age,
+                        count=count, **kwargs
+                    )
+                else:
+                    tweets = await cls.afetch_tweets(
+                        search_by, count=count, **kwargs
+                    )
+                if stored:
+                    await _store_sync_to_async(cls.store_tweets)(tweets)
+                return tweets
+
+            return await async_single_flight.do(
+                f'{cache.make_key(endpoint, cache_key)}:{count}',
+                upstream
+            )
+
+        try:
+            return await cache.aget_page(endpoint, cache_key, count, fetch)
+        except RateLimitExceeded as e:
+            page = stored and await _store_sync_to_async(cls.get_stored_page)(
+                search_by, count, key, cursor
+            )
+            if not page or not page[0]:
+                raise
+            logging.warning(f'Answered {key} out of the tweet store: {e}')
+            return page
+
+    @classmethod
+    async def aget_tweets(cls, search_by, **kwargs):
+        """Same as get_tweets() for the async views"""
+        return (await cls.aget_page(search_by, **kwargs))[0]
+
+    @classmethod
+    async def afetch_packed_tweets(cls, counts, headers=None):
+        """Same as fetch_packed_tweets() through the async client
+
+        The hashtags left short by a query fetch the rest concurrently.
+        """
+        tweets = {}
+        for hashtags in TwitterPackedSearchAPIService.pack(list(counts)):
+            service = cls._get_packed_service(counts, hashtags, headers)
+            await service.afetch_data()
+
+            found = service.get_tweets_by_hashtag(counts)
+            short = [
+                x for x in hashtags
+                if len(found[x]) < counts[x] and not service.exhausted
+            ]
+            older = await asyncio.gather(*[
+                cls.afetch_tweets(
+                    cls.HASHTAG,
+                    hashtag=x,
+                    count=counts[x] - len(found[x]),
+                    until_id=service.oldest_id,
+                    headers=headers
+                )
+                for x in short
+            ])
+            for hashtag, rest in zip(short, older):
+                found[hashtag] += rest
+            tweets.update(found)
+        return tweets
+
+    @classmethod
+    async def aget_hashtag_pages(cls, counts):
+        """Same as get_hashtag_pages() for the async views"""
+        cached, missing = await sync_to_async(cls._split_hashtags)(counts)
+        if len(missing) == 1:
+            cached += list(missing)
+            missing = {}
+
+        pages = dict(zip(cached, await asyncio.gather(*[
+            cls.aget_page(cls.HASHTAG, hashtag=x, count=counts[x])
+            for x in cached
+        ])))
+        if missing:
+            tweets = await cls.afetch_packed_tweets(missing)
+            pages.update(await _store_sync_to_async(cls._cache_pages)(
+                counts, missing, tweets
+            ))
+        return pages
+
 
 class TwitterSearchAPIService:
     RECENT_SEARCH_API = 'https://api.twitter.com/2/tweets/search/recent'
+    # max_results accepted by the recent search api
+    MIN_PAGE_SIZE = 10
+    MAX_PAGE_SIZE = 100
 
-    def __init__(self, headers, hashtag, count):
+    def __init__(self, hashtag, count, until_id=None, since_id=None,
+                 headers=None, query=None, fields=None):
         """Initialize the Search API service
 
         :param hashtag: tweets with given hashtag
         :param count: number of tweets that return
+        :param until_id: only return tweets older than this id
+        :param since_id: only return tweets newer than this id
+        :param headers: headers with the credentials of the requests,
+                        by default a token of the pool is picked
+        :param query: tweets.queries.TweetQuery searched instead of the
+                      hashtag alone
+        :param fields: only fetch the upstream fields of these fields of
+                       the response, all of them by default
         """
         self._headers = headers
         self.hashtag = hashtag
         self.count = count
+        self.until_id = until_id
+        self.since_id = since_id
+        self.query = query
+        self.fields = fields
         self._tweets = []
+        # token of the page following the fetched tweets
+        self.next_token = None
+        # tweets returned upstream, before the filters of the query
+        self.scanned = 0
+        # the authors are resolved out of the account cache instead of
+        # being expanded in every page
+        self.resolves_authors = resolves_authors()
 
-    def fetch_data(self):
+    def get_query(self):
+        if self.query is not None:
+            return self.query.get_query()
+        return f'#{self.hashtag}'
+
+    def is_done(self):
+        """Whether to stop following the pages"""
+        # the tweets filtered out are only scanned up to a bound
+        return not self.next_token or len(self._tweets) >= self.count or \
+            self.scanned >= settings.TWEETS_MAX_SCANNED
+
+    def _get_fields_params(self):
+        """Build the fields and the expansions of the requests"""
+        if self.fields is None:
+            if self.resolves_authors:
+                return {
+                    'tweet.fields':
+                        'entities,created_at,public_metrics,author_id',
+                }
+            return {
+                'tweet.fields': 'entities,created_at,public_metrics',
+                'user.fields': 'name,username',
+                'expansions': 'author_id',
+            }
+
+        tweet_fields = {TWEET_FIELDS[x] for x in self.fields
+                        if x in TWEET_FIELDS}
+        if self.query is not None:
+            tweet_fields |= self.query.tweet_fields
+        params = {}
+        if 'account' in self.fields:
+            if self.resolves_authors:
+                tweet_fields.add('author_id')
+            else:
+                params['user.fields'] = 'name,username'
+                params['expansions'] = 'author_id'
+        if tweet_fields:
+            params['tweet.fields'] = ','.join(sorted(tweet_fields))
+        return params
+
+    def _get_payload(self, next_token=None, remaining=None):
         # when count < 10, twitter api would throw out an error
         # ensure minimum value of count is equal or larger than 10
-        max_results = 10 if self.count < 10 else self.count
+        if remaining is None:
+            remaining = self.count - len(self._tweets)
+        max_results = min(
+            max(remaining, self.MIN_PAGE_SIZE),
+            self.MAX_PAGE_SIZE
+        )
+        if self.query is not None and self.query.has_local_filters:
+            # most tweets may be filtered out, ask for full pages
+            max_results = self.MAX_PAGE_SIZE
 
         payload = {
-            'query': f'#{self.hashtag}',
+            'query': self.get_query(),
             'max_results': max_results,
-            'tweet.fields': 'entities,created_at,public_metrics',
-            'user.fields': 'id,url,name,username',
-            'expansions': 'author_id',
         }
+        payload.update(self._get_fields_params())
+        if next_token:
+            payload['next_token'] = next_token
+        if self.until_id:
+            payload['until_id'] = self.until_id
+        if self.since_id:
+            payload['since_id'] = self.since_id
+        if self.query is not None:
+            payload.update(self.query.get_params())
+        return payload
 
-        res = requests.get(
-            self.RECENT_SEARCH_API,
-            headers=self._headers,
-            params=payload
-        )
+    def _decode(self, res):
+        """Return the parsed page, None when it has no tweets"""
+        # the body is parsed once and only the parsed data is used
+        data = http.decode(res)
 
         # failed to request tweets via twitter api
-        if not res.ok:
-            raise Exception(res.json())
+        if not http.is_ok(res):
+            raise TwitterAPIError(data, res.status_code)
 
         # no tweets found
-        if res.json()['meta']['result_count'] == 0:
-            return
-
-        tweets = res.json()['data']
+        if data['meta']['result_count'] == 0:
+            return None
+        return data
 
+    def _get_users(self, data):
+        """Return the accounts of the page by id and the missing ids"""
         users = {}
-        for user in res.json()['includes']['users']:
-            users[user['id']] = user
+        for user in data.get('includes', {}).get('users', ()):
+            users[user['id']] = intern_account(
+                user['id'], user['name'], user['username']
+            )
+        if not self.resolves_authors:
+            return users, set()
 
-        for tweet in tweets:
-            tweet['user'] = users[tweet['author_id']]
+        author_ids = {x['author_id'] for x in data['data']
+                      if 'author_id' in x}
+        users.update(get_account_cache().get_many(author_ids - set(users)))
+        return users, author_ids - set(users)
 
-        self._tweets = tweets
+    def _lookup_users(self, ids):
+        return TwitterUsersLookupAPIService(ids, headers=self._headers)
 
-    @classmethod
-    def _get_account(cls, tweet):
-        """Get account from field user"""
-        return {
-            'fullname': tweet['user']['name'],
-            'href': f"/{tweet['user']['username']}",
-            'id': tweet['user']['id']
-        }
+    def _process_response(self, res, remaining=None):
+        """Collect the tweets of one page, return the next page token
 
-    @classmethod
-    def _get_date(cls, tweet):
-        """Get date from field tweet"""
-        created_at = datetime.datetime.strptime(
-            tweet['created_at'], '%Y-%m-%dT%H:%M:%S.%fZ')
-        return created_at.strftime('%-H:%M %p - %-d %b %Y')
+        :param remaining: number of tweets still needed, the tweets past
+                          it are not normalized
+        """
+        data = self._decode(res)
+        if data is None:
+            return None
 
-    @classmethod
-    def _get_hashtags(cls, tweet):
-        """Get hashtags from field tweet"""
-        return [f"#{x['tag']}" for x in tweet['entities'].get('hashtags', [])]
+        users, missing = self._get_users(data)
+        if missing:
+            service = self._lookup_users(missing)
+            service.fetch_data()
+            users.update(service.users)
+        return self._collect(data, users, remaining)
 
-    @classmethod
-    def _get_likes_count(cls, tweet):
-        """Get likes count from field tweet"""
-        return tweet['public_metrics']['like_count']
+    async def _aprocess_response(self, res):
+        """Same as _process_response() through the async client"""
+        data = self._decode(res)
+        if data is None:
+            return None
 
-    @classmethod
-    def _get_replies_count(cls, tweet):
-        """Get replies count from field tweet"""
-        return tweet['public_metrics']['reply_count']
+        users, missing = self._get_users(data)
+        if missing:
+            service = self._lookup_users(missing)
+            await service.afetch_data()
+            users.update(service.users)
+        return self._collect(data, users)
 
-    @classmethod
-    def _get_retweets_count(cls, tweet):
-        """Get retweet count from field tweet"""
-        return tweet['public_metrics']['retweet_count']
+    def _collect(self, data, users, remaining=None):
+        # only the normalized tweets outlive the parsed body, the tweets
+        # are normalized lazily up to the ones still needed
+        if remaining is None:
+            remaining = self.count - len(self._tweets)
+        fetched_at = time.time()
+        tweets = (normalize(x, users, fetched_at) for x in data['data'])
+        if self.resolves_authors and \
+                (self.fields is None or 'account' in self.fields):
+            # the authors unknown to the users lookup are suspended or
+            # deleted, their tweets can't be returned
+            tweets = (x for x in tweets if x.account is not None)
+        if self.query is not None and self.query.has_filters:
+            tweets = filter(self.query.matches, tweets)
+        tweets = list(itertools.islice(tweets, max(remaining, 0)))
+        self._tweets.extend(tweets)
+        # a selection of fields may leave the counts out
+        if self.fields is None:
+            _share_metrics(tweets)
+        self.scanned += len(data['data'])
+        return data['meta'].get('next_token')
 
-    @classmethod
-    def _get_text(cls, tweet):
-        """Get text from field tweet"""
-        return tweet['text']
+    def fetch_data(self):
+        # follow next_token until enough tweets have been collected,
+        # the pages depend on each other so they can't be fetched at once
+        while True:
+            res = http.get(
+                self.RECENT_SEARCH_API,
+                headers=self._headers,
+                params=self._get_payload(self.next_token)
+            )
+            self.next_token = self._process_response(res)
+            if self.is_done():
+                break
+
+    async def afetch_data(self):
+        """Same as fetch_data() through the async client"""
+        while True:
+            res = await http.aget(
+                self.RECENT_SEARCH_API,
+                headers=self._headers,
+                params=self._get_payload(self.next_token)
+            )
+            self.next_token = await self._aprocess_response(res)
+            if self.is_done():
+                break
+
+    def iter_tweets(self):
+        """Fetch the tweets page by page and yield them
+
+        Only the tweets of the current page are kept in memory.
+        """
+        remaining = self.count
+        next_token = None
+        while remaining > 0:
+            self._tweets = []
+            res = http.get(
+                self.RECENT_SEARCH_API,
+                headers=self._headers,
+                params=self._get_payload(next_token, remaining)
+            )
+            next_token = self._process_response(res, remaining)
+
+            yield from self._tweets
+            remaining -= len(self._tweets)
+
+            if not next_token or \
+                    self.scanned >= settings.TWEETS_MAX_SCANNED:
+                break
 
     def get_tweets(self):
-        res = []
+        # ensure to return the correct number of items
+        return self._tweets[:self.count]
+
+
+class TwitterPackedSearchAPIService(TwitterSearchAPIService):
+    """Search the tweets of several hashtags with one OR query
+
+       The newest tweets of all the hashtags are fetched together and
+       split back per hashtag from their entities. Every hashtag gets all
+       its tweets newer than the oldest fetched tweet, a hashtag that got
+       fewer than its count has to fetch the rest with until_id.
+    """
+    MAX_QUERY_LENGTH = MAX_QUERY_LENGTH
+
+    def __init__(self, hashtags, count, headers=None):
+        """Initialize the packed search service
+
+        :param hashtags: lowercase hashtags fitting in one query, see
+                         pack()
+        :param count: number of tweets of all the hashtags that return
+        """
+        super().__init__(None, count, headers=headers)
+        self.hashtags = hashtags
+
+    @classmethod
+    def pack(cls, hashtags):
+        """Split the hashtags into lists fitting in one query each"""
+        packs = []
+        pack = []
+        length = 0
+        for hashtag in hashtags:
+            # '#' before each hashtag and ' OR ' between them
+            size = len(hashtag) + 1
+            if pack and length + 4 + size > cls.MAX_QUERY_LENGTH:
+                packs.append(pack)
+                pack = []
+                length = 0
+            length += size + (4 if pack else 0)
+            pack.append(hashtag)
+        if pack:
+            packs.append(pack)
+        return packs
+
+    def get_query(self):
+        return ' OR '.join(f'#{x}' for x in self.hashtags)
+
+    def _collect(self, data, users, remaining=None):
+        # the whole page is split, the tweets past the count may be the
+        # only ones of a hashtag and exhausted assumes none was skipped
+        return super()._collect(data, users, len(data['data']))
+
+    @property
+    def exhausted(self):
+        """Whether every tweet of the hashtags has been fetched"""
+        return self.next_token is None
+
+    @property
+    def oldest_id(self):
+        return self._tweets[-1].id if self._tweets else None
+
+    def get_tweets_by_hashtag(self, counts):
+        """Split the tweets per hashtag
+
+        :param counts: max count of tweets of each hashtag
+        """
+        tweets = {x: [] for x in self.hashtags}
         for tweet in self._tweets:
-            item = {}
-            item['account'] = self._get_account(tweet)
-            item['date'] = self._get_date(tweet)
-            item['hashtags'] = self._get_hashtags(tweet)
-            item['likes'] = self._get_likes_count(tweet)
-            item['replies'] = self._get_replies_count(tweet)
-            item['retweets'] = self._get_retweets_count(tweet)
-            item['text'] = self._get_text(tweet)
+            # a tweet may carry several of the hashtags
+            for hashtag in {x.lower() for x in tweet.hashtags}:
+                found = tweets.get(hashtag)
+                if found is not None and len(found) < counts[hashtag]:
+                    found.append(tweet)
+        return tweets
 
-            res.append(item)
 
-        # ensure to return the correct number of items
-        return res[:self.count]
+class TwitterLookupAPIService:
+    """Update the counts of tweets through the tweets lookup API (v2)"""
+    LOOK_UP_API = 'https://api.twitter.com/2/tweets'
+    # ids accepted by one call of the lookup api
+    BATCH_SIZE = 100
+
+    def __init__(self, tweets, replies_only=False, headers=None):
+        """Initialize the lookup service
+
+        :param tweets: tweets whose counts are updated in place
+        :param replies_only: only update the replies count, the only one
+                             missing from the v1.1 APIs
+        """
+        self._headers = headers
+        self.tweets = tweets
+        self.replies_only = replies_only
+
+    def _get_cached_metrics(self):
+        """Set the counts of the tweets found in the metrics cache
+
+        :return: the tweets left to look up
+        """
+        metrics_cache = get_metrics_cache()
+        if metrics_cache is None:
+            return self.tweets
+
+        cached = metrics_cache.get_many([x.id for x in self.tweets])
+        missing = []
+        for tweet in self.tweets:
+            item = cached.get(tweet.id)
+            if item is None or \
+                    (not self.replies_only and item[3] <= tweet.metrics_at):
+                missing.append(tweet)
+            elif self.replies_only:
+                tweet.replies = item[1]
+            else:
+                (tweet.likes, tweet.replies, tweet.retweets,
+                 tweet.metrics_at) = item
+        return missing
+
+    def _get_payloads(self, tweets):
+        tweet_ids = [x.id for x in tweets]
+
+        # the lookup api accepts 100 ids per call
+        return [
+            {
+                'ids': ','.join(tweet_ids[i:i + self.BATCH_SIZE]),
+                'tweet.fields': 'public_metrics',
+            }
+            for i in range(0, len(tweet_ids), self.BATCH_SIZE)
+        ]
+
+    def _process_responses(self, lookup_responses, tweets):
+        metrics = {}
+        for lookup_res in lookup_responses:
+            data = http.decode(lookup_res)
+            if not http.is_ok(lookup_res):
+                raise TwitterAPIError(data, lookup_res.status_code)
+
+            for item in data.get('data', []):
+                metrics[item['id']] = item['public_metrics']
+
+        fetched_at = time.time()
+        found = []
+        for tweet in tweets:
+            item = metrics.get(tweet.id)
+            # deleted tweets are missing from the lookup response
+            if item is None:
+                if self.replies_only:
+                    tweet.replies = 0
+                continue
+
+            tweet.replies = item['reply_count']
+            if not self.replies_only:
+                tweet.likes = item['like_count']
+                tweet.retweets = item['retweet_count']
+                tweet.metrics_at = fetched_at
+            found.append(tweet)
+        _share_metrics(found)
+
+    def fetch_data(self):
+        # the ids with fresh counts in the metrics cache are not looked up
+        tweets = self._get_cached_metrics()
+        if not tweets:
+            return
+
+        # the chunks of ids are looked up concurrently
+        self._process_responses(http.get_many(
+            self.LOOK_UP_API,
+            self._get_payloads(tweets),
+            headers=self._headers
+        ), tweets)
+
+    async def afetch_data(self):
+        """Same as fetch_data() through the async client"""
+        tweets = self._get_cached_metrics()
+        if not tweets:
+            return
+
+        self._process_responses(await http.aget_many(
+            self.LOOK_UP_API,
+            self._get_payloads(tweets),
+            headers=self._headers
+        ), tweets)
+
+
+class TwitterUsersLookupAPIService:
+    """Resolve authors by id through the users lookup API (v2)"""
+    LOOK_UP_API = 'https://api.twitter.com/2/users'
+    # ids accepted by one call of the lookup api
+    BATCH_SIZE = 100
+
+    def __init__(self, ids, headers=None):
+        """Initialize the users lookup service
+
+        :param ids: ids of the authors to resolve
+        """
+        self._headers = headers
+        self.ids = sorted(ids)
+        # accounts found by id, interned in the account cache
+        self.users = {}
+
+    def _get_payloads(self):
+        return [
+            {
+                'ids': ','.join(self.ids[i:i + self.BATCH_SIZE]),
+                'user.fields': 'name,username',
+            }
+            for i in range(0, len(self.ids), self.BATCH_SIZE)
+        ]
+
+    def _process_responses(self, lookup_responses):
+        for lookup_res in lookup_responses:
+            data = http.decode(lookup_res)
+            if not http.is_ok(lookup_res):
+                raise TwitterAPIError(data, lookup_res.status_code)
+
+            # suspended or deleted users are missing from the response
+            for user in data.get('data', []):
+                self.users[user['id']] = intern_account(
+                    user['id'], user['name'], user['username']
+                )
+
+    def fetch_data(self):
+        self._process_responses(http.get_many(
+            self.LOOK_UP_API,
+            self._get_payloads(),
+            headers=self._headers
+        ))
+
+    async def afetch_data(self):
+        """Same as fetch_data() through the async client"""
+        self._process_responses(await http.aget_many(
+            self.LOOK_UP_API,
+            self._get_payloads(),
+            headers=self._headers
+        ))
 
 
 class TwitterUserAPIService:
     USER_TIMELINE_API = \
         'https://api.twitter.com/1.1/statuses/user_timeline.json'
-    LOOK_UP_API = 'https://api.twitter.com/2/tweets'
+    LOOK_UP_API = TwitterLookupAPIService.LOOK_UP_API
+    # count accepted by the user timeline api
+    MIN_PAGE_SIZE = 10
+    MAX_PAGE_SIZE = 200
 
-    def __init__(self, headers, screen_name, count):
+    def __init__(self, screen_name, count, until_id=None, since_id=None,
+                 headers=None, fields=None):
         """Initialize user service
 
         :param screen_name: tweeter's screen_name
         :param count: number of tweets that return
+        :param until_id: only return tweets older than this id
+        :param since_id: only return tweets newer than this id
+        :param headers: headers with the credentials of the requests,
+                        by default a token of the pool is picked
+        :param fields: only fetch the upstream fields of these fields of
+                       the response, all of them by default
         """
         self._headers = headers
         self.screen_name = screen_name
         self.count = count
+        self.until_id = until_id
+        self.since_id = since_id
+        self.fields = fields
         self._tweets = []
+        # accounts by id, shared by the tweets of the timeline
+        self._users = {}
 
-    def fetch_data(self):
+    def _get_timeline_payload(self, tweets, remaining=None):
         # when count < 10, twitter api will throw an error
         # ensure minimum value of count is equal or larger than 10
-        max_results = 10 if self.count < 10 else self.count
+        if remaining is None:
+            remaining = self.count - len(tweets)
+        max_results = min(
+            max(remaining, self.MIN_PAGE_SIZE),
+            self.MAX_PAGE_SIZE
+        )
 
-        timeline_payload = {
+        payload = {
             'screen_name': self.screen_name,
             'count': max_results
         }
+        if self.fields is not None:
+            # the v1.1 api only lets the users and the entities out
+            if 'account' not in self.fields:
+                payload['trim_user'] = 'true'
+            if 'hashtags' not in self.fields:
+                payload['include_entities'] = 'false'
 
-        timeline_res = requests.get(
-            self.USER_TIMELINE_API,
-            headers=self._headers,
-            params=timeline_payload
-        )
+        # max_id is inclusive, continue right below the oldest tweet
+        if tweets:
+            payload['max_id'] = int(tweets[-1].id) - 1
+        elif self.until_id:
+            payload['max_id'] = int(self.until_id) - 1
+        if self.since_id:
+            payload['since_id'] = self.since_id
+        return payload
+
+    def _process_timeline(self, timeline_res, remaining):
+        """Return the normalized tweets of the timeline response
 
+        :param remaining: number of tweets still needed, the tweets past
+                          it are not normalized
+        """
         # twitter user timeline api v1.1 return 404 status code while
         # there's no result found
         if timeline_res.status_code == 404:
-            return
+            return []
 
-        if not timeline_res.ok:
-            raise Exception(f'Error: {timeline_res.json()}')
+        data = http.decode(timeline_res)
+        if not http.is_ok(timeline_res):
+            raise TwitterAPIError(data, timeline_res.status_code)
 
-        # user_timeline api (1.1) has not provided the likes count in response
-        # and so  it's necessary to call lookup api (2.0)
-        # to get the replies count for each tweets
-        tweets = timeline_res.json()
-        tweet_ids = [str(x['id']) for x in tweets]
+        # the authors are interned before the tweets are built, the
+        # accounts are then shared with the other timelines and searches
+        for item in data[:remaining]:
+            user = item['user']
+            if user['id_str'] not in self._users and 'screen_name' in user:
+                self._users[user['id_str']] = intern_account(
+                    user['id_str'], user['name'], user['screen_name']
+                )
 
-        lookup_payload = {
-            'ids': ','.join(tweet_ids),
-            'tweet.fields': 'public_metrics',
-        }
+        fetched_at = time.time()
+        return [
+            normalize(x, self._users, fetched_at) for x in data[:remaining]
+        ]
 
-        lookup_res = requests.get(
-            self.LOOK_UP_API,
-            headers=self._headers,
-            params=lookup_payload
+    def _lookup(self, tweets):
+        # user_timeline api (1.1) has not provided the replies count in
+        # response and so it's necessary to call lookup api (2.0)
+        if self.fields is not None and 'replies' not in self.fields:
+            tweets = []
+        return TwitterLookupAPIService(
+            tweets,
+            replies_only=True,
+            headers=self._headers
         )
 
-        if not timeline_res.ok:
-            raise Exception(f'Error: {timeline_res.json()}')
-
-        lookup_data = lookup_res.json()['data']
-        replies_count = {}
-        for item in lookup_data:
-            replies_count[item['id']] = item['public_metrics']['reply_count']
-
-        for tweet in tweets:
-            tweet['replies_count'] = replies_count[str(tweet['id'])]
+    def fetch_data(self):
+        # page through the timeline with max_id until count is reached
+        tweets = []
+        while len(tweets) < self.count:
+            params = self._get_timeline_payload(tweets)
+            timeline_res = http.get(
+                self.USER_TIMELINE_API,
+                headers=self._headers,
+                params=params
+            )
+            page = self._process_timeline(
+                timeline_res,
+                self.count - len(tweets)
+            )
+            if not page:
+                break
+            tweets.extend(page)
+            # a short page of newer tweets leaves nothing newer to fetch
+            if self.since_id and len(page) < params['count']:
+                break
 
+        self._lookup(tweets).fetch_data()
         self._tweets = tweets
 
-    def _get_account(self, tweet):
-        # get the user of the tweet
-        user = tweet['user']
-
-        return{
-            'fullname': user['name'],
-            'href': f"/{user['screen_name']}",
-            'id': str(user['id'])
-        }
-
-    def _get_date(self, tweet):
-        # tweet's created time
-        # response's format: "Wed Sep 23 17:08:34 +0000 2020"
-        created_at = datetime.datetime.strptime(
-            tweet['created_at'], '%a %b %d %H:%M:%S +0000 %Y')
-        return created_at.strftime('%-H:%M %p - %-d %b %Y')
+    async def afetch_data(self):
+        """Same as fetch_data() through the async client
 
-    def _get_hashtags(self, tweet):
-        return [f"#{x['text']}" for x in tweet['entities'].get('hashtags', [])]
+        The lookup calls need the ids returned by the timeline calls so
+        they run after them, but none of them blocks the worker while
+        waiting on twitter.
+        """
+        tweets = []
+        while len(tweets) < self.count:
+            params = self._get_timeline_payload(tweets)
+            timeline_res = await http.aget(
+                self.USER_TIMELINE_API,
+                headers=self._headers,
+                params=params
+            )
+            page = self._process_timeline(
+                timeline_res,
+                self.count - len(tweets)
+            )
+            if not page:
+                break
+            tweets.extend(page)
+            # a short page of newer tweets leaves nothing newer to fetch
+            if self.since_id and len(page) < params['count']:
+                break
 
-    def _get_likes_count(self, tweet):
-        return tweet['favorite_count']
+        await self._lookup(tweets).afetch_data()
+        self._tweets = tweets
 
-    def _get_replies_count(self, tweet):
-        return tweet['replies_count']
+    def iter_tweets(self):
+        """Fetch the tweets page by page and yield them
 
-    def _get_retweets_count(self, tweet):
-        return tweet['retweet_count']
+        Each timeline page is looked up before the next one is
+        requested, only the tweets of that page are kept.
+        """
+        remaining = self.count
+        page = []
+        while remaining > 0:
+            timeline_res = http.get(
+                self.USER_TIMELINE_API,
+                headers=self._headers,
+                params=self._get_timeline_payload(page, remaining)
+            )
+            page = self._process_timeline(timeline_res, remaining)
+            if not page:
+                break
 
-    def _get_text(self, tweet):
-        return tweet['text']
+            self._lookup(page).fetch_data()
+            yield from page
+            remaining -= len(page)
 
     def get_tweets(self):
-        res = []
-        for tweet in self._tweets:
-            item = {}
-            item['account'] = self._get_account(tweet)
-            item['date'] = self._get_date(tweet)
-            item['hashtags'] = self._get_hashtags(tweet)
-            item['likes'] = self._get_likes_count(tweet)
-            item['replies'] = self._get_replies_count(tweet)
-            item['retweets'] = self._get_retweets_count(tweet)
-            item['text'] = self._get_text(tweet)
-
-            res.append(item)
-
         # ensure to return the correct number of items
-        return res[:self.count]
+        return self._tweets[:self.count]
@@ -0,0 +1,195 @@
+import asyncio
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+from tweets.backends import DjangoCache, configured_by, load_backend
+
+
+class CacheLock(DjangoCache):
+    """Lock shared by the workers through the django cache framework
+
+    It relies on cache.add() being atomic, which holds for the memcached,
+    redis and database backends but not across processes for locmem.
+    """
+    prefix = 'tweets-flight:'
+
+    def acquire(self, key, timeout):
+        """Try to take the lock, return a token on success"""
+        token = uuid.uuid4().hex
+        if self._cache.add(self._prefix + key, token, timeout):
+            return token
+        return None
+
+    def release(self, key, token):
+        key = self._prefix + key
+        if self._cache.get(key) == token:
+            self._cache.delete(key)
+
+    def locked(self, key):
+        return self._cache.get(self._prefix + key) is not None
+
+
+LOCK_BACKENDS = {
+    'django': CacheLock,
+}
+
+
+class CallCancelled(Exception):
+    """The leader of a call was cancelled before it completed"""
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Run one upstream call per key and share it with concurrent callers
+
+       Callers of the same process wait on the leader's call. With a lock
+       backend the leader also takes a lock shared by every worker, other
+       workers then poll for the leader's result (usually written into
+       the shared response cache) instead of calling upstream themselves.
+    """
+
+    def __init__(self, lock=None, lock_timeout=10, poll_interval=0.05):
+        self.lock = lock
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._counters = {'leaders': 0, 'coalesced': 0, 'remote_coalesced': 0}
+
+    def _incr(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self):
+        """Return the counters of leader and coalesced requests"""
+        with self._lock:
+            return dict(self._counters)
+
+    def do(self, key, fn, shared_result=None):
+        """Call fn once for all the concurrent callers of key
+
+        :param shared_result: callable returning the result published by
+                              a leader of another worker, or None
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._counters['leaders'] += 1
+            else:
+                self._counters['coalesced'] += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run(key, fn, shared_result)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+        return call.result
+
+    def _run(self, key, fn, shared_result):
+        if self.lock is None or shared_result is None:
+            return fn()
+
+        token = self.lock.acquire(key, self.lock_timeout)
+        if token is not None:
+            try:
+                return fn()
+            finally:
+                self.lock.release(key, token)
+
+        # another worker is fetching the same key, wait for its result
+        # and only fall back to calling upstream if it never shows up
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            result = shared_result()
+            if result is not None:
+                self._incr('remote_coalesced')
+                return result
+            if not self.lock.locked(key):
+                break
+
+        result = shared_result()
+        if result is not None:
+            self._incr('remote_coalesced')
+            return result
+        return fn()
+
+
+class AsyncSingleFlight:
+    """SingleFlight for the coroutines of the async services
+
+       Coalescing only happens between the coroutines of the process,
+       the workers of an ASGI deployment still fetch on their own.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._counters = {'leaders': 0, 'coalesced': 0}
+
+    def stats(self):
+        return dict(self._counters)
+
+    async def do(self, key, fn):
+        """Await fn() once for all the concurrent callers of key"""
+        future = self._calls.get(key)
+        if future is not None:
+            self._counters['coalesced'] += 1
+            # a cancelled follower must not cancel the leader's call
+            return await asyncio.shield(future)
+
+        self._counters['leaders'] += 1
+        future = self._calls[key] = asyncio.get_event_loop().create_future()
+        try:
+            result = await fn()
+        except Exception as e:
+            future.set_exception(e)
+            # mark the exception as retrieved when nobody was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+            if not future.done():
+                # the leader was cancelled, e.g. by a closed live channel,
+                # which the followers must not wait for forever
+                future.set_exception(CallCancelled(key))
+                future.exception()
+
+
+async_single_flight = AsyncSingleFlight()
+
+
+@configured_by('TWEETS_SINGLE_FLIGHT')
+def get_single_flight():
+    """Return the single flight configured by settings.TWEETS_SINGLE_FLIGHT"""
+    conf = settings.TWEETS_SINGLE_FLIGHT
+    return SingleFlight(
+        lock=load_backend(conf, LOCK_BACKENDS, name='LOCK_BACKEND'),
+        lock_timeout=conf.get('LOCK_TIMEOUT', 10)
+    )
@@ -0,0 +1,221 @@
+"""Persistent store of the tweets fetched upstream
+
+Every tweet fetched through TwitterServices is upserted into the
+database of TWEETS_STORE, indexed by id, by author and by hashtag. The
+recent search api only returns the tweets of the last 7 days, the older
+pages of a hashtag are answered out of the store instead.
+
+The store is optional, TWEETS_STORE['ENABLED'] is off by default and
+the "api" settings profile has no database at all.
+"""
+import datetime
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from tweets.backends import configured_by
+from tweets.entities import Account, Tweet
+from tweets.models import StoredAccount, StoredHashtag, StoredTweet
+
+
+# ms timestamp of the first snowflake id
+TWITTER_EPOCH = 1288834974657
+
+# tweets returned by the recent search api
+RECENT_SEARCH_WINDOW = datetime.timedelta(days=7).total_seconds()
+
+
+def get_created_at(tweet_id):
+    """Return the unix time a tweet was created at out of its id"""
+    return ((int(tweet_id) >> 22) + TWITTER_EPOCH) / 1000
+
+
+def is_historical(tweet_id):
+    """Whether the tweets older than tweet_id are out of the recent search"""
+    return get_created_at(tweet_id) < time.time() - RECENT_SEARCH_WINDOW
+
+
+def _to_db(created_at):
+    # the tweets carry naive datetimes in UTC
+    return created_at.replace(tzinfo=datetime.timezone.utc)
+
+
+def _from_db(created_at):
+    if created_at.tzinfo is None:
+        return created_at
+    return created_at.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class TweetStore:
+    """Bulk upserts and indexed reads of the stored tweets
+
+       :param using: alias of the database of the store
+       :param batch_size: rows written or read per query
+    """
+
+    def __init__(self, using='default', batch_size=500):
+        self.using = using
+        self.batch_size = batch_size
+
+    def _existing(self, model, ids, *fields):
+        return model.objects.using(self.using).filter(
+            pk__in=ids
+        ).values_list('pk', *fields)
+
+    def _save_accounts(self, accounts):
+        existing = {
+            pk: (fullname, username) for pk, fullname, username in
+            self._existing(StoredAccount, list(accounts),
+                           'fullname', 'username')
+        }
+        rows = [
+            StoredAccount(
+                id=pk,
+                fullname=x.fullname,
+                username=x.username,
+                screen_name=x.username.lower()
+            )
+            for pk, x in accounts.items()
+        ]
+        objects = StoredAccount.objects.using(self.using)
+        objects.bulk_create(
+            [x for x in rows if x.id not in existing],
+            batch_size=self.batch_size,
+            ignore_conflicts=True
+        )
+        # only the renamed accounts are written again
+        objects.bulk_update(
+            [x for x in rows if x.id in existing and
+             existing[x.id] != (x.fullname, x.username)],
+            ['fullname', 'username', 'screen_name'],
+            batch_size=self.batch_size
+        )
+
+    def _save_tweets(self, tweets):
+        existing = dict(self._existing(StoredTweet, list(tweets),
+                                       'metrics_at'))
+        rows = [
+            StoredTweet(
+                id=pk,
+                account_id=int(x.account.id),
+                created_at=_to_db(x.created_at),
+                hashtags=' '.join(x.hashtags),
+                likes=x.likes,
+                replies=x.replies,
+                retweets=x.retweets,
+                text=x.text,
+                metrics_at=x.metrics_at
+            )
+            for pk, x in tweets.items()
+        ]
+        objects = StoredTweet.objects.using(self.using)
+        objects.bulk_create(
+            [x for x in rows if x.id not in existing],
+            batch_size=self.batch_size,
+            ignore_conflicts=True
+        )
+        # the content of a tweet never changes, only newer counts are
+        # written over the stored ones
+        objects.bulk_update(
+            [x for x in rows if x.id in existing and
+             x.metrics_at > existing[x.id]],
+            ['likes', 'replies', 'retweets', 'metrics_at'],
+            batch_size=self.batch_size
+        )
+        StoredHashtag.objects.using(self.using).bulk_create(
+            [
+                StoredHashtag(tag=tag, tweet_id=pk)
+                for pk, x in tweets.items() if pk not in existing
+                for tag in {y.lower() for y in x.hashtags}
+            ],
+            batch_size=self.batch_size,
+            ignore_conflicts=True
+        )
+
+    def save(self, tweets):
+        """Upsert the tweets, their authors and their hashtags
+
+        The tweets fetched with a selection of fields are left out.
+        """
+        tweets = [
+            x for x in tweets
+            if x.account is not None and x.created_at is not None
+        ]
+        for i in range(0, len(tweets), self.batch_size):
+            batch = {int(x.id): x for x in tweets[i:i + self.batch_size]}
+            with transaction.atomic(using=self.using):
+                self._save_accounts({
+                    int(x.account.id): x.account for x in batch.values()
+                })
+                self._save_tweets(batch)
+
+    def _get_tweets(self, ids):
+        """Build the tweets of ids, in their order"""
+        accounts = {}
+        tweets = {}
+        rows = StoredTweet.objects.using(self.using).filter(
+            pk__in=ids
+        ).select_related('account')
+        for row in rows:
+            account = accounts.get(row.account_id)
+            if account is None:
+                account = accounts[row.account_id] = Account(
+                    str(row.account_id),
+                    row.account.fullname,
+                    row.account.username
+                )
+            tweets[row.id] = Tweet(
+                str(row.id),
+                account,
+                _from_db(row.created_at),
+                hashtags=tuple(row.hashtags.split()),
+                likes=row.likes,
+                replies=row.replies,
+                retweets=row.retweets,
+                text=row.text,
+                metrics_at=row.metrics_at
+            )
+        return [tweets[x] for x in ids if x in tweets]
+
+    def _get_page(self, ids, count):
+        # one more id tells whether there is a next page
+        tweets = self._get_tweets(ids[:count])
+        cursor = tweets[-1].id if len(ids) > count and tweets else None
+        return tweets, cursor
+
+    def get_hashtag_page(self, hashtag, count, until_id=None):
+        """Return the stored tweets of a hashtag and the next cursor
+
+        :param until_id: only return tweets older than this id
+        """
+        ids = StoredHashtag.objects.using(self.using).filter(
+            tag=hashtag.lower()
+        )
+        if until_id:
+            ids = ids.filter(tweet_id__lt=int(until_id))
+        ids = ids.order_by('-tweet_id').values_list('tweet_id', flat=True)
+        return self._get_page(list(ids[:count + 1]), count)
+
+    def get_user_page(self, screen_name, count, until_id=None):
+        """Return the stored tweets of a user and the next cursor"""
+        ids = StoredTweet.objects.using(self.using).filter(
+            account__screen_name=screen_name.lower()
+        )
+        if until_id:
+            ids = ids.filter(id__lt=int(until_id))
+        ids = ids.order_by('-id').values_list('id', flat=True)
+        return self._get_page(list(ids[:count + 1]), count)
+
+
+@configured_by('TWEETS_STORE', 'DATABASES')
+def get_tweet_store():
+    """Return the tweet store configured by settings.TWEETS_STORE
+
+    :return: None when the tweets are not stored
+    """
+    conf = settings.TWEETS_STORE
+    using = conf.get('DATABASE', 'default')
+    if not conf.get('ENABLED') or using not in settings.DATABASES:
+        return None
+    return TweetStore(using=using, batch_size=conf.get('BATCH_SIZE', 500))
@@ -0,0 +1,181 @@
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.test import TestCase, override_settings
+
+from tweets.accounts import AccountCache, get_account_cache
+from tweets.services import (
+    TwitterSearchAPIService,
+    TwitterUserAPIService,
+    TwitterUsersLookupAPIService
+)
+from tweets.tests.utils import (
+    MockResponse,
+    load_mocked_data,
+    mocked_twitter_api
+)
+
+USERS_API = TwitterUsersLookupAPIService.LOOK_UP_API
+
+
+def mocked_api_without_authors(*args, **kwargs):
+    """Search api without includes.users, the users lookup api serving
+       the users of its fixture
+    """
+    search = load_mocked_data('twitter_search_api_mocked_data.json')
+    if args[0] == TwitterSearchAPIService.RECENT_SEARCH_API:
+        search.pop('includes')
+        return MockResponse(search, 200)
+    elif args[0] == USERS_API:
+        ids = kwargs['params']['ids'].split(',')
+        return MockResponse({
+            'data': [x for x in search['includes']['users'] if x['id'] in ids]
+        }, 200)
+    return mocked_twitter_api(*args, **kwargs)
+
+
+def get_users_lookups(mock_get):
+    return [
+        x[1]['params']['ids'].split(',') for x in mock_get.call_args_list
+        if x[0][0] == USERS_API
+    ]
+
+
+class TestAccountCache(TestCase):
+
+    def test_intern_shares_the_account(self):
+        cache = AccountCache()
+        account = cache.intern('1', 'Twitter', 'twitter')
+
+        self.assertIs(cache.intern('1', 'Twitter', 'twitter'), account)
+        self.assertEqual(cache.get_many(['1', '2']), {'1': account})
+
+    def test_renamed_account_is_not_mutated(self):
+        cache = AccountCache()
+        account = cache.intern('1', 'Twitter', 'twitter')
+        renamed = cache.intern('1', 'Twitter', 'TwitterDev')
+
+        self.assertIsNot(renamed, account)
+        self.assertEqual(account.username, 'twitter')
+        self.assertEqual(cache.get_many(['1']), {'1': renamed})
+
+    def test_cache_is_bounded(self):
+        cache = AccountCache(max_entries=2)
+        for i in range(3):
+            cache.intern(str(i), 'Twitter', f'user{i}')
+
+        self.assertEqual(list(cache.get_many(['0', '1', '2'])), ['1', '2'])
+
+    def test_expired_accounts_are_skipped(self):
+        cache = AccountCache(ttl=0)
+        cache.intern('1', 'Twitter', 'twitter')
+
+        self.assertEqual(cache.get_many(['1']), {})
+
+    @override_settings(TWEETS_ACCOUNT_CACHE={'MAX_ENTRIES': 0})
+    def test_disabled(self):
+        self.assertIsNone(get_account_cache())
+
+
+class TestInterning(TestCase):
+
+    def setUp(self):
+        get_account_cache().clear()
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_searches_share_the_accounts(self, mock_get):
+        first = TwitterSearchAPIService('python', count=30)
+        first.fetch_data()
+        second = TwitterSearchAPIService('python', count=30)
+        second.fetch_data()
+
+        for x, y in zip(first.get_tweets(), second.get_tweets()):
+            self.assertIs(x.account, y.account)
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_timelines_share_the_accounts(self, mock_get):
+        first = TwitterUserAPIService('twitter', count=30)
+        first.fetch_data()
+        second = TwitterUserAPIService('twitter', count=30)
+        second.fetch_data()
+
+        self.assertIs(first.get_tweets()[0].account,
+                      second.get_tweets()[-1].account)
+
+
+class TestResolveAuthors(TestCase):
+
+    def setUp(self):
+        override = override_settings(TWEETS_ACCOUNT_CACHE={
+            'MAX_ENTRIES': 100,
+            'TTL': 3600,
+            'RESOLVE_AUTHORS': True,
+        })
+        override.enable()
+        self.addCleanup(override.disable)
+
+    @mock.patch('requests.Session.get',
+                side_effect=mocked_api_without_authors)
+    def test_authors_are_not_expanded(self, mock_get):
+        TwitterSearchAPIService('python', count=30).fetch_data()
+
+        params = mock_get.call_args_list[0][1]['params']
+        self.assertNotIn('expansions', params)
+        self.assertIn('author_id', params['tweet.fields'].split(','))
+
+    @mock.patch('requests.Session.get',
+                side_effect=mocked_api_without_authors)
+    def test_cached_authors_are_not_looked_up(self, mock_get):
+        expected = load_mocked_data('twitter_search_api_mocked_data.json')
+        users = {x['id']: x for x in expected['includes']['users']}
+
+        first = TwitterSearchAPIService('python', count=30)
+        first.fetch_data()
+        TwitterSearchAPIService('python', count=30).fetch_data()
+
+        lookups = get_users_lookups(mock_get)
+        self.assertEqual(len(lookups), 1)
+        self.assertEqual(set(lookups[0]), set(users))
+        for tweet, item in zip(first.get_tweets(), expected['data']):
+            self.assertEqual(tweet.account.username,
+                             users[item['author_id']]['username'])
+
+    @mock.patch('requests.Session.get',
+                side_effect=mocked_api_without_authors)
+    def test_only_missing_authors_are_looked_up(self, mock_get):
+        cache = get_account_cache()
+        cache.intern('1260284319345623040', 'Twitter', 'twitter')
+
+        TwitterSearchAPIService('python', count=30).fetch_data()
+
+        lookups = get_users_lookups(mock_get)
+        self.assertEqual(len(lookups[0]), 26)
+        self.assertNotIn('1260284319345623040', lookups[0])
+
+    @mock.patch('requests.Session.get')
+    def test_tweets_of_unknown_authors_are_dropped(self, mock_get):
+        def side_effect(*args, **kwargs):
+            res = mocked_api_without_authors(*args, **kwargs)
+            if args[0] == USERS_API:
+                res.json_data['data'] = res.json_data['data'][1:]
+            return res
+        mock_get.side_effect = side_effect
+
+        service = TwitterSearchAPIService('python', count=30)
+        service.fetch_data()
+
+        users = load_mocked_data(
+            'twitter_search_api_mocked_data.json'
+        )['includes']['users']
+        self.assertTrue(all(x.account for x in service.get_tweets()))
+        self.assertNotIn(users[0]['id'],
+                         {x.account.id for x in service.get_tweets()})
+
+    @mock.patch('httpx.AsyncClient.get', new_callable=mock.AsyncMock,
+                side_effect=mocked_api_without_authors)
+    def test_async(self, mock_get):
+        service = TwitterSearchAPIService('python', count=30)
+        async_to_sync(service.afetch_data)()
+
+        self.assertEqual(len(get_users_lookups(mock_get)), 1)
+        self.assertEqual(len(service.get_tweets()), 30)
+        self.assertTrue(all(x.account for x in service.get_tweets()))
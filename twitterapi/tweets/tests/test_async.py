@@ -0,0 +1,177 @@
+import asyncio
+import json
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.test import TestCase
+from django.test.client import AsyncRequestFactory
+
+from rest_framework import status
+
+from tweets import http, views
+from tweets.cache import get_response_cache
+from tweets.services import TwitterServices
+from tweets.tests.utils import (
+    mocked_twitter_api,
+    mocked_twitter_api_with_filters,
+    mocked_twitter_api_without_results
+)
+
+
+async def slow_mocked_twitter_api(*args, **kwargs):
+    """Async mock of the twitter APIs giving time to other coroutines"""
+    await asyncio.sleep(0.01)
+    return mocked_twitter_api(*args, **kwargs)
+
+
+class TestAsyncServices(TestCase):
+
+    def setUp(self):
+        get_response_cache().clear()
+
+    @mock.patch(
+        'httpx.AsyncClient.get',
+        new_callable=mock.AsyncMock,
+        side_effect=mocked_twitter_api
+    )
+    def test_aget_tweets_by_hashtag(self, mock_get):
+        tweets = async_to_sync(TwitterServices.aget_tweets)(
+            search_by=TwitterServices.HASHTAG,
+            hashtag='python',
+            count=12
+        )
+        self.assertEqual(len(tweets), 12)
+
+    @mock.patch(
+        'httpx.AsyncClient.get',
+        new_callable=mock.AsyncMock,
+        side_effect=mocked_twitter_api
+    )
+    def test_aget_tweets_by_user(self, mock_get):
+        tweets = async_to_sync(TwitterServices.aget_tweets)(
+            search_by=TwitterServices.USER,
+            screen_name='twitter',
+            count=5
+        )
+        self.assertEqual(len(tweets), 5)
+        self.assertEqual(mock_get.call_count, 2)
+
+    @mock.patch(
+        'httpx.AsyncClient.get',
+        new_callable=mock.AsyncMock,
+        side_effect=mocked_twitter_api_with_filters
+    )
+    def test_afetch_newer_tweets(self, mock_get):
+        latest = async_to_sync(TwitterServices.afetch_tweets)(
+            search_by=TwitterServices.USER,
+            screen_name='twitter',
+            count=10
+        )
+        mock_get.reset_mock()
+
+        tweets = async_to_sync(TwitterServices.afetch_newer_tweets)(
+            TwitterServices.USER,
+            latest[2:],
+            metrics_max_age=300,
+            screen_name='twitter',
+            count=10
+        )
+        self.assertEqual(tweets, latest)
+        # one timeline call and one lookup of the 2 newer tweets
+        self.assertEqual(mock_get.call_count, 2)
+
+    @mock.patch(
+        'httpx.AsyncClient.get',
+        new_callable=mock.AsyncMock,
+        side_effect=slow_mocked_twitter_api
+    )
+    def test_concurrent_calls_are_coalesced(self, mock_get):
+        async def fetch_many():
+            return await asyncio.gather(*[
+                TwitterServices.aget_tweets(
+                    search_by=TwitterServices.HASHTAG,
+                    hashtag='python',
+                    count=10
+                )
+                for _ in range(5)
+            ])
+
+        results = async_to_sync(fetch_many)()
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertTrue(all(len(x) == 10 for x in results))
+
+    def test_async_client_is_shared_per_loop(self):
+        async def get_clients():
+            client = http.get_async_client()
+            same = client is http.get_async_client()
+            await http.close_async_client()
+            return same
+
+        self.assertTrue(async_to_sync(get_clients)())
+
+
+class TestAsyncViews(TestCase):
+
+    def setUp(self):
+        get_response_cache().clear()
+        self.factory = AsyncRequestFactory()
+
+    def call(self, view, request, **kwargs):
+        return async_to_sync(view)(request, **kwargs)
+
+    @mock.patch(
+        'httpx.AsyncClient.get',
+        new_callable=mock.AsyncMock,
+        side_effect=mocked_twitter_api
+    )
+    def test_retrieve_tweets_by_hashtag(self, mock_get):
+        request = self.factory.get('/hashtags/python?limit=12')
+        res = self.call(
+            views.tweets_by_hashtag_async, request, hashtag='python'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(json.loads(res.content)), 12)
+
+    @mock.patch(
+        'httpx.AsyncClient.get',
+        new_callable=mock.AsyncMock,
+        side_effect=mocked_twitter_api_without_results
+    )
+    def test_retrieve_tweets_with_user_not_exists(self, mock_get):
+        request = self.factory.get('/users/screen_name')
+        res = self.call(
+            views.tweets_by_user_async, request, screen_name='screen_name'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(res.content), [])
+
+    def test_invalid_limit(self):
+        request = self.factory.get(
+            f'/hashtags/python?limit={settings.TWEETS_MAX_LIMIT + 1}'
+        )
+        res = self.call(
+            views.tweets_by_hashtag_async, request, hashtag='python'
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_not_existed_methods(self):
+        request = self.factory.post('/hashtags/python')
+        res = self.call(
+            views.tweets_by_hashtag_async, request, hashtag='python'
+        )
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    @mock.patch('httpx.AsyncClient.get', new_callable=mock.AsyncMock)
+    def test_upstream_error(self, mock_get):
+        mock_get.side_effect = Exception('upstream error')
+        request = self.factory.get('/hashtags/python')
+        with self.assertLogs(level='ERROR'):
+            res = self.call(
+                views.tweets_by_hashtag_async, request, hashtag='python'
+            )
+        self.assertEqual(
+            res.status_code,
+            status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
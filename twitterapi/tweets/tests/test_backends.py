@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from tweets.backends import DjangoCacheBackend, LRUBackend, configured_by
+
+
+class TestDjangoCacheBackend(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_clear_keeps_the_other_keys(self):
+        backend = DjangoCacheBackend(prefix='tweets-test:')
+        other = DjangoCacheBackend(prefix='tweets-other:')
+        backend.set_many({'a': 1, 'b': 2}, 60)
+        other.set('a', 3, 60)
+        cache.set('site', 4)
+
+        backend.clear()
+        self.assertEqual(backend.get_many(['a', 'b']), {})
+        self.assertEqual(other.get('a'), 3)
+        self.assertEqual(cache.get('site'), 4)
+
+        backend.set('a', 5, 60)
+        self.assertEqual(backend.get('a'), 5)
+
+    def test_clear_of_another_worker(self):
+        backend = DjangoCacheBackend(prefix='tweets-test:')
+        worker = DjangoCacheBackend(prefix='tweets-test:')
+        backend.set('a', 1, 60)
+        self.assertEqual(worker.get('a'), 1)
+
+        backend.clear()
+        self.assertIsNone(worker.get('a'))
+
+    def test_evicted_namespace_clears_the_keys(self):
+        backend = DjangoCacheBackend(prefix='tweets-test:')
+        backend.set('a', 1, 60)
+
+        cache.delete('tweets-test:namespace')
+        self.assertIsNone(backend.get('a'))
+
+
+class TestLRUBackend(TestCase):
+
+    def test_many(self):
+        backend = LRUBackend(max_entries=2)
+        backend.set_many({'a': 1, 'b': 2}, 60)
+        backend.set('c', 3, -1)
+
+        self.assertEqual(backend.get_many(['a', 'b', 'c']), {'b': 2})
+
+
+class TestConfiguredBy(TestCase):
+
+    def test_built_again_when_the_settings_change(self):
+        @configured_by('TWEETS_TEST')
+        def get_value():
+            return object() if getattr(settings, 'TWEETS_TEST', None) \
+                else None
+
+        self.assertIsNone(get_value())
+        with override_settings(TWEETS_TEST=True):
+            value = get_value()
+            self.assertIsNotNone(value)
+            self.assertIs(get_value(), value)
+        self.assertIsNone(get_value())
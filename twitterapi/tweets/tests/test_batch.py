@@ -0,0 +1,193 @@
+import io
+import json
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.core.handlers.asgi import ASGIRequest
+from django.test import TestCase, override_settings
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from tweets import batch, views
+from tweets.cache import get_response_cache
+from tweets.exceptions import RateLimitExceeded
+from tweets.services import TwitterSearchAPIService, TwitterUserAPIService
+from tweets.tests.utils import mocked_twitter_api
+
+BATCH_URL = '/batch'
+
+
+def mocked_rate_limited_search(*args, **kwargs):
+    """Rate limited search api, the other apis answer as usual"""
+    if args[0] == TwitterSearchAPIService.RECENT_SEARCH_API:
+        raise RateLimitExceeded(args[0], 30)
+    return mocked_twitter_api(*args, **kwargs)
+
+
+def make_async_request(items):
+    """ASGI request posting items, AsyncRequestFactory drops the body"""
+    body = json.dumps(items).encode('utf-8')
+    return ASGIRequest({
+        'type': 'http',
+        'method': 'POST',
+        'path': BATCH_URL,
+        'query_string': b'',
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode('ascii')),
+        ],
+    }, io.BytesIO(body))
+
+
+class TestGroupItems(TestCase):
+
+    def test_identical_keys_are_fetched_once(self):
+        groups = batch.group_items([
+            {'type': 'hashtag', 'key': 'Python', 'limit': 5},
+            {'type': 'user', 'key': 'python'},
+            {'type': 'hashtag', 'key': 'python', 'limit': 12},
+            {'type': 'hashtag', 'key': 'python', 'cursor': '1'},
+        ])
+
+        self.assertEqual(len(groups), 3)
+        self.assertEqual(groups[0].count, 12)
+        self.assertEqual([i for i, _ in groups[0].items], [0, 2])
+        self.assertEqual(groups[1].count, 30)
+        self.assertEqual(groups[2].cursor, '1')
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_results_are_sliced_per_item(self, mock_get):
+        get_response_cache().clear()
+        results = batch.get_results([
+            {'type': 'hashtag', 'key': 'python', 'limit': 12},
+            {'type': 'hashtag', 'key': 'Python', 'limit': 5},
+        ])
+
+        self.assertEqual([x.index for x in results], [0, 1])
+        self.assertEqual(len(results[0].tweets), 12)
+        self.assertEqual(results[1].tweets, results[0].tweets[:5])
+        self.assertEqual(results[1].cursor, results[0].tweets[4].id)
+        # one search call for both items
+        self.assertEqual(mock_get.call_count, 1)
+
+
+class TestBatchApi(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        get_response_cache().clear()
+
+    def post(self, items, **kwargs):
+        return self.client.post(BATCH_URL, items, format='json', **kwargs)
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_batch(self, mock_get):
+        res = self.post([
+            {'type': 'hashtag', 'key': 'python', 'limit': 12},
+            {'type': 'user', 'key': 'twitter', 'limit': 5},
+        ])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        first, second = res.json()
+        self.assertEqual(first['index'], 0)
+        self.assertEqual(first['status'], 200)
+        self.assertEqual(len(first['tweets']), 12)
+        self.assertEqual(second['key'], 'twitter')
+        self.assertEqual(len(second['tweets']), 5)
+        self.assertEqual(
+            set(second['tweets'][0]),
+            {'account', 'date', 'hashtags', 'likes', 'replies', 'retweets',
+             'text'}
+        )
+
+    @mock.patch('requests.Session.get',
+                side_effect=mocked_rate_limited_search)
+    def test_partial_results(self, mock_get):
+        res = self.post([
+            {'type': 'hashtag', 'key': 'python'},
+            {'type': 'user', 'key': 'twitter', 'limit': 5},
+        ])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        first, second = res.json()
+        self.assertEqual(first['status'], 429)
+        self.assertEqual(first['error'], views.RATE_LIMITED_ERROR)
+        self.assertEqual(first['retry_after'], 30)
+        self.assertNotIn('tweets', first)
+        self.assertEqual(second['status'], 200)
+        self.assertEqual(len(second['tweets']), 5)
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_stream(self, mock_get):
+        res = self.post(
+            [
+                {'type': 'hashtag', 'key': 'python', 'limit': 3},
+                {'type': 'user', 'key': 'twitter', 'limit': 5},
+                {'type': 'hashtag', 'key': 'python', 'limit': 1},
+            ],
+            HTTP_ACCEPT='application/x-ndjson'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(res.streaming_content).splitlines()
+        results = sorted(map(json.loads, lines), key=lambda x: x['index'])
+        self.assertEqual([len(x['tweets']) for x in results], [3, 5, 1])
+
+    def test_invalid_items(self):
+        res = self.post([
+            {'type': 'hashtag', 'key': 'python', 'limit': 0},
+            {'type': 'list', 'key': 'python'},
+        ])
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('limit', res.json()[0])
+        self.assertIn('type', res.json()[1])
+
+        res = self.post([])
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.post({'type': 'hashtag', 'key': 'python'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(TWEETS_BATCH={'MAX_ITEMS': 2, 'MAX_CONCURRENCY': 2})
+    def test_too_many_items(self):
+        res = self.post([{'type': 'hashtag', 'key': 'python'}] * 3)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_not_existed_methods(self):
+        res = self.client.get(BATCH_URL)
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+class TestBatchAsync(TestCase):
+
+    def setUp(self):
+        get_response_cache().clear()
+
+    @mock.patch(
+        'httpx.AsyncClient.get',
+        new_callable=mock.AsyncMock,
+        side_effect=mocked_twitter_api
+    )
+    def test_batch(self, mock_get):
+        res = async_to_sync(views.batch_async)(make_async_request([
+            {'type': 'hashtag', 'key': 'python', 'limit': 12},
+            {'type': 'user', 'key': 'twitter', 'limit': 5},
+            {'type': 'hashtag', 'key': 'PYTHON', 'limit': 3},
+        ]))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        results = json.loads(res.content)
+        self.assertEqual([len(x['tweets']) for x in results], [12, 5, 3])
+        urls = [x[0][0] for x in mock_get.call_args_list]
+        self.assertEqual(
+            urls.count(TwitterSearchAPIService.RECENT_SEARCH_API), 1
+        )
+        self.assertEqual(urls.count(TwitterUserAPIService.LOOK_UP_API), 1)
+
+    def test_invalid_items(self):
+        res = async_to_sync(views.batch_async)(
+            make_async_request([{'type': 'hashtag'}])
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('key', json.loads(res.content)[0])
@@ -0,0 +1,204 @@
+from unittest import mock
+from django.test import TestCase, override_settings
+
+from tweets.cache import (
+    CacheEntry,
+    DjangoCacheBackend,
+    LRUBackend,
+    ResponseCache,
+    get_response_cache
+)
+from tweets.services import TwitterServices
+from tweets.tests.utils import make_tweets, mocked_twitter_api
+
+
+def make_fetch(calls):
+    """Return a fetch callable recording the counts it was called with"""
+    def fetch(count):
+        calls.append(count)
+        return make_tweets(count)
+    return fetch
+
+
+class TestLRUBackend(TestCase):
+
+    def test_evicts_least_recently_used(self):
+        backend = LRUBackend(max_entries=2)
+        backend.set('a', 1, 60)
+        backend.set('b', 2, 60)
+        backend.get('a')
+        backend.set('c', 3, 60)
+
+        self.assertEqual(backend.get('a'), 1)
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual(backend.get('c'), 3)
+
+    def test_expired_entries_are_dropped(self):
+        backend = LRUBackend()
+        backend.set('a', 1, 0)
+        self.assertIsNone(backend.get('a'))
+
+
+class TestResponseCache(TestCase):
+
+    def setUp(self):
+        self.cache = ResponseCache(
+            LRUBackend(),
+            ttl={'hashtags': 30},
+            stale_ttl=60
+        )
+        self.calls = []
+        self.fetch = make_fetch(self.calls)
+
+    def test_cache_hit(self):
+        first = self.cache.get_page('hashtags', 'python', 12, self.fetch)[0]
+        second = self.cache.get_page('hashtags', 'Python', 12, self.fetch)[0]
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(second), 12)
+        # the count is normalized before fetching
+        self.assertEqual(self.calls, [20])
+
+    def test_smaller_limit_reuses_larger_entry(self):
+        self.cache.get_page('hashtags', 'python', 50, self.fetch)
+        res = self.cache.get_page('hashtags', 'python', 5, self.fetch)[0]
+
+        self.assertEqual([x.id for x in res], ['0', '1', '2', '3', '4'])
+        self.assertEqual(self.calls, [50])
+
+    def test_larger_limit_refetches(self):
+        self.cache.get_page('hashtags', 'python', 10, self.fetch)
+        res = self.cache.get_page('hashtags', 'python', 40, self.fetch)[0]
+
+        self.assertEqual(len(res), 40)
+        self.assertEqual(self.calls, [10, 40])
+
+    def test_exhausted_entry_covers_larger_limit(self):
+        def fetch(count):
+            self.calls.append(count)
+            return make_tweets(3)
+
+        self.cache.get_page('hashtags', 'python', 10, fetch)
+        res = self.cache.get_page('hashtags', 'python', 80, fetch)[0]
+
+        self.assertEqual(res, make_tweets(3))
+        self.assertEqual(self.calls, [10])
+
+    def test_endpoint_without_ttl_is_not_cached(self):
+        self.cache.get_page('users', 'twitter', 10, self.fetch)
+        self.cache.get_page('users', 'twitter', 10, self.fetch)
+        self.assertEqual(self.calls, [10, 10])
+
+    def test_stale_entry_is_served_while_refreshing(self):
+        self.cache.get_page('hashtags', 'python', 10, self.fetch)
+        entry = self.cache.get_entry('hashtags', 'python')
+        entry.fetched_at -= 40
+
+        with mock.patch.object(self.cache, 'refresh_in_background') as refresh:
+            res = self.cache.get_page('hashtags', 'python', 10, self.fetch)[0]
+
+        refresh.assert_called_once_with(
+            'hashtags', 'python', 10, self.fetch, None
+        )
+        self.assertEqual(len(res), 10)
+        self.assertEqual(self.calls, [10])
+
+    def test_only_one_background_refresh(self):
+        self.cache._refreshing.add(self.cache.make_key('hashtags', 'python'))
+        thread = self.cache.refresh_in_background(
+            'hashtags', 'python', 10, self.fetch
+        )
+        self.assertIsNone(thread)
+        self.assertEqual(self.calls, [])
+
+    def test_background_refresh_updates_entry(self):
+        thread = self.cache.refresh_in_background(
+            'hashtags', 'python', 10, self.fetch
+        )
+        thread.join()
+
+        self.assertEqual(self.calls, [10])
+        self.assertIsNotNone(self.cache.get_entry('hashtags', 'python'))
+        self.assertEqual(self.cache._refreshing, set())
+
+    def test_incremental_refresh_is_given_the_tweets(self):
+        self.cache.incremental = True
+        self.cache.get_page('hashtags', 'python', 10, self.fetch)
+        entry = self.cache.get_entry('hashtags', 'python')
+        entry.fetched_at -= 40
+
+        with mock.patch.object(self.cache, 'refresh_in_background') as refresh:
+            self.cache.get_page('hashtags', 'python', 10, self.fetch)
+
+        refresh.assert_called_once_with(
+            'hashtags', 'python', 10, self.fetch, entry.tweets
+        )
+
+    def test_incremental_fetch_passes_previous(self):
+        previous = make_tweets(10)
+        fetch = mock.Mock(return_value=make_tweets(10))
+        self.cache.fetch('hashtags', 'python', 10, fetch, previous)
+        fetch.assert_called_once_with(10, previous)
+
+    def test_expired_stale_entry_is_refetched(self):
+        self.cache.get_page('hashtags', 'python', 10, self.fetch)
+        entry = self.cache.get_entry('hashtags', 'python')
+        entry.fetched_at -= 100
+
+        self.cache.get_page('hashtags', 'python', 10, self.fetch)
+        self.assertEqual(self.calls, [10, 10])
+
+
+class TestCacheEntry(TestCase):
+
+    def test_page_cursor_is_last_returned_id(self):
+        tweets = make_tweets(20)
+        entry = CacheEntry(tweets, 20)
+        self.assertEqual(entry.get_page(5), (tweets[:5], '4'))
+        self.assertEqual(entry.get_page(20)[1], '19')
+
+    def test_exhausted_entry_has_no_cursor(self):
+        tweets = make_tweets(3)
+        entry = CacheEntry(tweets, 20)
+        self.assertEqual(entry.get_page(3), (tweets, None))
+        self.assertEqual(entry.get_page(10), (tweets, None))
+        self.assertEqual(entry.get_page(2), (tweets[:2], '1'))
+
+
+class TestDjangoCacheBackend(TestCase):
+
+    def test_round_trip(self):
+        backend = DjangoCacheBackend()
+        backend.set('tweets-test', CacheEntry(make_tweets(1), 10), 60)
+        entry = backend.get('tweets-test')
+
+        self.assertEqual(entry.tweets, make_tweets(1))
+        self.assertEqual(entry.count, 10)
+        backend.delete('tweets-test')
+        self.assertIsNone(backend.get('tweets-test'))
+
+
+class TestCachedTwitterServices(TestCase):
+
+    def setUp(self):
+        get_response_cache().clear()
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_get_tweets_is_cached(self, mock_get):
+        for _ in range(3):
+            res = TwitterServices.get_tweets(
+                search_by=TwitterServices.HASHTAG,
+                hashtag='python',
+                count=10
+            )
+        self.assertEqual(len(res), 10)
+        self.assertEqual(mock_get.call_count, 1)
+
+    @override_settings(TWEETS_CACHE={
+        'BACKEND': 'tweets.cache.LRUBackend',
+        'TTL': {'users': 60},
+    })
+    def test_backend_from_dotted_path(self):
+        self.assertIsInstance(get_response_cache().backend, LRUBackend)
+        self.assertEqual(get_response_cache().get_ttl('users'), 60)
+        self.assertEqual(get_response_cache().get_ttl('hashtags'), 0)
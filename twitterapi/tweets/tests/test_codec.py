@@ -0,0 +1,84 @@
+import json
+from unittest import mock
+from django.test import TestCase
+
+from rest_framework.renderers import JSONRenderer
+
+from tweets import codec
+from tweets.renderers import FastJSONRenderer
+from tweets.services import TwitterSearchAPIService
+from tweets.tests.utils import MockResponse, mocked_twitter_api
+
+
+TWEETS = [{
+    'account': {'fullname': 'Twitter', 'href': '/Twitter', 'id': '783214'},
+    'date': '17:08 PM - 23 Sep 2020',
+    'hashtags': ['#café'],
+    'likes': 39,
+    'replies': 38,
+    'retweets': 1,
+    'text': 'cool cool ✨',
+}]
+
+
+class CountingResponse(MockResponse):
+    """MockResponse counting how many times its body is parsed"""
+    def __init__(self, res):
+        super().__init__(res.json_data, res.status_code)
+        self.reads = 0
+
+    def json(self):
+        self.reads += 1
+        return super().json()
+
+    @property
+    def content(self):
+        self.reads += 1
+        return json.dumps(self.json_data).encode('utf-8')
+
+
+class TestCodec(TestCase):
+
+    def test_round_trip(self):
+        self.assertEqual(codec.loads(codec.dumps(TWEETS)), TWEETS)
+
+    def test_loads_from_bytes(self):
+        self.assertEqual(codec.loads(b'{"a": 1}'), {'a': 1})
+
+    def test_dumps_matches_rest_framework(self):
+        self.assertEqual(codec.dumps(TWEETS), JSONRenderer().render(TWEETS))
+
+    @mock.patch('tweets.codec.orjson', None)
+    def test_without_orjson(self):
+        self.assertEqual(codec.loads(b'[1, 2]'), [1, 2])
+        self.assertEqual(codec.dumps(TWEETS), JSONRenderer().render(TWEETS))
+
+    def test_search_response_is_parsed_once(self):
+        res = CountingResponse(
+            mocked_twitter_api(TwitterSearchAPIService.RECENT_SEARCH_API)
+        )
+        service = TwitterSearchAPIService(hashtag='python', count=10)
+        service._process_response(res)
+
+        self.assertEqual(res.reads, 1)
+        self.assertEqual(len(service.get_tweets()), 10)
+
+
+class TestFastJSONRenderer(TestCase):
+
+    def test_render(self):
+        self.assertEqual(
+            FastJSONRenderer().render(TWEETS),
+            JSONRenderer().render(TWEETS)
+        )
+
+    def test_render_none(self):
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+    def test_indented_output_is_left_to_rest_framework(self):
+        res = FastJSONRenderer().render(
+            TWEETS,
+            'application/json; indent=4',
+            {}
+        )
+        self.assertIn(b'\n    ', res)
@@ -0,0 +1,110 @@
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.test import TestCase
+from django.test.client import AsyncRequestFactory
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from tweets import views
+from tweets.cache import get_response_cache
+from tweets.entities import fingerprint
+from tweets.tests.utils import make_tweets, mocked_twitter_api
+
+
+class TestFingerprint(TestCase):
+
+    def test_counts_change_the_fingerprint(self):
+        tweets = make_tweets(3)
+        before = fingerprint(tweets)
+        tweets[1].likes += 1
+        self.assertNotEqual(fingerprint(tweets), before)
+
+    def test_same_content_same_fingerprint(self):
+        self.assertEqual(fingerprint(make_tweets(3)),
+                         fingerprint(make_tweets(3)))
+
+
+class TestConditionalRequests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        get_response_cache().clear()
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_validators(self, mock_get):
+        res = self.client.get('/hashtags/python', {'limit': 10})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['ETag'].startswith('"json-10+-'))
+        self.assertIn('GMT', res['Last-Modified'])
+        self.assertEqual(res['Cache-Control'], 'max-age=30')
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_max_age_of_a_cached_page(self, mock_get):
+        self.client.get('/hashtags/python', {'limit': 10})
+        entry = get_response_cache().get_entry('hashtags', 'python')
+        entry.fetched_at -= 20
+
+        res = self.client.get('/hashtags/python', {'limit': 10})
+        self.assertEqual(res['Cache-Control'], 'max-age=10')
+
+        entry.fetched_at -= 20
+        res = self.client.get('/hashtags/python', {'limit': 10})
+        self.assertEqual(res['Cache-Control'], 'max-age=0')
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_not_modified(self, mock_get):
+        etag = self.client.get('/hashtags/python', {'limit': 10})['ETag']
+
+        with mock.patch('tweets.views.to_dicts') as to_dicts:
+            res = self.client.get(
+                '/hashtags/python', {'limit': 10}, HTTP_IF_NONE_MATCH=etag
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b'')
+        self.assertEqual(res['ETag'], etag)
+        self.assertIn('Link', res)
+        # the page is not rendered at all
+        to_dicts.assert_not_called()
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_modified(self, mock_get):
+        etag = self.client.get('/hashtags/python', {'limit': 10})['ETag']
+        res = self.client.get(
+            '/hashtags/python', {'limit': 5}, HTTP_IF_NONE_MATCH=etag
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual(len(res.data), 5)
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_if_modified_since_is_ignored(self, mock_get):
+        last_modified = \
+            self.client.get('/users/twitter')['Last-Modified']
+        res = self.client.get(
+            '/users/twitter', HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Cache-Control'], 'max-age=60')
+
+    @mock.patch(
+        'httpx.AsyncClient.get',
+        new_callable=mock.AsyncMock,
+        side_effect=mocked_twitter_api
+    )
+    def test_async_not_modified(self, mock_get):
+        factory = AsyncRequestFactory()
+        view = async_to_sync(views.tweets_by_hashtag_async)
+
+        etag = view(factory.get('/hashtags/python'), hashtag='python')['ETag']
+        # the async factory of django 3.1 takes the raw ASGI headers
+        request = factory.get(
+            '/hashtags/python',
+            headers=[(b'if-none-match', etag.encode())]
+        )
+        res = view(request, hashtag='python')
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
@@ -0,0 +1,92 @@
+import datetime
+from django.test import TestCase
+
+from tweets import dates
+from tweets.tests.utils import load_mocked_data
+
+
+# the implementation dates.py replaces, only works with glibc
+def strptime_format(value, layout):
+    created_at = datetime.datetime.strptime(value, layout)
+    return created_at.strftime('%-H:%M %p - %-d %b %Y')
+
+
+class TestParse(TestCase):
+
+    def test_parse_v2(self):
+        self.assertEqual(
+            dates.parse_v2('2020-09-28T01:02:03.456Z'),
+            datetime.datetime(2020, 9, 28, 1, 2, 3, 456000)
+        )
+
+    def test_parse_v2_other_fraction(self):
+        self.assertEqual(
+            dates.parse_v2('2020-09-28T01:02:03.5Z'),
+            datetime.datetime(2020, 9, 28, 1, 2, 3, 500000)
+        )
+
+    def test_parse_v1(self):
+        self.assertEqual(
+            dates.parse_v1('Wed Sep 23 17:08:34 +0000 2020'),
+            datetime.datetime(2020, 9, 23, 17, 8, 34)
+        )
+
+    def test_parse_v1_offset(self):
+        self.assertEqual(
+            dates.parse_v1('Thu Sep 24 01:38:34 +0830 2020'),
+            datetime.datetime(2020, 9, 23, 17, 8, 34)
+        )
+        self.assertEqual(
+            dates.parse_v1('Wed Sep 23 12:08:34 -0500 2020'),
+            datetime.datetime(2020, 9, 23, 17, 8, 34)
+        )
+
+    def test_invalid_dates(self):
+        with self.assertRaises(ValueError):
+            dates.parse_v2('2020-13-28T01:02:03.000Z')
+        with self.assertRaises(ValueError):
+            dates.parse_v1('Wed Sep 23 17:08:34 2020')
+
+
+class TestFormatDate(TestCase):
+
+    def test_format(self):
+        self.assertEqual(
+            dates.format_date(datetime.datetime(2020, 9, 3, 7, 5, 59)),
+            '7:05 AM - 3 Sep 2020'
+        )
+        self.assertEqual(
+            dates.format_date(datetime.datetime(2020, 12, 23, 0, 0)),
+            '0:00 AM - 23 Dec 2020'
+        )
+        self.assertEqual(
+            dates.format_date(datetime.datetime(2020, 1, 1, 12, 30)),
+            '12:30 PM - 1 Jan 2020'
+        )
+
+    def test_same_output_as_strftime(self):
+        start = datetime.datetime(2020, 1, 1)
+        for hours in range(0, 24 * 366, 7):
+            value = start + datetime.timedelta(hours=hours, minutes=hours)
+            self.assertEqual(
+                dates.format_date(value),
+                value.strftime('%-H:%M %p - %-d %b %Y')
+            )
+
+    def test_same_output_on_mocked_data(self):
+        search = load_mocked_data('twitter_search_api_mocked_data.json')
+        for tweet in search['data']:
+            self.assertEqual(
+                dates.format_date(dates.parse_v2(tweet['created_at'])),
+                strptime_format(tweet['created_at'], '%Y-%m-%dT%H:%M:%S.%fZ')
+            )
+
+        timeline = load_mocked_data(
+            'twitter_user_timeline_api_mocked_data.json'
+        )
+        for tweet in timeline:
+            self.assertEqual(
+                dates.format_date(dates.parse_v1(tweet['created_at'])),
+                strptime_format(tweet['created_at'],
+                                '%a %b %d %H:%M:%S +0000 %Y')
+            )
@@ -0,0 +1,145 @@
+import datetime
+import pickle
+from django.test import TestCase
+
+from tweets.entities import Account, Tweet, normalize, to_dicts
+from tweets.tests.utils import load_mocked_data
+
+
+class TestSearchTweet(TestCase):
+    """Tweets of the v2 recent search API"""
+
+    def setUp(self):
+        data = load_mocked_data('twitter_search_api_mocked_data.json')
+        self.raw = data['data'][0]
+        self.users = {
+            x['id']: Account.from_v2(x) for x in data['includes']['users']
+        }
+        self.user = next(
+            x for x in data['includes']['users']
+            if x['id'] == self.raw['author_id']
+        )
+        self.tweet = normalize(self.raw, self.users)
+
+    def test_normalize(self):
+        self.assertIsInstance(self.tweet, Tweet)
+        self.assertEqual(self.tweet.id, self.raw['id'])
+        self.assertIs(self.tweet.account, self.users[self.raw['author_id']])
+
+    def test_account(self):
+        self.assertEqual(self.tweet.to_dict()['account'], {
+            'fullname': self.user['name'],
+            'href': f"/{self.user['username']}",
+            'id': self.user['id']
+        })
+
+    def test_date(self):
+        created_at = datetime.datetime.strptime(
+            self.raw['created_at'], '%Y-%m-%dT%H:%M:%S.%fZ')
+        date = created_at.strftime('%-H:%M %p - %-d %b %Y')
+
+        self.assertEqual(self.tweet.to_dict()['date'], date)
+
+    def test_hashtags(self):
+        hashtags = []
+        for item in self.raw['entities'].get('hashtags', []):
+            hashtags.append(f"#{item['tag']}")
+
+        self.assertEqual(self.tweet.to_dict()['hashtags'], hashtags)
+
+    def test_counts_and_text(self):
+        metrics = self.raw['public_metrics']
+        item = self.tweet.to_dict()
+
+        self.assertEqual(item['likes'], metrics['like_count'])
+        self.assertEqual(item['replies'], metrics['reply_count'])
+        self.assertEqual(item['retweets'], metrics['retweet_count'])
+        self.assertEqual(item['text'], self.raw['text'])
+
+
+class TestTimelineTweet(TestCase):
+    """Tweets of the v1.1 user timeline API"""
+
+    def setUp(self):
+        self.timeline = load_mocked_data(
+            'twitter_user_timeline_api_mocked_data.json'
+        )
+        self.raw = self.timeline[0]
+        self.users = {}
+        self.tweet = normalize(self.raw, self.users)
+
+    def test_normalize(self):
+        self.assertIsInstance(self.tweet, Tweet)
+        self.assertEqual(self.tweet.id, self.raw['id_str'])
+        # the replies count is only known after the lookup
+        self.assertEqual(self.tweet.replies, 0)
+
+    def test_tweets_of_one_author_share_the_account(self):
+        tweets = [normalize(x, self.users) for x in self.timeline]
+        self.assertEqual(len(self.users), 1)
+        self.assertTrue(all(x.account is self.tweet.account for x in tweets))
+
+    def test_account(self):
+        user = self.raw['user']
+        self.assertEqual(self.tweet.to_dict()['account'], {
+            'fullname': user['name'],
+            'href': f"/{user['screen_name']}",
+            'id': str(user['id'])
+        })
+
+    def test_date(self):
+        created_at = datetime.datetime.strptime(
+            self.raw['created_at'], '%a %b %d %H:%M:%S +0000 %Y')
+        date = created_at.strftime('%-H:%M %p - %-d %b %Y')
+
+        self.assertEqual(self.tweet.to_dict()['date'], date)
+
+    def test_hashtags(self):
+        raw = dict(self.raw, entities={'hashtags': [
+            {'indices': [0, 7], 'text': 'Python'},
+            {'indices': [8, 15], 'text': 'Django'},
+        ]})
+        tweet = normalize(raw, self.users)
+
+        hashtags = []
+        for item in raw['entities']['hashtags']:
+            hashtags.append(f"#{item['text']}")
+
+        self.assertEqual(tweet.to_dict()['hashtags'], hashtags)
+
+    def test_counts_and_text(self):
+        item = self.tweet.to_dict()
+
+        self.assertEqual(item['likes'], self.raw['favorite_count'])
+        self.assertEqual(item['retweets'], self.raw['retweet_count'])
+        self.assertEqual(item['text'], self.raw['text'])
+
+
+class TestTweet(TestCase):
+
+    def setUp(self):
+        timeline = load_mocked_data(
+            'twitter_user_timeline_api_mocked_data.json'
+        )
+        users = {}
+        self.tweets = [normalize(x, users) for x in timeline]
+
+    def test_has_no_instance_dict(self):
+        self.assertFalse(hasattr(self.tweets[0], '__dict__'))
+        self.assertFalse(hasattr(self.tweets[0].account, '__dict__'))
+
+    def test_pickle_round_trip(self):
+        tweets = pickle.loads(pickle.dumps(self.tweets))
+
+        self.assertEqual(tweets, self.tweets)
+        # the shared account is pickled once
+        self.assertIs(tweets[0].account, tweets[1].account)
+
+    def test_to_dicts(self):
+        items = to_dicts(self.tweets)
+        self.assertEqual(len(items), len(self.tweets))
+        self.assertEqual(
+            list(items[0]),
+            ['account', 'date', 'hashtags', 'likes', 'replies', 'retweets',
+             'text']
+        )
@@ -0,0 +1,183 @@
+from unittest import mock
+from django.test import TestCase
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from tweets import entities
+from tweets.cache import get_response_cache
+from tweets.entities import Account, Tweet, normalize
+from tweets.queries import TweetQuery
+from tweets.services import (
+    TwitterSearchAPIService,
+    TwitterServices,
+    TwitterUserAPIService
+)
+from tweets.tests.utils import load_mocked_data, mocked_twitter_api
+
+
+class TestFieldSelection(TestCase):
+
+    def test_to_dict(self):
+        data = load_mocked_data('twitter_search_api_mocked_data.json')
+        users = {
+            x['id']: Account.from_v2(x) for x in data['includes']['users']
+        }
+        tweet = normalize(data['data'][0], users)
+
+        self.assertEqual(tweet.to_dict(('date', 'likes')), {
+            'date': tweet.get_date(),
+            'likes': tweet.likes,
+        })
+        self.assertEqual(
+            tweet.to_dict(entities.FIELDS),
+            tweet.to_dict()
+        )
+
+    def test_minimal_v2_tweet(self):
+        tweet = Tweet.from_v2({'id': '1', 'text': 'hello'}, {})
+
+        self.assertIsNone(tweet.account)
+        self.assertIsNone(tweet.created_at)
+        self.assertEqual(tweet.hashtags, ())
+        self.assertEqual(tweet.to_dict(('text',)), {'text': 'hello'})
+
+    def test_trimmed_v1_tweet(self):
+        raw = load_mocked_data('twitter_user_timeline_api_mocked_data.json')[0]
+        raw = dict(raw, user={'id': 1, 'id_str': '1'})
+        del raw['entities']
+        tweet = Tweet.from_v1(raw, {})
+
+        self.assertIsNone(tweet.account)
+        self.assertEqual(tweet.hashtags, ())
+        self.assertEqual(tweet.likes, raw['favorite_count'])
+
+
+class TestUpstreamFields(TestCase):
+
+    def test_search_fields(self):
+        payload = TwitterSearchAPIService('python', 10)._get_payload()
+        self.assertEqual(
+            payload['tweet.fields'], 'entities,created_at,public_metrics'
+        )
+        self.assertEqual(payload['expansions'], 'author_id')
+
+        payload = TwitterSearchAPIService(
+            'python', 10, fields=('likes', 'text')
+        )._get_payload()
+        self.assertEqual(payload['tweet.fields'], 'public_metrics')
+        self.assertNotIn('user.fields', payload)
+        self.assertNotIn('expansions', payload)
+
+        payload = TwitterSearchAPIService(
+            'python', 10, fields=('account', 'text')
+        )._get_payload()
+        self.assertNotIn('tweet.fields', payload)
+        self.assertEqual(payload['user.fields'], 'name,username')
+
+    def test_search_fields_of_the_filters(self):
+        payload = TwitterSearchAPIService(
+            'python', 10, fields=('text',),
+            query=TweetQuery(['python'], min_likes=1)
+        )._get_payload()
+        self.assertEqual(payload['tweet.fields'], 'public_metrics')
+
+    def test_timeline_fields(self):
+        payload = TwitterUserAPIService('twitter', 10)._get_timeline_payload(
+            []
+        )
+        self.assertNotIn('trim_user', payload)
+        self.assertNotIn('include_entities', payload)
+
+        payload = TwitterUserAPIService(
+            'twitter', 10, fields=('text',)
+        )._get_timeline_payload([])
+        self.assertEqual(payload['trim_user'], 'true')
+        self.assertEqual(payload['include_entities'], 'false')
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_replies_are_only_looked_up_when_selected(self, mock_get):
+        service = TwitterUserAPIService('twitter', 10, fields=('likes',))
+        service.fetch_data()
+
+        self.assertEqual(len(service.get_tweets()), 10)
+        self.assertEqual(mock_get.call_count, 1)
+
+
+class TestLazyNormalization(TestCase):
+
+    def setUp(self):
+        get_response_cache().clear()
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_search_stops_at_count(self, mock_get):
+        with mock.patch(
+            'tweets.services.normalize', wraps=normalize
+        ) as mock_normalize:
+            tweets = TwitterServices.fetch_tweets(
+                TwitterServices.HASHTAG, hashtag='python', count=1
+            )
+
+        # max_results is at least 10, only the first tweet is built
+        self.assertEqual(mock_get.call_args[1]['params']['max_results'], 10)
+        self.assertEqual(len(tweets), 1)
+        self.assertEqual(mock_normalize.call_count, 1)
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_timeline_stops_at_count(self, mock_get):
+        with mock.patch(
+            'tweets.services.normalize', wraps=normalize
+        ) as mock_normalize:
+            tweets = TwitterServices.fetch_tweets(
+                TwitterServices.USER, screen_name='twitter', count=2
+            )
+
+        self.assertEqual(len(tweets), 2)
+        self.assertEqual(mock_normalize.call_count, 2)
+
+
+class TestFieldsApi(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        get_response_cache().clear()
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_selected_fields(self, mock_get):
+        res = self.client.get('/users/twitter?fields=text,likes&limit=2')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([list(x) for x in res.json()],
+                         [['likes', 'text']] * 2)
+
+        etag = self.client.get('/users/twitter?limit=2')['ETag']
+        self.assertNotEqual(res['ETag'], etag)
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_streamed_fields_are_fetched_alone(self, mock_get):
+        res = self.client.get(
+            '/hashtags/python?fields=date&limit=3',
+            HTTP_ACCEPT='application/x-ndjson'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        lines = b''.join(res.streaming_content).splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(all(x.startswith(b'{"date":') for x in lines))
+        params = mock_get.call_args[1]['params']
+        self.assertEqual(params['tweet.fields'], 'created_at')
+        self.assertNotIn('expansions', params)
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_batch_fields(self, mock_get):
+        res = self.client.post('/batch', [
+            {'type': 'user', 'key': 'twitter', 'limit': 1, 'fields': 'text'}
+        ], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(res.json()[0]['tweets'][0]), ['text'])
+
+    def test_unknown_fields(self):
+        res = self.client.get('/hashtags/python?fields=text,views')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.json(), {'fields': ['Unknown fields: views.']})
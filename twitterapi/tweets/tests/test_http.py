@@ -0,0 +1,57 @@
+from unittest import mock
+from django.test import TestCase, override_settings
+
+from tweets import http
+from tweets.tests.utils import mocked_twitter_api
+from tweets.services import TwitterSearchAPIService
+
+
+TWITTER_HTTP = {
+    'POOL_CONNECTIONS': 2,
+    'POOL_MAXSIZE': 8,
+    'CONNECT_TIMEOUT': 1.5,
+    'READ_TIMEOUT': 4,
+    'MAX_RETRIES': 3,
+    'BACKOFF_FACTOR': 0.5,
+}
+
+
+@override_settings(TWITTER_HTTP=TWITTER_HTTP)
+class TestSharedSession(TestCase):
+
+    def setUp(self):
+        http.close_session()
+
+    def tearDown(self):
+        http.close_session()
+
+    def test_session_is_shared(self):
+        """Test every caller gets the same pooled session"""
+        self.assertIs(http.get_session(), http.get_session())
+
+    def test_session_is_rebuilt_after_close(self):
+        session = http.get_session()
+        http.close_session()
+        self.assertIsNot(session, http.get_session())
+
+    def test_adapter_configuration(self):
+        """Test the adapter uses the configured pool and retries"""
+        adapter = http.get_session().get_adapter(
+            TwitterSearchAPIService.RECENT_SEARCH_API
+        )
+        self.assertEqual(adapter._pool_connections, 2)
+        self.assertEqual(adapter._pool_maxsize, 8)
+        self.assertEqual(adapter.max_retries.total, 3)
+        self.assertEqual(adapter.max_retries.backoff_factor, 0.5)
+        self.assertIn(503, adapter.max_retries.status_forcelist)
+        self.assertNotIn(429, adapter.max_retries.status_forcelist)
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_get_applies_timeouts(self, mock_get):
+        http.get(TwitterSearchAPIService.RECENT_SEARCH_API)
+        self.assertEqual(mock_get.call_args[1]['timeout'], (1.5, 4))
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_get_keeps_explicit_timeout(self, mock_get):
+        http.get(TwitterSearchAPIService.RECENT_SEARCH_API, timeout=1)
+        self.assertEqual(mock_get.call_args[1]['timeout'], 1)
@@ -0,0 +1,308 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from tweets.buffers import HashtagBuffers, LocalBackend, get_hashtag_buffers
+from tweets.cache import CacheEntry, get_response_cache
+from tweets.ingest import Ingester, get_ingester
+from tweets.services import TwitterSearchAPIService, TwitterServices
+from tweets.tests.utils import (
+    load_mocked_data,
+    make_tweets,
+    mocked_twitter_api
+)
+
+INGEST = {
+    'BACKEND': 'local',
+    'SIZE': 20,
+    'TTL': 60,
+    'FLUSH_INTERVAL': 0,
+    'STALL_TIMEOUT': 5,
+}
+
+
+def make_stream_lines():
+    """Stream items of new tweets out of the search fixture
+
+    The first two carry #Python, the third one does not and the last one
+    is a tweet of the search, already fetched by the backfill.
+    """
+    search = load_mocked_data('twitter_search_api_mocked_data.json')
+    users = {x['id']: x for x in search['includes']['users']}
+    newest = int(search['meta']['newest_id'])
+    items = []
+    for i, tweet in enumerate([search['data'][2], search['data'][0],
+                               search['data'][4]]):
+        tweet = dict(tweet, id=str(newest + ((i + 1) << 22)))
+        items.append(tweet)
+    items.append(search['data'][0])
+    return [
+        json.dumps({
+            'data': x,
+            'includes': {'users': [users[x['author_id']]]},
+        }).encode('utf-8')
+        for x in items
+    ]
+
+
+class FakeTwitterHandler(BaseHTTPRequestHandler):
+    """Recent search, filtered stream and stream rules of a fake twitter"""
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(('GET', self.path))
+        if self.path.startswith('/2/tweets/search/stream'):
+            server.authorizations.add(self.headers['Authorization'])
+        if self.path.startswith('/2/tweets/search/stream/rules'):
+            self.send_json({'data': server.rules})
+        elif self.path.startswith('/2/tweets/search/stream'):
+            if server.stream_status != 200:
+                self.send_json({'title': 'Invalid Request'},
+                               server.stream_status)
+                return
+            # lines are sent until the connection is closed, with the
+            # keep-alive blank lines of twitter in between
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            for line in server.lines:
+                self.wfile.write(b'\r\n' + line + b'\r\n')
+                self.wfile.flush()
+        elif self.path.startswith('/2/tweets/search/recent'):
+            self.send_json(
+                load_mocked_data('twitter_search_api_mocked_data.json')
+            )
+        else:
+            self.send_json({}, 404)
+
+    def do_POST(self):
+        self.server.authorizations.add(self.headers['Authorization'])
+        size = int(self.headers['Content-Length'])
+        self.server.requests.append(
+            ('POST', json.loads(self.rfile.read(size)))
+        )
+        self.send_json({'meta': {}})
+
+
+class FakeTwitterServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeTwitterHandler)
+        self.requests = []
+        # credentials of the rules and stream requests
+        self.authorizations = set()
+        self.rules = [
+            {'id': '1', 'value': '#django', 'tag': Ingester.RULE_TAG},
+            {'id': '2', 'value': '#python', 'tag': 'someone-else'},
+        ]
+        self.lines = make_stream_lines()
+        self.stream_status = 200
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+
+class TestHashtagBuffers(TestCase):
+
+    def test_page(self):
+        buffers = HashtagBuffers(LocalBackend(), size=3)
+        buffers.set_entry('Python', CacheEntry(make_tweets(3), 3))
+
+        tweets, cursor = buffers.get_page('python', 2)
+        self.assertEqual([x.id for x in tweets], ['0', '1'])
+        self.assertEqual(cursor, '1')
+        self.assertIsNone(buffers.get_page('python', 4))
+        self.assertIsNone(buffers.get_page('django', 2))
+
+    def test_exhausted_buffer_covers_any_count(self):
+        buffers = HashtagBuffers(LocalBackend(), size=3)
+        buffers.set_entry('python', CacheEntry(make_tweets(2), 3))
+
+        self.assertEqual(buffers.get_page('python', 10)[1], None)
+
+    def test_buffer_expires(self):
+        buffers = HashtagBuffers(LocalBackend(), size=3, ttl=-1)
+        buffers.set_entry('python', CacheEntry(make_tweets(3), 3))
+
+        self.assertIsNone(buffers.get_page('python', 2))
+
+
+@override_settings(TWEETS_INGEST=INGEST)
+class TestIngester(TestCase):
+
+    def setUp(self):
+        get_response_cache().clear()
+        get_hashtag_buffers().clear()
+        self.server = FakeTwitterServer()
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        for target, name, path in [
+            (TwitterSearchAPIService, 'RECENT_SEARCH_API',
+             '/2/tweets/search/recent'),
+            (Ingester, 'STREAM_API', '/2/tweets/search/stream'),
+            (Ingester, 'RULES_API', '/2/tweets/search/stream/rules'),
+        ]:
+            patcher = mock.patch.object(target, name, self.server.url + path)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def run_ingester(self):
+        ingester = get_ingester(hashtags=['Python'])
+        ingester.run(connections=1)
+        return ingester
+
+    def test_rules_are_synced(self):
+        self.run_ingester()
+
+        posts = [x[1] for x in self.server.requests if x[0] == 'POST']
+        self.assertEqual(posts, [
+            {'delete': {'ids': ['1']}},
+            {'add': [{'value': '#python', 'tag': Ingester.RULE_TAG}]},
+        ])
+
+    @override_settings(TWITTER_TOKENS=['first', 'second'])
+    def test_rules_and_stream_use_one_token(self):
+        ingester = self.run_ingester()
+
+        self.assertEqual(self.server.authorizations,
+                         {ingester.token.headers['Authorization']})
+        self.assertEqual(len([x for x in self.server.requests
+                              if x[0] == 'POST']), 2)
+
+    def test_stream_fills_the_buffers(self):
+        self.run_ingester()
+        search = load_mocked_data('twitter_search_api_mocked_data.json')
+
+        tweets = get_hashtag_buffers().get_entry('python').tweets
+        self.assertEqual(len(tweets), INGEST['SIZE'])
+        streamed = [json.loads(x)['data']['id']
+                    for x in self.server.lines[:2]]
+        self.assertEqual([x.id for x in tweets[:3]], [
+            streamed[1], streamed[0], search['data'][0]['id']
+        ])
+        self.assertEqual(tweets[0].account.username, 'ZombieOG3')
+
+    def test_view_answers_out_of_the_buffer(self):
+        self.run_ingester()
+        streamed = json.loads(self.server.lines[1])['data']
+
+        with mock.patch('requests.Session.get',
+                        side_effect=mocked_twitter_api) as mock_get:
+            response = APIClient().get('/hashtags/Python?limit=5')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()), 5)
+            self.assertEqual(response.json()[0]['text'], streamed['text'])
+            self.assertIn('cursor=', response['Link'])
+            mock_get.assert_not_called()
+
+            # the buffer does not cover the larger pages
+            APIClient().get('/hashtags/python?limit=50')
+            self.assertTrue(mock_get.called)
+
+    @mock.patch('httpx.AsyncClient.get', new_callable=mock.AsyncMock,
+                side_effect=mocked_twitter_api)
+    def test_async_page_out_of_the_buffer(self, mock_get):
+        self.run_ingester()
+
+        tweets, cursor = async_to_sync(TwitterServices.aget_page)(
+            TwitterServices.HASHTAG, count=5, hashtag='python'
+        )
+        self.assertEqual(len(tweets), 5)
+        mock_get.assert_not_called()
+
+    def test_sorted_page_out_of_the_buffer(self):
+        self.run_ingester()
+        expected = sorted(
+            [x.retweets for x in get_hashtag_buffers().get_entry(
+                'python').tweets],
+            reverse=True
+        )[:3]
+
+        with mock.patch('requests.Session.get') as mock_get, \
+                self.settings(TWEETS_SORT_WINDOW=20):
+            tweets, _ = TwitterServices.get_page(
+                TwitterServices.HASHTAG, sort='retweets', count=3,
+                hashtag='python'
+            )
+            mock_get.assert_not_called()
+        self.assertEqual([x.retweets for x in tweets], expected)
+
+    def test_malformed_lines_are_skipped(self):
+        self.server.lines = [b'{"data": ', b'{"data": {"id": "1"}}'] + \
+            self.server.lines
+
+        with self.assertLogs(level='WARNING') as logs:
+            self.run_ingester()
+
+        self.assertEqual(
+            len([x for x in logs.output if 'Skipped the stream line' in x]),
+            2
+        )
+        tweets = get_hashtag_buffers().get_entry('python').tweets
+        streamed = json.loads(self.server.lines[3])['data']
+        self.assertEqual(tweets[0].id, streamed['id'])
+
+    def test_stream_errors_are_logged(self):
+        self.server.stream_status = 400
+
+        with self.assertLogs(level='WARNING') as logs:
+            self.run_ingester()
+
+        self.assertIn('The stream failed', logs.output[-1])
+        self.assertIsNone(get_hashtag_buffers().get_entry('python'))
+
+
+class TestIngesterBuffers(TestCase):
+
+    def test_full_ring_is_no_longer_exhausted(self):
+        buffers = HashtagBuffers(LocalBackend(), size=3)
+        ingester = Ingester(buffers, ['python'])
+        tweets = make_tweets(4)[::-1]
+        with mock.patch.object(TwitterServices, 'fetch_tweets',
+                               return_value=tweets[2:]), \
+                mock.patch.object(TwitterServices, 'store_tweets'):
+            ingester.backfill()
+            ingester.flush()
+            self.assertTrue(buffers.get_entry('python').exhausted)
+
+            ingester._rings['python'].extendleft(tweets[:2][::-1])
+            ingester.flush()
+        entry = buffers.get_entry('python')
+        self.assertEqual([x.id for x in entry.tweets], ['3', '2', '1'])
+        self.assertFalse(entry.exhausted)
+
+
+class TestIngestCommand(TestCase):
+
+    @override_settings(TWEETS_INGEST=dict(INGEST, BACKEND=None))
+    def test_backend_is_required(self):
+        with self.assertRaises(CommandError):
+            call_command('ingest_stream', 'python')
+
+    @override_settings(TWEETS_INGEST=dict(INGEST, HASHTAGS=[]))
+    def test_hashtags_are_required(self):
+        with self.assertRaises(CommandError):
+            call_command('ingest_stream')
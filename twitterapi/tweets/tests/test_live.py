@@ -0,0 +1,192 @@
+import asyncio
+import json
+from unittest import mock
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from django.test import TestCase, override_settings
+
+from tweets.live import (
+    HEARTBEAT,
+    LiveApplication,
+    Subscription,
+    SubscriberLimitExceeded,
+    get_live_hub
+)
+from tweets.services import TwitterServices
+from tweets.tests.utils import make_tweets
+
+LIVE = {
+    'COUNT': 10,
+    'INTERVAL': 0.01,
+    'MAX_QUEUE': 2,
+    'MAX_SUBSCRIBERS': 2,
+    'HEARTBEAT': 5,
+}
+
+
+def make_pages(first=None):
+    """Return an aget_page mock, the tweets 3 and 4 are new after the
+    first polls"""
+    tweets = make_tweets(5)[::-1]
+    pages = iter(first or [tweets[2:]])
+
+    async def aget_page(search_by, **kwargs):
+        return next(pages, tweets), None
+    return aget_page
+
+
+def parse_events(body):
+    return [
+        dict(x.split(': ', 1) for x in event.split('\n'))
+        for event in body.decode('utf-8').split('\n\n')
+        if event and not event.startswith(':')
+    ]
+
+
+async def not_found(scope, receive, send):
+    await send({'type': 'http.response.start', 'status': 404,
+                'headers': []})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+@override_settings(TWEETS_LIVE=LIVE)
+class TestLiveHub(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(
+            TwitterServices, 'aget_page',
+            new_callable=mock.AsyncMock, side_effect=make_pages()
+        )
+        self.mock_aget_page = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_subscribers_share_one_channel(self):
+        async def subscribe():
+            hub = get_live_hub()
+            first = hub.subscribe(TwitterServices.HASHTAG, 'python')
+            second = hub.subscribe(TwitterServices.HASHTAG, 'Python')
+            self.assertEqual(len(hub.channels), 1)
+
+            events = await asyncio.wait_for(first.get(), 1)
+            self.assertIs(events[0], (await second.get())[0])
+
+            hub.unsubscribe(first)
+            hub.unsubscribe(second)
+            self.assertEqual(hub.channels, {})
+            return events
+
+        events = parse_events(b''.join(async_to_sync(subscribe)()))
+        self.assertEqual(events[0]['id'], '4')
+        self.assertEqual(events[0]['event'], 'tweets')
+        self.assertEqual(len(json.loads(events[0]['data'])), 2)
+        for call in self.mock_aget_page.call_args_list:
+            self.assertEqual(call[1], {'count': 10, 'hashtag': 'python'})
+
+    def test_empty_first_poll_sets_no_baseline(self):
+        tweets = make_tweets(5)[::-1]
+        self.mock_aget_page.side_effect = make_pages([[], tweets[2:]])
+
+        async def subscribe():
+            hub = get_live_hub()
+            subscription = hub.subscribe(TwitterServices.HASHTAG, 'python')
+            events = await asyncio.wait_for(subscription.get(), 1)
+            hub.unsubscribe(subscription)
+            return events
+
+        # the tweets of the second poll set the baseline, they are not new
+        events = parse_events(b''.join(async_to_sync(subscribe)()))
+        self.assertEqual(events[0]['id'], '4')
+        self.assertEqual(len(json.loads(events[0]['data'])), 2)
+
+    def test_subscriber_limit(self):
+        async def subscribe():
+            hub = get_live_hub()
+            for i in range(LIVE['MAX_SUBSCRIBERS']):
+                hub.subscribe(TwitterServices.USER, f'user{i}')
+            with self.assertRaises(SubscriberLimitExceeded):
+                hub.subscribe(TwitterServices.USER, 'twitter')
+            for channel in list(hub.channels.values()):
+                for subscription in list(channel.subscriptions):
+                    hub.unsubscribe(subscription)
+
+        async_to_sync(subscribe)()
+
+    def test_slow_subscriber_drops_the_oldest_events(self):
+        async def get():
+            subscription = Subscription(None, max_queue=2)
+            for event in (b'1', b'2', b'3'):
+                subscription.put(event)
+            return await subscription.get()
+
+        events = async_to_sync(get)()
+        self.assertEqual(events[1:], [b'2', b'3'])
+        self.assertEqual(parse_events(events[0]), [{
+            'event': 'lagged',
+            'data': '{"dropped":1}',
+        }])
+
+
+@override_settings(TWEETS_LIVE=LIVE)
+class TestLiveApplication(TestCase):
+
+    def get_scope(self, path, method='GET'):
+        return {
+            'type': 'http',
+            'method': method,
+            'path': path,
+            'query_string': b'',
+            'headers': [],
+        }
+
+    @mock.patch.object(TwitterServices, 'aget_page',
+                       new_callable=mock.AsyncMock)
+    def test_new_tweets_are_streamed(self, mock_aget_page):
+        mock_aget_page.side_effect = make_pages()
+
+        async def stream():
+            communicator = ApplicationCommunicator(
+                LiveApplication(not_found),
+                self.get_scope('/live/users/twitter')
+            )
+            await communicator.send_input({'type': 'http.request'})
+            start = await communicator.receive_output(1)
+            bodies = [
+                (await communicator.receive_output(1))['body']
+                for _ in range(2)
+            ]
+            await communicator.send_input({'type': 'http.disconnect'})
+            await communicator.wait(1)
+            self.assertEqual(get_live_hub().channels, {})
+            return start, bodies
+
+        start, bodies = async_to_sync(stream)()
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'),
+                      start['headers'])
+        self.assertEqual(bodies[0], HEARTBEAT)
+        tweets = json.loads(parse_events(bodies[1])[0]['data'])
+        self.assertEqual(len(tweets), 2)
+        self.assertEqual(mock_aget_page.call_args[0],
+                         (TwitterServices.USER,))
+
+    def test_method_not_allowed(self):
+        async def post():
+            communicator = ApplicationCommunicator(
+                LiveApplication(not_found),
+                self.get_scope('/live/hashtags/python', 'POST')
+            )
+            await communicator.send_input({'type': 'http.request'})
+            return await communicator.receive_output(1)
+
+        self.assertEqual(async_to_sync(post)()['status'], 405)
+
+    def test_other_paths_are_passed_on(self):
+        async def get():
+            communicator = ApplicationCommunicator(
+                LiveApplication(not_found),
+                self.get_scope('/hashtags/python')
+            )
+            await communicator.send_input({'type': 'http.request'})
+            return await communicator.receive_output(1)
+
+        self.assertEqual(async_to_sync(get)()['status'], 404)
@@ -0,0 +1,160 @@
+import time
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.test import TestCase, override_settings
+
+from tweets.metrics import (
+    DjangoCacheBackend,
+    LocalBackend,
+    MetricsCache,
+    get_metrics_cache
+)
+from tweets.services import (
+    TwitterLookupAPIService,
+    TwitterSearchAPIService,
+    TwitterUserAPIService
+)
+from tweets.tests.utils import (
+    load_mocked_data,
+    make_tweets,
+    mocked_twitter_api
+)
+
+LOOK_UP_API = TwitterLookupAPIService.LOOK_UP_API
+
+
+def get_lookups(mock_get):
+    return [
+        x[1]['params']['ids'].split(',') for x in mock_get.call_args_list
+        if x[0][0] == LOOK_UP_API
+    ]
+
+
+class TestMetricsCache(TestCase):
+
+    def setUp(self):
+        self.tweets = make_tweets(3)
+        for i, tweet in enumerate(self.tweets):
+            tweet.replies = i
+            tweet.metrics_at = time.time()
+
+    def test_round_trip(self):
+        cache = MetricsCache(LocalBackend(), ttl=30)
+        cache.set_many(self.tweets)
+
+        self.assertEqual(cache.get_many(['1', '3']), {
+            '1': (0, 1, 0, self.tweets[1].metrics_at)
+        })
+
+    def test_old_counts_are_skipped(self):
+        cache = MetricsCache(LocalBackend(), ttl=30)
+        self.tweets[0].metrics_at -= 60
+        cache.set_many(self.tweets)
+
+        self.assertEqual(list(cache.get_many(['0', '1', '2'])), ['1', '2'])
+
+    def test_local_backend_is_bounded(self):
+        cache = MetricsCache(LocalBackend(max_entries=2), ttl=30)
+        cache.set_many(self.tweets)
+
+        self.assertEqual(list(cache.get_many(['0', '1', '2'])), ['1', '2'])
+
+    def test_django_backend(self):
+        cache = MetricsCache(DjangoCacheBackend(prefix='metrics-test:'))
+        cache.set_many(self.tweets)
+
+        self.assertEqual(list(cache.get_many(['2', '4'])), ['2'])
+
+
+class TestSharedMetrics(TestCase):
+
+    def setUp(self):
+        # every test gets an empty cache of its own
+        metrics = override_settings(
+            TWEETS_METRICS_CACHE={'BACKEND': 'local', 'TTL': 30}
+        )
+        metrics.enable()
+        self.addCleanup(metrics.disable)
+        self.cache = get_metrics_cache()
+
+    def cache_timeline(self, count, replies=7):
+        """Put the counts of the first tweets of the timeline in cache"""
+        tweets = make_tweets(count)
+        timeline = load_mocked_data(
+            'twitter_user_timeline_api_mocked_data.json'
+        )
+        for tweet, raw in zip(tweets, timeline):
+            tweet.id = raw['id_str']
+            tweet.replies = replies
+            tweet.metrics_at = time.time()
+        self.cache.set_many(tweets)
+
+    def test_off_by_default(self):
+        with override_settings(TWEETS_METRICS_CACHE={}):
+            self.assertIsNone(get_metrics_cache())
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_search_counts_are_shared(self, mock_get):
+        service = TwitterSearchAPIService('python', 10)
+        service.fetch_data()
+
+        tweet = service.get_tweets()[0]
+        self.assertEqual(
+            self.cache.get_many([tweet.id])[tweet.id],
+            (tweet.likes, tweet.replies, tweet.retweets, tweet.metrics_at)
+        )
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_cached_timeline_skips_the_lookup(self, mock_get):
+        self.cache_timeline(30)
+        service = TwitterUserAPIService('twitter', 30)
+        service.fetch_data()
+
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertTrue(all(x.replies == 7 for x in service.get_tweets()))
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_only_missing_ids_are_looked_up(self, mock_get):
+        self.cache_timeline(10)
+        service = TwitterUserAPIService('twitter', 30)
+        service.fetch_data()
+
+        lookups = get_lookups(mock_get)
+        self.assertEqual(len(lookups), 1)
+        self.assertEqual(len(lookups[0]), 20)
+        self.assertEqual(lookups[0][0], service.get_tweets()[10].id)
+
+        # the looked up counts are shared in turn
+        mock_get.reset_mock()
+        TwitterUserAPIService('twitter', 30).fetch_data()
+        self.assertEqual(get_lookups(mock_get), [])
+
+    @mock.patch(
+        'httpx.AsyncClient.get',
+        new_callable=mock.AsyncMock,
+        side_effect=mocked_twitter_api
+    )
+    def test_async_timeline(self, mock_get):
+        self.cache_timeline(30)
+        service = TwitterUserAPIService('twitter', 30)
+        async_to_sync(service.afetch_data)()
+
+        self.assertEqual(mock_get.call_count, 1)
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_older_counts_are_looked_up(self, mock_get):
+        self.cache_timeline(1, replies=3)
+        tweets = make_tweets(2)
+        timeline = load_mocked_data(
+            'twitter_user_timeline_api_mocked_data.json'
+        )
+        tweets[0].id, tweets[1].id = timeline[0]['id_str'], '1'
+
+        TwitterLookupAPIService(tweets).fetch_data()
+        self.assertEqual(tweets[0].replies, 3)
+        self.assertEqual(get_lookups(mock_get), [['1']])
+
+        # counts fetched after the cached ones are not replaced
+        tweets[0].metrics_at = time.time() + 1
+        TwitterLookupAPIService(tweets[:1]).fetch_data()
+        self.assertEqual(get_lookups(mock_get)[-1], [tweets[0].id])
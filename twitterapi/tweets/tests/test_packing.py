@@ -0,0 +1,170 @@
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.test import TestCase, override_settings
+
+from tweets import batch
+from tweets.cache import get_response_cache
+from tweets.services import TwitterPackedSearchAPIService, TwitterServices
+from tweets.tests.utils import (
+    mocked_twitter_api,
+    mocked_twitter_api_with_filters
+)
+
+SEARCH_API = TwitterPackedSearchAPIService.RECENT_SEARCH_API
+
+
+def get_queries(mock_get):
+    return [
+        x[1]['params']['query'] for x in mock_get.call_args_list
+        if x[0][0] == SEARCH_API
+    ]
+
+
+class TestPackedSearch(TestCase):
+
+    def test_pack_within_query_length(self):
+        hashtags = ['a' * 100, 'b' * 100, 'c' * 100, 'd' * 100, 'e' * 100]
+        packs = TwitterPackedSearchAPIService.pack(hashtags)
+
+        self.assertEqual([len(x) for x in packs], [4, 1])
+        for pack in packs:
+            service = TwitterPackedSearchAPIService(pack, 10)
+            self.assertLessEqual(
+                len(service.get_query()),
+                TwitterPackedSearchAPIService.MAX_QUERY_LENGTH
+            )
+        self.assertEqual(
+            TwitterPackedSearchAPIService(['a', 'b'], 10).get_query(),
+            '#a OR #b'
+        )
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_tweets_are_split_by_hashtag(self, mock_get):
+        service = TwitterPackedSearchAPIService(['python', 'golang'], 30)
+        service.fetch_data()
+        tweets = service.get_tweets_by_hashtag({'python': 5, 'golang': 5})
+
+        self.assertEqual(len(tweets['python']), 5)
+        self.assertEqual(tweets['golang'], [])
+        for tweet in tweets['python']:
+            self.assertIn('python', [x.lower() for x in tweet.hashtags])
+        self.assertFalse(service.exhausted)
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_whole_last_page_is_split(self, mock_get):
+        tweets = TwitterServices.fetch_packed_tweets(
+            {'python': 2, 'tensorflow': 2}
+        )
+
+        # the only #tensorflow tweet of the page is past the 4 needed
+        self.assertEqual(len(tweets['python']), 2)
+        self.assertIn('tensorflow',
+                      [x.lower() for x in tweets['tensorflow'][0].hashtags])
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_short_hashtags_fetch_older_tweets(self, mock_get):
+        tweets = TwitterServices.fetch_packed_tweets(
+            {'python': 10, 'javascript': 10, 'golang': 10}
+        )
+
+        self.assertEqual({k: len(v) for k, v in tweets.items()},
+                         {'python': 10, 'javascript': 10, 'golang': 10})
+        first, *others = [x[1]['params'] for x in mock_get.call_args_list]
+        self.assertEqual(first['query'], '#python OR #javascript OR #golang')
+        self.assertEqual(first['max_results'], 30)
+        # only the hashtags left short fetch the tweets older than the
+        # combined page on their own
+        oldest_id = '1310517764143165440'
+        self.assertEqual([x['query'] for x in others],
+                         ['#javascript', '#golang'])
+        self.assertTrue(all(x['until_id'] == oldest_id for x in others))
+
+    @mock.patch('requests.Session.get',
+                side_effect=mocked_twitter_api_with_filters)
+    def test_exhausted_query(self, mock_get):
+        tweets = TwitterServices.fetch_packed_tweets(
+            {'python': 10, 'javascript': 10, 'golang': 10}
+        )
+
+        self.assertEqual({k: len(v) for k, v in tweets.items()},
+                         {'python': 10, 'javascript': 3, 'golang': 0})
+        self.assertEqual(mock_get.call_count, 1)
+
+
+@override_settings(TWEETS_CACHE={
+    'BACKEND': 'lru',
+    'TTL': {'hashtags': 30},
+})
+class TestHashtagPages(TestCase):
+
+    def setUp(self):
+        get_response_cache().clear()
+
+    @mock.patch('requests.Session.get',
+                side_effect=mocked_twitter_api_with_filters)
+    def test_pages_are_cached_per_hashtag(self, mock_get):
+        pages = TwitterServices.get_hashtag_pages(
+            {'python': 5, 'bigdata': 12, 'iot': 3}
+        )
+
+        self.assertEqual(get_queries(mock_get),
+                         ['#python OR #bigdata OR #iot'])
+        self.assertEqual(len(pages['python'][0]), 5)
+        self.assertEqual(pages['python'][1], pages['python'][0][-1].id)
+        self.assertEqual(len(pages['bigdata'][0]), 12)
+
+        cache = get_response_cache()
+        entry = cache.get_entry('hashtags', 'bigdata')
+        self.assertEqual(entry.count, 20)
+        # bigdata only has 17 tweets, the entry covers any limit
+        self.assertEqual(len(entry.tweets), 17)
+        self.assertEqual(entry.get_page(50), (entry.tweets, None))
+
+        # cached hashtags are not searched again
+        mock_get.reset_mock()
+        pages = TwitterServices.get_hashtag_pages({'python': 5, 'ai': 3})
+        self.assertEqual(get_queries(mock_get), ['#ai'])
+
+    @mock.patch('requests.Session.get',
+                side_effect=mocked_twitter_api_with_filters)
+    def test_batch_packs_hashtags(self, mock_get):
+        results = batch.get_results([
+            {'type': 'hashtag', 'key': 'Python', 'limit': 5},
+            {'type': 'user', 'key': 'twitter', 'limit': 5},
+            {'type': 'hashtag', 'key': 'AI', 'limit': 3},
+            {'type': 'hashtag', 'key': 'python', 'limit': 2},
+        ])
+
+        self.assertEqual(get_queries(mock_get), ['#python OR #ai'])
+        self.assertEqual([len(x.tweets) for x in results], [5, 5, 3, 2])
+        self.assertTrue(all(x.error is None for x in results))
+
+    @override_settings(TWEETS_BATCH={
+        'MAX_ITEMS': 50,
+        'MAX_CONCURRENCY': 8,
+        'PACK_HASHTAGS': False
+    })
+    @mock.patch('requests.Session.get',
+                side_effect=mocked_twitter_api_with_filters)
+    def test_packing_can_be_turned_off(self, mock_get):
+        batch.get_results([
+            {'type': 'hashtag', 'key': 'python'},
+            {'type': 'hashtag', 'key': 'ai'},
+        ])
+        self.assertEqual(sorted(get_queries(mock_get)), ['#ai', '#python'])
+
+    @mock.patch(
+        'httpx.AsyncClient.get',
+        new_callable=mock.AsyncMock,
+        side_effect=mocked_twitter_api
+    )
+    def test_async_batch_packs_hashtags(self, mock_get):
+        results = async_to_sync(batch.aget_results)([
+            {'type': 'hashtag', 'key': 'python', 'limit': 10},
+            {'type': 'hashtag', 'key': 'javascript', 'limit': 10},
+        ])
+
+        self.assertEqual([len(x.tweets) for x in results], [10, 10])
+        # javascript only has 3 tweets in the combined page
+        self.assertEqual(get_queries(mock_get),
+                         ['#python OR #javascript', '#javascript'])
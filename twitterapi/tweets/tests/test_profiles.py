@@ -0,0 +1,52 @@
+import json
+import os
+import subprocess
+import sys
+from django.test import SimpleTestCase
+
+# settings are loaded once per process, the "api" profile is checked in
+# an interpreter of its own
+API_PROFILE_CHECK = '''
+import json
+import os
+import sys
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'twitterapi.settings')
+import django
+django.setup()
+
+from unittest import mock
+from django.test import Client
+from tweets.tests.utils import mocked_twitter_api
+
+client = Client()
+with mock.patch('requests.Session.get', side_effect=mocked_twitter_api):
+    res = client.get('/hashtags/python', {'limit': 5})
+
+print(json.dumps({
+    'status': res.status_code,
+    'tweets': len(res.json()),
+    'invalid': client.get('/hashtags/python', {'limit': 0}).status_code,
+    'admin': client.get('/admin/').status_code,
+    'auth': 'django.contrib.auth.models' in sys.modules,
+}))
+'''
+
+
+class TestApiProfile(SimpleTestCase):
+
+    def test_api_profile(self):
+        out = subprocess.run(
+            [sys.executable, '-c', API_PROFILE_CHECK],
+            env=dict(os.environ, DJANGO_SETTINGS_PROFILE='api'),
+            check=True,
+            stdout=subprocess.PIPE
+        ).stdout
+
+        self.assertEqual(json.loads(out), {
+            'status': 200,
+            'tweets': 5,
+            'invalid': 400,
+            'admin': 404,
+            'auth': False,
+        })
@@ -0,0 +1,188 @@
+import datetime
+from unittest import mock
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from tweets.cache import get_response_cache
+from tweets.queries import TweetQuery
+from tweets.services import TwitterSearchAPIService
+from tweets.tests.utils import make_tweets, mocked_twitter_api
+
+
+class TestTweetQuery(TestCase):
+
+    def test_upstream_query(self):
+        self.assertEqual(
+            TweetQuery(['python', 'django']).get_query(),
+            '(#python OR #django)'
+        )
+        self.assertEqual(
+            TweetQuery(['python', 'django'], match='all',
+                       exclude_retweets=True, lang='en').get_query(),
+            '#python #django -is:retweet lang:en'
+        )
+
+    def test_time_window_params(self):
+        since = timezone.now() - datetime.timedelta(days=1)
+        until = since + datetime.timedelta(hours=1)
+        query = TweetQuery(['python'], since=since, until=until)
+        self.assertEqual(query.get_params(), {
+            'start_time': f'{since:%Y-%m-%dT%H:%M:%S}Z',
+            'end_time': f'{until:%Y-%m-%dT%H:%M:%S}Z',
+        })
+
+        # twitter rejects an end_time of the last seconds
+        query = TweetQuery(['python'], until=timezone.now())
+        self.assertEqual(query.get_params(), {})
+
+    def test_start_time_is_kept_in_the_window(self):
+        since = datetime.datetime(2020, 9, 28, 9, 0,
+                                  tzinfo=datetime.timezone.utc)
+        now = datetime.datetime(2020, 10, 8, 9, 0,
+                                tzinfo=datetime.timezone.utc)
+
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            params = TweetQuery(['python'], since=since).get_params()
+        self.assertEqual(params, {'start_time': '2020-10-01T09:01:00Z'})
+
+    def test_end_time_out_of_the_window_is_checked_locally(self):
+        until = datetime.datetime(2020, 9, 28, 9, 0,
+                                  tzinfo=datetime.timezone.utc)
+        now = datetime.datetime(2020, 10, 8, 9, 0,
+                                tzinfo=datetime.timezone.utc)
+
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            params = TweetQuery(['python'], until=until).get_params()
+        self.assertEqual(params, {})
+
+    def test_local_filters(self):
+        tweet = make_tweets(1)[0]
+        tweet.likes = 5
+        self.assertTrue(TweetQuery(['a'], min_likes=5).matches(tweet))
+        self.assertFalse(TweetQuery(['a'], min_likes=6).matches(tweet))
+        self.assertFalse(TweetQuery(['a'], min_replies=1).matches(tweet))
+        self.assertFalse(
+            TweetQuery(['a'], until=tweet.created_at).matches(tweet)
+        )
+
+    def test_repeated_hashtags_are_dropped(self):
+        query = TweetQuery(['python', 'ai', 'Python', 'AI', 'iot'])
+        self.assertEqual(query.get_query(), '(#python OR #ai OR #iot)')
+        self.assertIsNone(
+            TweetQuery.from_params('python', {'tags': ['PYTHON']})
+        )
+
+    def test_key_is_canonical(self):
+        self.assertEqual(TweetQuery(['Python', 'ai'], min_likes=1).key,
+                         TweetQuery(['AI', 'python'], min_likes=1).key)
+        self.assertNotEqual(TweetQuery(['python', 'ai']).key,
+                            TweetQuery(['python', 'ai'], match='all').key)
+
+    def test_plain_hashtag_has_no_query(self):
+        self.assertIsNone(TweetQuery.from_params('python', {}))
+        self.assertIsNotNone(
+            TweetQuery.from_params('python', {'tags': ['ai']})
+        )
+
+
+class TestSearchWithQuery(TestCase):
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_filters_are_evaluated_over_the_tweets(self, mock_get):
+        service = TwitterSearchAPIService(
+            'python', 10,
+            query=TweetQuery(['python'], min_retweets=30)
+        )
+        service.fetch_data()
+
+        tweets = service.get_tweets()
+        self.assertEqual(len(tweets), 10)
+        self.assertTrue(all(x.retweets >= 30 for x in tweets))
+        # every mocked page has 8 tweets with 30 retweets or more
+        self.assertEqual(mock_get.call_count, 2)
+        params = mock_get.call_args[1]['params']
+        self.assertEqual(params['max_results'], 100)
+        self.assertEqual(params['query'], '#python')
+
+    @override_settings(TWEETS_MAX_SCANNED=60)
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_scanned_tweets_are_bounded(self, mock_get):
+        service = TwitterSearchAPIService(
+            'python', 10,
+            query=TweetQuery(['python'], min_likes=1)
+        )
+        service.fetch_data()
+
+        self.assertEqual(len(service.get_tweets()), 2)
+        self.assertEqual(service.scanned, 60)
+
+
+class TestHashtagFiltersApi(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        get_response_cache().clear()
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_tags_and_filters(self, mock_get):
+        res = self.client.get(
+            '/hashtags/python?tags=ai,iot&match=all&min_retweets=100'
+            '&exclude_retweets=true&lang=en&limit=3'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([x['retweets'] for x in res.json()], [100, 100, 137])
+        params = mock_get.call_args[1]['params']
+        self.assertEqual(params['query'],
+                         '#python #ai #iot -is:retweet lang:en')
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_filtered_searches_are_cached_apart(self, mock_get):
+        self.client.get('/hashtags/python?limit=5')
+        self.client.get('/hashtags/python?limit=5&min_retweets=30')
+        self.client.get('/hashtags/Python?limit=5&min_retweets=30')
+        self.client.get('/hashtags/python?limit=5')
+
+        # the filtered search follows two pages to fill the cached entry
+        self.assertEqual(mock_get.call_count, 3)
+        queries = [x[1]['params']['query'] for x in mock_get.call_args_list]
+        self.assertEqual(queries, ['#python'] * 3)
+
+    def test_invalid_filters(self):
+        for params in ('tags=a,,b', 'match=some', 'min_likes=-1',
+                       'lang=english', 'since=2020-09-28T10:00:00Z',
+                       f'since={timezone.now():%Y-%m-%dT%H:%M:%S}Z'
+                       '&until=2020-09-28T09:00:00Z'):
+            res = self.client.get(f'/hashtags/python?{params}')
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST,
+                             params)
+
+    def test_query_longer_than_the_search_accepts(self):
+        tags = ','.join(f'tag{i}' for i in range(95))
+        res = self.client.get(f'/hashtags/python?tags={tags}')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('tags', res.json())
+
+        # the repeated tags do not count
+        tags = ','.join(['Tag', 'tag'] * 40)
+        with mock.patch('requests.Session.get',
+                        side_effect=mocked_twitter_api) as mock_get:
+            res = self.client.get(f'/hashtags/python?tags={tags}')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(mock_get.call_args[1]['params']['query'],
+                         '(#python OR #Tag)')
+
+    def test_window_out_of_the_recent_search(self):
+        for name in ('since', 'until'):
+            res = self.client.get(
+                f'/hashtags/python?{name}=2020-09-28T10:00:00Z'
+            )
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(res.json(), {
+                name: ['Ensure this value is within the last 7 days.']
+            })
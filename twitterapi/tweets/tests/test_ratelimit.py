@@ -0,0 +1,165 @@
+import time
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.test import TestCase, override_settings
+from django.test.client import AsyncRequestFactory
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from tweets import http, views
+from tweets.cache import get_response_cache
+from tweets.exceptions import RateLimitExceeded
+from tweets.ratelimit import (
+    DjangoCacheBackend,
+    LocalBackend,
+    RateLimiter,
+    get_rate_limiter
+)
+from tweets.services import TwitterSearchAPIService
+from tweets.tokens import get_token_pool
+from tweets.tests.utils import MockResponse, mocked_twitter_api
+
+SEARCH_API = TwitterSearchAPIService.RECENT_SEARCH_API
+
+RATE_LIMIT = {'BACKEND': 'local', 'RESERVE': 0, 'MAX_WAIT': 0}
+
+
+def rate_limit_headers(remaining, reset_in=900):
+    return {
+        'x-rate-limit-remaining': str(remaining),
+        'x-rate-limit-reset': str(int(time.time()) + reset_in),
+    }
+
+
+def mocked_rate_limited_api(*args, **kwargs):
+    """Twitter answering 429 to every request"""
+    return MockResponse(
+        {'title': 'Too Many Requests'},
+        429,
+        headers=rate_limit_headers(0, reset_in=120)
+    )
+
+
+class TestRateLimiter(TestCase):
+
+    def setUp(self):
+        self.limiter = RateLimiter(LocalBackend())
+
+    def test_unknown_budget(self):
+        self.assertEqual(self.limiter.acquire('search'), 0)
+
+    def test_budget_from_headers(self):
+        res = MockResponse({}, 200, headers=rate_limit_headers(2))
+        self.limiter.update('search', res)
+
+        self.assertEqual(self.limiter.acquire('search'), 0)
+        self.assertEqual(self.limiter.get_budget('search')[0], 1)
+        self.assertEqual(self.limiter.acquire('search'), 0)
+        with self.assertRaises(RateLimitExceeded) as cm:
+            self.limiter.acquire('search')
+        self.assertGreater(cm.exception.retry_after, 800)
+
+    def test_budgets_are_per_endpoint(self):
+        res = MockResponse({}, 200, headers=rate_limit_headers(0))
+        self.limiter.update('search', res)
+        self.assertEqual(self.limiter.acquire('timeline'), 0)
+
+    def test_reserve(self):
+        limiter = RateLimiter(LocalBackend(), reserve=5)
+        limiter.update(
+            'search', MockResponse({}, 200, headers=rate_limit_headers(5))
+        )
+        with self.assertRaises(RateLimitExceeded):
+            limiter.acquire('search')
+
+    def test_wait_for_close_reset(self):
+        limiter = RateLimiter(LocalBackend(), max_wait=10)
+        limiter.update('search', MockResponse(
+            {}, 200, headers=rate_limit_headers(0, reset_in=5)
+        ))
+        self.assertTrue(0 < limiter.acquire('search') <= 5)
+
+    def test_reset_window(self):
+        self.limiter.backend.set('search', 0, time.time() - 1)
+        self.assertEqual(self.limiter.acquire('search'), 0)
+
+    def test_too_many_requests(self):
+        with self.assertRaises(RateLimitExceeded):
+            self.limiter.update('search', mocked_rate_limited_api())
+        self.assertEqual(self.limiter.get_budget('search')[0], 0)
+
+    def test_too_many_requests_without_headers(self):
+        with self.assertRaises(RateLimitExceeded) as cm:
+            self.limiter.update('search', MockResponse({}, 429))
+        self.assertAlmostEqual(
+            cm.exception.retry_after,
+            RateLimiter.DEFAULT_RETRY_AFTER,
+            delta=1
+        )
+
+
+class TestDjangoCacheBackend(TestCase):
+
+    def test_round_trip(self):
+        backend = DjangoCacheBackend(prefix='tweets-ratelimit-test:')
+        reset = int(time.time()) + 60
+        backend.set('search', 3, reset)
+        backend.decr('search')
+
+        self.assertEqual(backend.get('search'), (2, reset))
+        self.assertIsNone(backend.get('timeline'))
+
+
+class TestRateLimitedRequests(TestCase):
+
+    def setUp(self):
+        get_response_cache().clear()
+        # every test gets a limiter of its own
+        limits = override_settings(TWEETS_RATE_LIMIT=RATE_LIMIT)
+        limits.enable()
+        self.addCleanup(limits.disable)
+
+    @mock.patch('requests.Session.get', side_effect=mocked_rate_limited_api)
+    def test_limited_requests_are_not_sent(self, mock_get):
+        for _ in range(3):
+            with self.assertRaises(RateLimitExceeded):
+                http.get(SEARCH_API)
+        self.assertEqual(mock_get.call_count, 1)
+
+    @mock.patch('requests.Session.get', side_effect=mocked_rate_limited_api)
+    def test_view_returns_too_many_requests(self, mock_get):
+        with self.assertLogs(level='WARNING'):
+            res = APIClient().get('/hashtags/python')
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertTrue(0 < int(res['Retry-After']) <= 120)
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_cached_tweets_are_served_when_limited(self, mock_get):
+        client = APIClient()
+        client.get('/hashtags/python', {'limit': 10})
+        pool = get_token_pool()
+        get_rate_limiter().backend.set(
+            pool.get_key(SEARCH_API, pool.tokens[0]), 0, time.time() + 60
+        )
+
+        res = client.get('/hashtags/python', {'limit': 40})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 10)
+        self.assertEqual(mock_get.call_count, 1)
+
+    @mock.patch(
+        'httpx.AsyncClient.get',
+        new_callable=mock.AsyncMock,
+        side_effect=mocked_rate_limited_api
+    )
+    def test_async_view_returns_too_many_requests(self, mock_get):
+        request = AsyncRequestFactory().get('/hashtags/python')
+        with self.assertLogs(level='WARNING'):
+            res = async_to_sync(views.tweets_by_hashtag_async)(
+                request, hashtag='python'
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', res)
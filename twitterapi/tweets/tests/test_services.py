@@ -1,14 +1,18 @@
-import datetime
 from unittest import mock
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from twitterapi.settings import TWITTER_TOKEN
+from tweets.cache import get_response_cache
+from tweets.entities import Tweet
 from tweets.services import (
     TwitterServices,
     TwitterUserAPIService,
     TwitterSearchAPIService
 )
-from tweets.tests.utils import mocked_twitter_api
+from tweets.tests.utils import (
+    mocked_twitter_api,
+    mocked_twitter_api_with_filters
+)
 
 
 class TestTwitterService(TestCase):
@@ -46,85 +50,13 @@ class TestTwitterSearchAPIService(TestCase):
         self.assertEqual(self.service.hashtag, 'hashtag')
         self.assertEqual(self.service.count, 10)
 
-    @mock.patch('requests.get', side_effect=mocked_twitter_api)
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
     def test_fetch_data(self, mock_get):
         """Test fetch data from Twitter API and process it correctly"""
         self.service.fetch_data()
         self.assertTrue(len(self.service._tweets) > 0)
 
-    @mock.patch('requests.get', side_effect=mocked_twitter_api)
-    def test_get_account(self, mock_get):
-        self.service.fetch_data()
-        tweet = self.service._tweets[0]
-        account = self.service._get_account(tweet)
-
-        self.assertEqual(account, {
-            'fullname': tweet['user']['name'],
-            'href': f"/{tweet['user']['username']}",
-            'id': tweet['user']['id']
-        })
-
-    @mock.patch('requests.get', side_effect=mocked_twitter_api)
-    def test_get_date(self, mock_get):
-        self.service.fetch_data()
-        tweet = self.service._tweets[0]
-        result = self.service._get_date(tweet)
-
-        created_at = datetime.datetime.strptime(
-            tweet['created_at'], '%Y-%m-%dT%H:%M:%S.%fZ')
-        date = created_at.strftime('%-H:%M %p - %-d %b %Y')
-
-        self.assertEqual(date, result)
-
-    @mock.patch('requests.get', side_effect=mocked_twitter_api)
-    def test_get_hashtags(self, mock_get):
-        self.service.fetch_data()
-        tweet = self.service._tweets[0]
-        result = self.service._get_hashtags(tweet)
-
-        hashtags = []
-        for item in tweet['entities'].get('hashtags', []):
-            hashtags.append(f"#{item['tag']}")
-
-        self.assertEqual(hashtags, result)
-
-    @mock.patch('requests.get', side_effect=mocked_twitter_api)
-    def test_get_likes_count(self, mock_get):
-        self.service.fetch_data()
-        tweet = self.service._tweets[0]
-        result = self.service._get_likes_count(tweet)
-
-        likes_count = tweet['public_metrics']['like_count']
-        self.assertEqual(likes_count, result)
-
-    @mock.patch('requests.get', side_effect=mocked_twitter_api)
-    def test_get_replies_count(self, mock_get):
-        self.service.fetch_data()
-        tweet = self.service._tweets[0]
-        result = self.service._get_replies_count(tweet)
-
-        replies_count = tweet['public_metrics']['reply_count']
-        self.assertEqual(replies_count, result)
-
-    @mock.patch('requests.get', side_effect=mocked_twitter_api)
-    def test_get_retweets_count(self, mock_get):
-        self.service.fetch_data()
-        tweet = self.service._tweets[0]
-        result = self.service._get_retweets_count(tweet)
-
-        retweets_count = tweet['public_metrics']['retweet_count']
-        self.assertEqual(retweets_count, result)
-
-    @mock.patch('requests.get', side_effect=mocked_twitter_api)
-    def test_get_text(self, mock_get):
-        self.service.fetch_data()
-        tweet = self.service._tweets[0]
-        text = self.service._get_text(tweet)
-
-        result = tweet['text']
-        self.assertEqual(text, result)
-
-    @mock.patch('requests.get', side_effect=mocked_twitter_api)
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
     def test_get_tweets(self, mock_get):
         service = TwitterSearchAPIService(
             headers=self.headers,
@@ -134,6 +66,7 @@ class TestTwitterSearchAPIService(TestCase):
         service.fetch_data()
         res = service.get_tweets()
         self.assertEqual(len(res), 5)
+        self.assertTrue(all(isinstance(x, Tweet) for x in res))
 
 
 class TestTwitterUserAPIService(TestCase):
@@ -152,91 +85,261 @@ class TestTwitterUserAPIService(TestCase):
         self.assertEqual(self.service.screen_name, 'twitter')
         self.assertEqual(self.service.count, 10)
 
-    @mock.patch('requests.get', side_effect=mocked_twitter_api)
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
     def test_fetch_data(self, mock_get):
         self.service.fetch_data()
         self.assertTrue(len(self.service._tweets) > 0)
 
-    @mock.patch('requests.get', side_effect=mocked_twitter_api)
-    def test_get_account(self, mock_get):
-        self.service.fetch_data()
-        tweet = self.service._tweets[0]
-        account = self.service._get_account(tweet)
-        user = tweet['user']
-
-        self.assertEqual(account, {
-            'fullname': user['name'],
-            'href': f"/{user['screen_name']}",
-            'id': str(user['id'])
-        })
-
-    @mock.patch('requests.get', side_effect=mocked_twitter_api)
-    def test_get_date(self, mock_get):
-        self.service.fetch_data()
-        tweet = self.service._tweets[0]
-        result = self.service._get_date(tweet)
-
-        created_at = datetime.datetime.strptime(
-            tweet['created_at'], '%a %b %d %H:%M:%S +0000 %Y')
-        date = created_at.strftime('%-H:%M %p - %-d %b %Y')
-
-        self.assertEqual(date, result)
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_get_tweets(self, mock_get):
+        service = TwitterUserAPIService(
+            headers=self.headers,
+            screen_name='twitter',
+            count=5
+        )
+        service.fetch_data()
+        res = service.get_tweets()
+        self.assertEqual(len(res), 5)
 
-    @mock.patch('requests.get', side_effect=mocked_twitter_api)
-    def test_get_hashtags(self, mock_get):
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_replies_count_from_lookup(self, mock_get):
         self.service.fetch_data()
-        tweet = self.service._tweets[0]
-        hashtags = self.service._get_hashtags(tweet)
+        lookup = mocked_twitter_api(TwitterUserAPIService.LOOK_UP_API).json()
+        replies_count = {
+            x['id']: x['public_metrics']['reply_count']
+            for x in lookup['data']
+        }
 
-        result = []
-        for item in tweet['entities'].get('hashtags', []):
-            result.append(f"#{item['text']}")
+        for tweet in self.service.get_tweets():
+            self.assertEqual(tweet.replies, replies_count.get(tweet.id, 0))
 
-        self.assertEqual(hashtags, result)
 
-    @mock.patch('requests.get', side_effect=mocked_twitter_api)
-    def test_get_likes_count(self, mock_get):
-        self.service.fetch_data()
-        tweet = self.service._tweets[0]
-        likes_count = self.service._get_likes_count(tweet)
+class TestPagination(TestCase):
 
-        result = tweet['favorite_count']
-        self.assertEqual(likes_count, result)
+    def setUp(self):
+        self.headers = {'Authorization': f'Bearer {TWITTER_TOKEN}'}
 
-    @mock.patch('requests.get', side_effect=mocked_twitter_api)
-    def test_get_replies_count(self, mock_get):
-        self.service.fetch_data()
-        tweet = self.service._tweets[0]
-        replies_count = self.service._get_replies_count(tweet)
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_search_follows_next_token(self, mock_get):
+        service = TwitterSearchAPIService(
+            headers=self.headers,
+            hashtag='hashtag',
+            count=50
+        )
+        service.fetch_data()
 
-        result = tweet['replies_count']
-        self.assertEqual(replies_count, result)
+        # every mocked page holds 30 tweets
+        self.assertEqual(mock_get.call_count, 2)
+        first, second = [x[1]['params'] for x in mock_get.call_args_list]
+        self.assertNotIn('next_token', first)
+        self.assertIn('next_token', second)
+        self.assertEqual(second['max_results'], 20)
+        self.assertEqual(len(service.get_tweets()), 50)
 
-    @mock.patch('requests.get', side_effect=mocked_twitter_api)
-    def test_get_retweets_count(self, mock_get):
-        self.service.fetch_data()
-        tweet = self.service._tweets[0]
-        retweets_count = self.service._get_retweets_count(tweet)
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_search_page_size_is_capped(self, mock_get):
+        service = TwitterSearchAPIService(
+            headers=self.headers,
+            hashtag='hashtag',
+            count=500,
+            until_id='1310518300967829511'
+        )
+        service.fetch_data()
 
-        result = tweet['retweet_count']
-        self.assertEqual(retweets_count, result)
+        params = mock_get.call_args_list[0][1]['params']
+        self.assertEqual(params['max_results'], 100)
+        self.assertEqual(params['until_id'], '1310518300967829511')
 
-    @mock.patch('requests.get', side_effect=mocked_twitter_api)
-    def test_get_text(self, mock_get):
-        self.service.fetch_data()
-        tweet = self.service._tweets[0]
-        text = self.service._get_text(tweet)
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_timeline_follows_max_id(self, mock_get):
+        service = TwitterUserAPIService(
+            headers=self.headers,
+            screen_name='twitter',
+            count=40
+        )
+        service.fetch_data()
 
-        result = tweet['text']
-        self.assertEqual(text, result)
+        urls = [x[0][0] for x in mock_get.call_args_list]
+        self.assertEqual(urls.count(TwitterUserAPIService.USER_TIMELINE_API),
+                         2)
+        second = mock_get.call_args_list[1][1]['params']
+        self.assertEqual(second['max_id'], int(service._tweets[29].id) - 1)
+        self.assertEqual(len(service.get_tweets()), 40)
 
-    @mock.patch('requests.get', side_effect=mocked_twitter_api)
-    def test_get_tweets(self, mock_get):
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_lookup_is_chunked(self, mock_get):
         service = TwitterUserAPIService(
             headers=self.headers,
             screen_name='twitter',
-            count=5
+            count=150
         )
         service.fetch_data()
-        res = service.get_tweets()
-        self.assertEqual(len(res), 5)
+
+        lookups = [
+            x[1]['params'] for x in mock_get.call_args_list
+            if x[0][0] == TwitterUserAPIService.LOOK_UP_API
+        ]
+        self.assertEqual(len(lookups), 2)
+        self.assertEqual(len(lookups[0]['ids'].split(',')), 100)
+        self.assertEqual(len(lookups[1]['ids'].split(',')), 50)
+        self.assertEqual(len(service.get_tweets()), 150)
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_timeline_until_id(self, mock_get):
+        service = TwitterUserAPIService(
+            headers=self.headers,
+            screen_name='twitter',
+            count=10,
+            until_id='1308815533052133382'
+        )
+        service.fetch_data()
+
+        params = mock_get.call_args_list[0][1]['params']
+        self.assertEqual(params['max_id'], 1308815533052133381)
+
+
+class TestIncrementalRefresh(TestCase):
+
+    def setUp(self):
+        self.headers = {'Authorization': f'Bearer {TWITTER_TOKEN}'}
+
+    def fetch_timeline(self, count):
+        with mock.patch('requests.Session.get',
+                        side_effect=mocked_twitter_api_with_filters):
+            return TwitterServices.fetch_tweets(
+                TwitterServices.USER,
+                screen_name='twitter',
+                count=count,
+                headers=self.headers
+            )
+
+    @mock.patch('requests.Session.get',
+                side_effect=mocked_twitter_api_with_filters)
+    def test_only_newer_tweets_are_fetched(self, mock_get):
+        latest = self.fetch_timeline(20)
+        previous = self.fetch_timeline(25)[5:]
+
+        tweets = TwitterServices.fetch_newer_tweets(
+            TwitterServices.USER,
+            previous,
+            metrics_max_age=300,
+            screen_name='twitter',
+            count=20,
+            headers=self.headers
+        )
+
+        self.assertEqual(tweets, latest)
+        self.assertTrue(all(x is y for x, y in zip(tweets[5:], previous)))
+        # one timeline call and one lookup of the 5 newer tweets
+        self.assertEqual(mock_get.call_count, 2)
+        timeline, lookup = [x[1]['params'] for x in mock_get.call_args_list]
+        self.assertEqual(timeline['since_id'], previous[0].id)
+        self.assertEqual(lookup['ids'].split(','),
+                         [x.id for x in latest[:5]])
+
+    @mock.patch('requests.Session.get',
+                side_effect=mocked_twitter_api_with_filters)
+    def test_outdated_metrics_are_looked_up(self, mock_get):
+        previous = self.fetch_timeline(20)
+        for tweet in previous:
+            tweet.likes = -1
+            tweet.metrics_at -= 600
+
+        tweets = TwitterServices.fetch_newer_tweets(
+            TwitterServices.USER,
+            previous,
+            metrics_max_age=300,
+            screen_name='twitter',
+            count=20,
+            headers=self.headers
+        )
+
+        # nothing newer, the counts of every tweet are looked up once
+        self.assertEqual([x.id for x in tweets], [x.id for x in previous])
+        self.assertEqual(mock_get.call_count, 2)
+        lookup = mock_get.call_args_list[1][1]['params']
+        self.assertEqual(len(lookup['ids'].split(',')), 20)
+        self.assertIn('public_metrics', lookup['tweet.fields'])
+        self.assertTrue(all(x.likes >= 0 for x in tweets))
+        # the cached tweets are left untouched
+        self.assertTrue(all(x.likes == -1 for x in previous))
+
+    @mock.patch('requests.Session.get',
+                side_effect=mocked_twitter_api_with_filters)
+    def test_search_since_id(self, mock_get):
+        with mock.patch('requests.Session.get',
+                        side_effect=mocked_twitter_api_with_filters):
+            latest = TwitterServices.fetch_tweets(
+                TwitterServices.HASHTAG,
+                hashtag='python',
+                count=10,
+                headers=self.headers
+            )
+
+        tweets = TwitterServices.fetch_newer_tweets(
+            TwitterServices.HASHTAG,
+            latest[3:],
+            metrics_max_age=300,
+            hashtag='python',
+            count=10,
+            headers=self.headers
+        )
+
+        self.assertEqual(tweets, latest)
+        self.assertEqual(mock_get.call_count, 1)
+        params = mock_get.call_args[1]['params']
+        self.assertEqual(params['since_id'], latest[3].id)
+
+    @override_settings(TWEETS_CACHE={
+        'BACKEND': 'lru',
+        'TTL': {'users': 30},
+        'STALE_TTL': 60,
+        'INCREMENTAL': True,
+        'METRICS_MAX_AGE': 300,
+    })
+    @mock.patch('requests.Session.get',
+                side_effect=mocked_twitter_api_with_filters)
+    def test_stale_entry_is_refreshed_incrementally(self, mock_get):
+        params = dict(screen_name='twitter', count=10, headers=self.headers)
+        TwitterServices.get_page(TwitterServices.USER, **params)
+        cache = get_response_cache()
+        entry = cache.get_entry('users', 'twitter')
+        entry.fetched_at -= 40
+        mock_get.reset_mock()
+
+        with mock.patch('threading.Thread.start', lambda x: x.run()):
+            TwitterServices.get_page(TwitterServices.USER, **params)
+
+        # a single timeline call returning nothing newer, no lookup
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(mock_get.call_args[1]['params']['since_id'],
+                         entry.tweets[0].id)
+        self.assertEqual(cache.get_entry('users', 'twitter').tweets,
+                         entry.tweets)
+
+    @override_settings(TWEETS_CACHE={
+        'BACKEND': 'lru',
+        'TTL': {'users': 30},
+        'STALE_TTL': 60,
+        'INCREMENTAL': True,
+        'METRICS_MAX_AGE': 300,
+    })
+    @mock.patch('requests.Session.get',
+                side_effect=mocked_twitter_api_with_filters)
+    def test_refresh_with_a_larger_count_is_fetched_in_full(self, mock_get):
+        TwitterServices.get_page(
+            TwitterServices.USER, screen_name='twitter', count=10,
+            headers=self.headers
+        )
+        mock_get.reset_mock()
+
+        TwitterServices.refresh_page(
+            TwitterServices.USER, screen_name='twitter', count=20,
+            headers=self.headers
+        )
+
+        params = mock_get.call_args_list[0][1]['params']
+        self.assertNotIn('since_id', params)
+        entry = get_response_cache().get_entry('users', 'twitter')
+        self.assertEqual(len(entry.tweets), 20)
+        self.assertFalse(entry.exhausted)
@@ -0,0 +1,145 @@
+import asyncio
+import threading
+import time
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.test import TestCase, override_settings
+
+from tweets.cache import get_response_cache
+from tweets.services import TwitterServices
+from tweets.singleflight import (
+    AsyncSingleFlight,
+    CacheLock,
+    CallCancelled,
+    SingleFlight,
+    get_single_flight
+)
+from tweets.tests.utils import mocked_twitter_api
+
+
+class TestSingleFlight(TestCase):
+
+    def setUp(self):
+        self.flight = SingleFlight()
+
+    def run_concurrently(self, n, key, fn):
+        """Call the flight from n threads while fn blocks"""
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(self.flight.do(key, fn))
+            )
+            for _ in range(n)
+        ]
+        for thread in threads:
+            thread.start()
+        return threads, results
+
+    def test_concurrent_callers_share_one_call(self):
+        release = threading.Event()
+        calls = []
+
+        def fn():
+            calls.append(1)
+            release.wait(5)
+            return 'tweets'
+
+        threads, results = self.run_concurrently(5, 'python', fn)
+        # wait until every follower is blocked on the leader's call
+        while self.flight.stats()['coalesced'] < 4:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(calls, [1])
+        self.assertEqual(results, ['tweets'] * 5)
+        self.assertEqual(self.flight.stats()['leaders'], 1)
+        self.assertEqual(self.flight.stats()['coalesced'], 4)
+
+    def test_sequential_calls_are_not_coalesced(self):
+        self.assertEqual(self.flight.do('python', lambda: 1), 1)
+        self.assertEqual(self.flight.do('python', lambda: 2), 2)
+        self.assertEqual(self.flight.stats()['leaders'], 2)
+
+    def test_error_is_shared(self):
+        def fn():
+            raise ValueError('upstream error')
+
+        with self.assertRaises(ValueError):
+            self.flight.do('python', fn)
+        self.assertEqual(self.flight._calls, {})
+
+    def test_waits_for_leader_of_another_worker(self):
+        lock = CacheLock()
+        token = lock.acquire('python', 10)
+        flight = SingleFlight(lock=lock, poll_interval=0.01)
+        results = iter([None, 'tweets'])
+
+        res = flight.do('python', lambda: 'own', lambda: next(results))
+
+        self.assertEqual(res, 'tweets')
+        self.assertEqual(flight.stats()['remote_coalesced'], 1)
+        lock.release('python', token)
+
+    def test_falls_back_when_remote_leader_gives_up(self):
+        lock = CacheLock()
+        flight = SingleFlight(lock=lock, poll_interval=0.01)
+        token = lock.acquire('python', 10)
+
+        def shared_result():
+            lock.release('python', token)
+            return None
+
+        self.assertEqual(flight.do('python', lambda: 'own', shared_result),
+                         'own')
+
+    def test_leader_releases_the_lock(self):
+        lock = CacheLock()
+        flight = SingleFlight(lock=lock)
+        flight.do('python', lambda: 'own', lambda: None)
+        self.assertFalse(lock.locked('python'))
+
+
+class TestAsyncSingleFlight(TestCase):
+
+    def test_cancelled_leader_fails_the_followers(self):
+        flight = AsyncSingleFlight()
+
+        async def cancel_leader():
+            started = asyncio.Event()
+
+            async def fn():
+                started.set()
+                await asyncio.sleep(10)
+
+            leader = asyncio.ensure_future(flight.do('python', fn))
+            await started.wait()
+            follower = asyncio.ensure_future(flight.do('python', fn))
+            await asyncio.sleep(0)
+            leader.cancel()
+            with self.assertRaises(CallCancelled):
+                await asyncio.wait_for(follower, 1)
+            self.assertTrue(leader.cancelled())
+
+        async_to_sync(cancel_leader)()
+
+
+class TestSingleFlightServices(TestCase):
+
+    def setUp(self):
+        get_response_cache().clear()
+
+    @override_settings(TWEETS_SINGLE_FLIGHT={'LOCK_BACKEND': 'django'})
+    def test_lock_backend_from_settings(self):
+        self.assertIsInstance(get_single_flight().lock, CacheLock)
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_get_tweets_runs_through_single_flight(self, mock_get):
+        leaders = get_single_flight().stats()['leaders']
+        TwitterServices.get_tweets(
+            search_by=TwitterServices.HASHTAG,
+            hashtag='python',
+            count=10
+        )
+        self.assertEqual(get_single_flight().stats()['leaders'], leaders + 1)
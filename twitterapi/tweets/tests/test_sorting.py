@@ -0,0 +1,121 @@
+import datetime
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.test import TestCase, override_settings
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from tweets.cache import get_response_cache
+from tweets.entities import top_tweets
+from tweets.services import TwitterServices
+from tweets.tests.utils import make_tweets, mocked_twitter_api
+
+
+class TestTopTweets(TestCase):
+
+    def setUp(self):
+        self.tweets = make_tweets(5)
+        for tweet, likes in zip(self.tweets, [3, 9, 0, 9, 4]):
+            tweet.likes = likes
+
+    def test_highest_first(self):
+        self.assertEqual(
+            [x.id for x in top_tweets(self.tweets, 'likes', 3)],
+            ['1', '3', '4']
+        )
+
+    def test_recent(self):
+        self.tweets[2].created_at += datetime.timedelta(seconds=1)
+        self.assertEqual(
+            [x.id for x in top_tweets(self.tweets, 'recent', 2)],
+            ['2', '0']
+        )
+
+    def test_fewer_tweets_than_k(self):
+        self.assertEqual(len(top_tweets(self.tweets, 'replies', 10)), 5)
+
+
+@override_settings(TWEETS_SORT_WINDOW=60)
+class TestSortedServices(TestCase):
+
+    def setUp(self):
+        get_response_cache().clear()
+
+    def test_window(self):
+        self.assertEqual(TwitterServices.get_window(5), 5)
+        self.assertEqual(TwitterServices.get_window(5, 'recent'), 5)
+        self.assertEqual(TwitterServices.get_window(5, 'likes'), 60)
+        self.assertEqual(TwitterServices.get_window(100, 'likes'), 100)
+        with override_settings(TWEETS_MAX_LIMIT=40):
+            self.assertEqual(TwitterServices.get_window(5, 'likes'), 40)
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_ranked_page(self, mock_get):
+        tweets, cursor = TwitterServices.get_page(
+            TwitterServices.HASHTAG, hashtag='python', count=3,
+            sort='retweets'
+        )
+
+        # the window is fetched through two upstream pages of 30 tweets
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual([x.retweets for x in tweets], [137, 137, 100])
+        self.assertIsNone(cursor)
+
+        # the cached window serves the plain requests too
+        tweets, cursor = TwitterServices.get_page(
+            TwitterServices.HASHTAG, hashtag='python', count=60
+        )
+        self.assertEqual(len(tweets), 60)
+        self.assertEqual(mock_get.call_count, 2)
+
+    @mock.patch(
+        'httpx.AsyncClient.get',
+        new_callable=mock.AsyncMock,
+        side_effect=mocked_twitter_api
+    )
+    def test_aget_ranked_page(self, mock_get):
+        tweets, cursor = async_to_sync(TwitterServices.aget_page)(
+            TwitterServices.HASHTAG, hashtag='python', count=3,
+            sort='retweets'
+        )
+
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual([x.retweets for x in tweets], [137, 137, 100])
+        self.assertIsNone(cursor)
+
+
+@override_settings(TWEETS_SORT_WINDOW=30)
+class TestSortedApi(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        get_response_cache().clear()
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_sort_by_likes(self, mock_get):
+        res = self.client.get('/users/twitter?sort=likes&limit=3')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([x['likes'] for x in res.json()], [1992, 1190, 360])
+        self.assertNotIn('Link', res)
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_streamed_sort(self, mock_get):
+        res = self.client.get(
+            '/hashtags/python?sort=retweets&limit=2',
+            HTTP_ACCEPT='application/x-ndjson'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        lines = b''.join(res.streaming_content).splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn(b'"retweets":137', lines[0].replace(b' ', b''))
+
+    def test_invalid_sort(self):
+        res = self.client.get('/hashtags/python?sort=date')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get('/users/twitter?sort=likes&cursor=123')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('cursor', res.json())
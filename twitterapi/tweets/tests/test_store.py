@@ -0,0 +1,180 @@
+import time
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.test import TestCase, override_settings
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from tweets.cache import get_response_cache
+from tweets.entities import Account, normalize
+from tweets.models import StoredAccount, StoredHashtag, StoredTweet
+from tweets.queries import TweetQuery
+from tweets.services import TwitterServices
+from tweets.store import (
+    TWITTER_EPOCH,
+    TweetStore,
+    get_tweet_store,
+    is_historical
+)
+from tweets.tests.test_ratelimit import RATE_LIMIT, mocked_rate_limited_api
+from tweets.tests.utils import load_mocked_data, mocked_twitter_api
+
+STORE = {'ENABLED': True, 'DATABASE': 'default', 'BATCH_SIZE': 500}
+
+
+def load_search_tweets():
+    data = load_mocked_data('twitter_search_api_mocked_data.json')
+    users = {
+        x['id']: Account.from_v2(x) for x in data['includes']['users']
+    }
+    return [normalize(x, users, fetched_at=100) for x in data['data']]
+
+
+class TestTweetStore(TestCase):
+
+    def setUp(self):
+        self.store = TweetStore()
+        self.tweets = load_search_tweets()
+
+    def test_hashtag_page(self):
+        self.store.save(self.tweets)
+        python = [x for x in self.tweets
+                  if 'python' in {y.lower() for y in x.hashtags}]
+
+        tweets, cursor = self.store.get_hashtag_page('PYTHON', 5)
+        self.assertEqual(tweets, python[:5])
+        self.assertEqual(cursor, python[4].id)
+
+        tweets, cursor = self.store.get_hashtag_page('python', 30, cursor)
+        self.assertEqual(tweets, python[5:])
+        self.assertIsNone(cursor)
+
+    def test_user_page(self):
+        self.store.save(self.tweets)
+        account = self.tweets[0].account
+        mine = [x for x in self.tweets if x.account.id == account.id]
+
+        tweets, cursor = self.store.get_user_page(
+            account.username.upper(), 30
+        )
+        self.assertEqual(tweets, mine)
+        self.assertIsNone(cursor)
+        # the tweets of one author share the account
+        self.assertEqual(len({id(x.account) for x in tweets}), 1)
+
+    def test_bulk_upserts(self):
+        # one select and one insert of each table
+        with self.assertNumQueries(7):
+            self.store.save(self.tweets)
+        self.assertEqual(StoredTweet.objects.count(), 30)
+
+        newer, older = self.tweets[0], self.tweets[1]
+        newer.likes, newer.metrics_at = 42, 200
+        older.likes, older.metrics_at = 42, 50
+        self.store.save(self.tweets)
+
+        self.assertEqual(StoredTweet.objects.count(), 30)
+        self.assertEqual(StoredTweet.objects.get(id=newer.id).likes, 42)
+        self.assertNotEqual(StoredTweet.objects.get(id=older.id).likes, 42)
+
+    def test_renamed_account(self):
+        self.store.save(self.tweets[:1])
+        account = self.tweets[0].account
+        tweet = self.tweets[0]
+        tweet.account = Account(account.id, 'Renamed', 'renamed')
+        self.store.save([tweet])
+
+        stored = StoredAccount.objects.get(id=account.id)
+        self.assertEqual(stored.username, 'renamed')
+        self.assertEqual(stored.screen_name, 'renamed')
+
+    def test_partial_tweets_are_left_out(self):
+        self.tweets[0].account = None
+        self.store.save(self.tweets[:1])
+        self.assertFalse(StoredTweet.objects.exists())
+
+    def test_is_historical(self):
+        self.assertTrue(is_historical(self.tweets[0].id))
+        now_id = (int(time.time() * 1000) - TWITTER_EPOCH) << 22
+        self.assertFalse(is_historical(str(now_id)))
+
+
+class TestStoredServices(TestCase):
+
+    def setUp(self):
+        get_response_cache().clear()
+        for setting in (override_settings(TWEETS_STORE=STORE),
+                        override_settings(TWEETS_RATE_LIMIT=RATE_LIMIT)):
+            setting.enable()
+            self.addCleanup(setting.disable)
+
+    def test_store_is_optional(self):
+        with override_settings(TWEETS_STORE=dict(STORE, ENABLED=False)):
+            self.assertIsNone(get_tweet_store())
+        with override_settings(TWEETS_STORE=dict(STORE, DATABASE='none')):
+            self.assertIsNone(get_tweet_store())
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_fetched_tweets_are_stored(self, mock_get):
+        TwitterServices.get_page(
+            TwitterServices.HASHTAG, hashtag='python', count=30
+        )
+        TwitterServices.get_page(
+            TwitterServices.USER, screen_name='twitter', count=30
+        )
+
+        self.assertEqual(StoredTweet.objects.count(), 60)
+        self.assertTrue(StoredHashtag.objects.filter(tag='python').exists())
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_filtered_tweets_are_not_stored(self, mock_get):
+        TwitterServices.get_page(
+            TwitterServices.HASHTAG, hashtag='python', count=30,
+            query=TweetQuery(['python'], lang='en')
+        )
+
+        self.assertTrue(mock_get.called)
+        self.assertEqual(StoredTweet.objects.count(), 0)
+
+    @mock.patch(
+        'httpx.AsyncClient.get',
+        new_callable=mock.AsyncMock,
+        side_effect=mocked_twitter_api
+    )
+    def test_async_fetched_tweets_are_stored(self, mock_get):
+        async_to_sync(TwitterServices.aget_page)(
+            TwitterServices.USER, screen_name='twitter', count=30
+        )
+
+        tweets, _ = get_tweet_store().get_user_page('twitter', 30)
+        self.assertEqual(len(tweets), 30)
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_historical_pages_are_answered_locally(self, mock_get):
+        tweets = load_search_tweets()
+        get_tweet_store().save(tweets)
+
+        # the fixture is older than the 7 days of the recent search
+        page, cursor = TwitterServices.get_page(
+            TwitterServices.HASHTAG, hashtag='bigdata', count=3,
+            cursor=tweets[0].id
+        )
+
+        mock_get.assert_not_called()
+        self.assertEqual(len(page), 3)
+        self.assertTrue(all(int(x.id) < int(tweets[0].id) for x in page))
+        self.assertEqual(cursor, page[-1].id)
+
+    @mock.patch('requests.Session.get', side_effect=mocked_rate_limited_api)
+    def test_rate_limited_pages_are_answered_locally(self, mock_get):
+        get_tweet_store().save(load_search_tweets())
+
+        with self.assertLogs(level='WARNING'):
+            res = APIClient().get('/hashtags/python', {'limit': 5})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 5)
+
+        with self.assertLogs(level='WARNING'):
+            res = APIClient().get('/hashtags/unknown')
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
@@ -0,0 +1,128 @@
+import json
+from unittest import mock
+from django.test import TestCase
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from tweets.cache import get_response_cache
+from tweets.renderers import iter_json_array, iter_ndjson
+from tweets.services import TwitterServices
+from tweets.tests.utils import (
+    mocked_twitter_api,
+    mocked_twitter_api_without_results
+)
+
+
+class TestStreamEncoders(TestCase):
+
+    def test_json_array(self):
+        items = [{'text': 'é'}, {'likes': 1}]
+        content = b''.join(iter_json_array(iter(items)))
+        self.assertEqual(json.loads(content), items)
+
+    def test_empty_json_array(self):
+        self.assertEqual(b''.join(iter_json_array(iter(()))), b'[]')
+
+    def test_ndjson(self):
+        items = [{'text': 'a'}, {'likes': 1}]
+        content = b''.join(iter_ndjson(iter(items)))
+        self.assertEqual(
+            [json.loads(x) for x in content.splitlines()],
+            items
+        )
+
+    def test_small_items_are_chunked(self):
+        chunks = list(iter_ndjson({'id': x} for x in range(1000)))
+        self.assertTrue(1 < len(chunks) < 1000)
+
+
+class TestServicesIterTweets(TestCase):
+
+    def setUp(self):
+        get_response_cache().clear()
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_iter_tweets_by_hashtag_pages(self, mock_get):
+        tweets = TwitterServices.iter_tweets(
+            search_by=TwitterServices.HASHTAG,
+            hashtag='python',
+            count=50
+        )
+        # nothing is fetched until the iterator is consumed
+        self.assertEqual(mock_get.call_count, 0)
+        self.assertEqual(len(list(tweets)), 50)
+        self.assertEqual(mock_get.call_count, 2)
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_iter_tweets_by_user_pages(self, mock_get):
+        tweets = list(TwitterServices.iter_tweets(
+            search_by=TwitterServices.USER,
+            screen_name='twitter',
+            count=40
+        ))
+        self.assertEqual(len(tweets), 40)
+        # two timeline pages, each of them followed by its lookup
+        self.assertEqual(mock_get.call_count, 4)
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_iter_tweets_from_cache(self, mock_get):
+        TwitterServices.get_tweets(
+            search_by=TwitterServices.HASHTAG,
+            hashtag='python',
+            count=30
+        )
+        tweets = list(TwitterServices.iter_tweets(
+            search_by=TwitterServices.HASHTAG,
+            hashtag='python',
+            count=20
+        ))
+        self.assertEqual(len(tweets), 20)
+        self.assertEqual(mock_get.call_count, 1)
+
+
+class TestStreamingApi(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        get_response_cache().clear()
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_stream_json_array(self, mock_get):
+        res = self.client.get('/hashtags/python', {'limit': 45, 'stream': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res['Content-Type'], 'application/json')
+        self.assertEqual(len(json.loads(b''.join(res.streaming_content))), 45)
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_stream_ndjson(self, mock_get):
+        res = self.client.get(
+            '/users/twitter',
+            {'limit': 12},
+            HTTP_ACCEPT='application/x-ndjson'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(res.streaming_content).splitlines()
+        self.assertEqual(len(lines), 12)
+        self.assertIn('account', json.loads(lines[0]))
+
+    @mock.patch(
+        'requests.Session.get',
+        side_effect=mocked_twitter_api_without_results
+    )
+    def test_stream_without_results(self, mock_get):
+        res = self.client.get('/hashtags/python', {'stream': 'true'})
+        self.assertEqual(json.loads(b''.join(res.streaming_content)), [])
+
+    @mock.patch('requests.Session.get', side_effect=Exception('error'))
+    def test_stream_upstream_error(self, mock_get):
+        with self.assertLogs(level='ERROR'):
+            res = self.client.get('/hashtags/python', {'stream': 'true'})
+        self.assertEqual(
+            res.status_code,
+            status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
@@ -0,0 +1,213 @@
+import time
+from unittest import mock
+from django.test import TestCase, override_settings
+
+from tweets import http
+from tweets.exceptions import RateLimitExceeded
+from tweets.ratelimit import LocalBackend, RateLimiter
+from tweets.services import TwitterSearchAPIService, TwitterUserAPIService
+from tweets.tokens import TokenPool, get_token_pool
+from tweets.tests.utils import MockResponse, mocked_twitter_api
+
+SEARCH_API = TwitterSearchAPIService.RECENT_SEARCH_API
+TIMELINE_API = TwitterUserAPIService.USER_TIMELINE_API
+
+# v1.1 answers to a bad token and to a protected user
+INVALID_TOKEN = {
+    'errors': [{'code': 89, 'message': 'Invalid or expired token.'}]
+}
+NOT_AUTHORIZED = {'request': '/1.1/statuses/user_timeline.json',
+                  'error': 'Not authorized.'}
+
+
+def budget_headers(remaining, reset_in=900):
+    return {
+        'x-rate-limit-remaining': str(remaining),
+        'x-rate-limit-reset': str(int(time.time()) + reset_in),
+    }
+
+
+class TestTokenPool(TestCase):
+
+    def setUp(self):
+        self.limiter = RateLimiter(LocalBackend())
+        self.pool = TokenPool(['a', 'b', 'c'], self.limiter)
+        self.a, self.b, self.c = self.pool.tokens
+
+    def set_budget(self, token, remaining, reset_in=900):
+        self.limiter.backend.set(
+            self.pool.get_key('search', token),
+            remaining,
+            time.time() + reset_in
+        )
+
+    def test_token_headers(self):
+        self.assertEqual(self.a.headers, {'Authorization': 'Bearer a'})
+        self.assertNotIn('a', repr(self.a))
+
+    def test_pick_largest_budget(self):
+        self.set_budget(self.a, 5)
+        self.set_budget(self.b, 50)
+        self.set_budget(self.c, 10)
+        self.assertIs(self.pool.pick('search'), self.b)
+        self.assertIs(self.pool.pick('search', exclude={'token1'}), self.c)
+
+    def test_unused_token_is_picked_first(self):
+        self.set_budget(self.a, 50)
+        self.set_budget(self.b, 50)
+        self.assertIs(self.pool.pick('search'), self.c)
+
+    def test_budgets_are_per_endpoint(self):
+        self.set_budget(self.a, 0)
+        self.assertIs(self.pool.pick('timeline'), self.a)
+
+    def test_remaining_over_tokens(self):
+        self.set_budget(self.a, 5)
+        self.set_budget(self.b, 50)
+        self.assertIsNone(self.pool.remaining('search'))
+
+        self.set_budget(self.c, 10)
+        self.c.cooldown_until = time.time() + 60
+        self.assertEqual(self.pool.remaining('search'), 55)
+
+    def test_exhausted_pool_picks_first_reset(self):
+        self.set_budget(self.a, 0, reset_in=600)
+        self.set_budget(self.b, 0, reset_in=60)
+        self.set_budget(self.c, 0, reset_in=300)
+        self.assertIs(self.pool.pick('search'), self.b)
+
+    def test_unauthorized_token_is_cooled_down(self):
+        self.assertTrue(self.pool.record('search', self.a, MockResponse(
+            INVALID_TOKEN, 401
+        )))
+        self.assertNotEqual(self.pool.pick('search'), self.a)
+        self.assertEqual(self.pool.stats()['token0']['unauthorized'], 1)
+
+    def test_v2_unauthorized_token_is_cooled_down(self):
+        self.assertTrue(self.pool.record(SEARCH_API, self.a, MockResponse(
+            {'title': 'Unauthorized', 'status': 401}, 401
+        )))
+        self.assertEqual(self.pool.stats()['token0']['unauthorized'], 1)
+
+    def test_unauthorized_resource_is_not_retried(self):
+        for status in (401, 403):
+            self.assertFalse(self.pool.record(
+                TIMELINE_API, self.a, MockResponse(NOT_AUTHORIZED, status)
+            ))
+        self.assertIs(self.pool.pick('search'), self.a)
+        self.assertEqual(self.pool.stats()['token0']['unauthorized'], 0)
+
+    def test_rate_limited_token_keeps_the_other_endpoints(self):
+        self.set_budget(self.a, 0, reset_in=120)
+        self.assertTrue(
+            self.pool.record('search', self.a, MockResponse({}, 429))
+        )
+
+        self.assertEqual(self.pool.stats()['token0']['cooldown'], 0)
+        self.assertIsNot(self.pool.pick('search'), self.a)
+        self.assertIs(self.pool.pick('timeline'), self.a)
+
+    def test_every_token_cooling_down(self):
+        for token in self.pool.tokens:
+            self.pool.record(
+                'search', token, MockResponse(INVALID_TOKEN, 401)
+            )
+        with self.assertRaises(RateLimitExceeded):
+            self.pool.pick('search')
+
+    def test_other_errors_are_not_retried(self):
+        self.assertFalse(self.pool.record('search', self.a, MockResponse(
+            {}, 500
+        )))
+        self.assertIs(self.pool.pick('search'), self.a)
+        self.assertEqual(self.pool.stats()['token0']['errors'], 1)
+
+
+class TestTokenPoolRequests(TestCase):
+
+    def setUp(self):
+        # every test gets a pool and a limiter of its own
+        tokens = override_settings(
+            TWITTER_TOKENS=['a', 'b'],
+            TWEETS_RATE_LIMIT={'BACKEND': 'local'}
+        )
+        tokens.enable()
+        self.addCleanup(tokens.disable)
+
+    @staticmethod
+    def authorization(mock_get):
+        return [x[1]['headers']['Authorization'] for x in
+                mock_get.call_args_list]
+
+    @mock.patch('requests.Session.get')
+    def test_requests_follow_the_budgets(self, mock_get):
+        mock_get.side_effect = [
+            MockResponse({}, 200, headers=budget_headers(10)),
+            MockResponse({}, 200, headers=budget_headers(100)),
+            MockResponse({}, 200, headers=budget_headers(99)),
+        ]
+        for _ in range(3):
+            http.get(SEARCH_API)
+
+        self.assertEqual(
+            self.authorization(mock_get),
+            ['Bearer a', 'Bearer b', 'Bearer b']
+        )
+        self.assertEqual(get_token_pool().stats()['token1']['requests'], 2)
+
+    @mock.patch('requests.Session.get')
+    def test_rate_limited_request_is_sent_with_another_token(self, mock_get):
+        mock_get.side_effect = [
+            MockResponse({}, 429, headers=budget_headers(0)),
+            mocked_twitter_api(SEARCH_API),
+        ]
+        res = http.get(SEARCH_API)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(
+            self.authorization(mock_get),
+            ['Bearer a', 'Bearer b']
+        )
+
+    @mock.patch('requests.Session.get')
+    def test_every_token_rate_limited(self, mock_get):
+        mock_get.return_value = \
+            MockResponse({}, 429, headers=budget_headers(0))
+        with self.assertRaises(RateLimitExceeded):
+            http.get(SEARCH_API)
+        self.assertEqual(mock_get.call_count, 2)
+
+    @mock.patch('requests.Session.get')
+    def test_unauthorized_request_is_sent_with_another_token(self, mock_get):
+        mock_get.side_effect = [
+            MockResponse({}, 401),
+            mocked_twitter_api(SEARCH_API),
+            mocked_twitter_api(SEARCH_API),
+        ]
+        http.get(SEARCH_API)
+        http.get(SEARCH_API)
+
+        self.assertEqual(
+            self.authorization(mock_get),
+            ['Bearer a', 'Bearer b', 'Bearer b']
+        )
+
+    @mock.patch('requests.Session.get')
+    def test_protected_user_keeps_the_tokens(self, mock_get):
+        mock_get.side_effect = [
+            MockResponse(NOT_AUTHORIZED, 401),
+            mocked_twitter_api(SEARCH_API),
+        ]
+        self.assertEqual(http.get(TIMELINE_API).status_code, 401)
+        self.assertEqual(http.get(SEARCH_API).status_code, 200)
+
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(
+            [x['cooldown'] for x in get_token_pool().stats().values()],
+            [0, 0]
+        )
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_own_credentials_are_kept(self, mock_get):
+        http.get(SEARCH_API, headers={'Authorization': 'Bearer own'})
+        self.assertEqual(self.authorization(mock_get), ['Bearer own'])
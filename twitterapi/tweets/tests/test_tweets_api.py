@@ -1,9 +1,11 @@
 from unittest import mock
+from django.conf import settings
 from django.test import TestCase
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from tweets.cache import get_response_cache
 from tweets.tests.utils import (
     mocked_twitter_api,
     mocked_twitter_api_without_results
@@ -23,8 +25,9 @@ class PublicTweetsApiTest(TestCase):
 
     def setUp(self):
         self.client = APIClient()
+        get_response_cache().clear()
 
-    @mock.patch('requests.get', side_effect=mocked_twitter_api)
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
     def test_retrieve_tweets_by_hashtag(self, mock_get):
         """Test retrieving a list of tweets by hashtag"""
         hashtag = 'python'
@@ -56,7 +59,7 @@ class PublicTweetsApiTest(TestCase):
         self.assertIn('text', tweet)
         self.assertTrue(isinstance(tweet['text'], str))
 
-    @mock.patch('requests.get', side_effect=mocked_twitter_api)
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
     def test_retrieve_given_number_of_tweets_by_hashtag(self, mock_get):
         hashtag = 'python'
         url = tweets_by_hashtag_url(hashtag)
@@ -66,6 +69,24 @@ class PublicTweetsApiTest(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(len(res.data), 12)
 
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_retrieve_next_page_of_tweets_by_hashtag(self, mock_get):
+        url = tweets_by_hashtag_url('python')
+        res = self.client.get(url, data={'limit': 12})
+
+        self.assertIn('rel="next"', res['Link'])
+        cursor = res['Link'].split('cursor=')[1].split('>')[0]
+
+        res = self.client.get(url, data={'limit': 12, 'cursor': cursor})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        params = mock_get.call_args[1]['params']
+        self.assertEqual(params['until_id'], cursor)
+
+    def test_retrieve_tweets_with_invalid_cursor(self):
+        url = tweets_by_hashtag_url('python')
+        res = self.client.get(url, data={'cursor': 'abc'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_retrieve_tweets_with_empty_hashtag(self):
         """Test retrieving tweets with empty hashtag"""
         hashtag = ''
@@ -75,7 +96,7 @@ class PublicTweetsApiTest(TestCase):
         self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
 
     @mock.patch(
-        'requests.get',
+        'requests.Session.get',
         side_effect=mocked_twitter_api_without_results
     )
     def test_retrieve_tweets_with_not_found_hashtag(self, mock_get):
@@ -98,11 +119,11 @@ class PublicTweetsApiTest(TestCase):
         res = self.client.get(url, data=payload)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
-        payload = {'limit': 101}
+        payload = {'limit': settings.TWEETS_MAX_LIMIT + 1}
         res = self.client.get(url, data=payload)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
-    @mock.patch('requests.get', side_effect=mocked_twitter_api)
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
     def test_retrieve_tweets_by_user(self, mock_get):
         """Test retrieving a list of tweets by user"""
         screen_name = 'twitter'
@@ -134,7 +155,7 @@ class PublicTweetsApiTest(TestCase):
         self.assertIn('text', tweet)
         self.assertTrue(isinstance(tweet['text'], str))
 
-    @mock.patch('requests.get', side_effect=mocked_twitter_api)
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
     def test_retrieve_given_number_of_tweets_by_user(self, mock_get):
         screen_name = 'twitter'
         url = tweets_by_user_url(screen_name)
@@ -145,7 +166,7 @@ class PublicTweetsApiTest(TestCase):
         self.assertEqual(len(res.data), 12)
 
     @mock.patch(
-        'requests.get',
+        'requests.Session.get',
         side_effect=mocked_twitter_api_without_results
     )
     def test_retrieve_tweets_with_user_not_exists(self, mock_get):
@@ -169,7 +190,7 @@ class PublicTweetsApiTest(TestCase):
         res = self.client.get(url, data=payload)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
-        payload = {'limit': 101}
+        payload = {'limit': settings.TWEETS_MAX_LIMIT + 1}
         res = self.client.get(url, data=payload)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
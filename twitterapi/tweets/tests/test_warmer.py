@@ -0,0 +1,161 @@
+import time
+from unittest import mock
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from tweets.cache import get_response_cache
+from tweets.hotkeys import HotKeyTracker, LocalBackend, get_hot_key_tracker
+from tweets.services import TwitterSearchAPIService
+from tweets.tokens import get_token_pool
+from tweets.warmer import Warmer, get_warmer
+from tweets.tests.utils import mocked_twitter_api
+
+WARM = {
+    'BACKEND': 'local',
+    'FLUSH_INTERVAL': 0,
+    'TOP': 2,
+    'INTERVAL': 5,
+    'RESERVE': 10,
+}
+CACHE = {
+    'BACKEND': 'lru',
+    'TTL': {'hashtags': 30, 'users': 30},
+}
+
+
+class TestHotKeyTracker(TestCase):
+
+    def setUp(self):
+        self.tracker = HotKeyTracker(LocalBackend(), flush_interval=0)
+
+    def test_top_keys(self):
+        for count in (10, 50, 20):
+            self.tracker.record('hashtags', 'Python', count)
+        self.tracker.record('users', 'twitter', 10)
+        self.tracker.record('hashtags', 'django', 10)
+        self.tracker.record('hashtags', 'django', 10)
+
+        self.assertEqual(self.tracker.top(2), [
+            ('hashtags', 'python', 50),
+            ('hashtags', 'django', 10),
+        ])
+
+    def test_hits_are_buffered(self):
+        tracker = HotKeyTracker(LocalBackend(), flush_interval=60)
+        tracker.record('hashtags', 'python', 10)
+        self.assertEqual(tracker.top(5), [])
+
+        tracker.flush()
+        self.assertEqual(tracker.top(5), [('hashtags', 'python', 10)])
+
+    def test_previous_window_is_counted(self):
+        self.tracker.record('hashtags', 'python', 10)
+        window = self.tracker._get_window()
+        with mock.patch.object(self.tracker, '_get_window',
+                               return_value=window + 1):
+            self.tracker.record('hashtags', 'django', 10)
+            self.assertEqual(len(self.tracker.top(5)), 2)
+        with mock.patch.object(self.tracker, '_get_window',
+                               return_value=window + 2):
+            self.assertEqual(self.tracker.top(5),
+                             [('hashtags', 'django', 10)])
+
+    @override_settings(TWEETS_WARM={'BACKEND': None})
+    def test_tracking_is_off_by_default(self):
+        self.assertIsNone(get_hot_key_tracker())
+        self.assertIsNone(get_warmer())
+
+
+class TestWarmer(TestCase):
+
+    def setUp(self):
+        # fresh tracker, cache and rate limit budgets for every test
+        overridden = override_settings(
+            TWEETS_WARM=WARM,
+            TWEETS_CACHE=CACHE,
+            TWEETS_RATE_LIMIT={'BACKEND': 'local'}
+        )
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+        self.tracker = get_hot_key_tracker()
+        self.warmer = get_warmer()
+
+    def record(self, endpoint, key, count, hits=1):
+        for _ in range(hits):
+            self.tracker.record(endpoint, key, count)
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_warms_hot_keys(self, mock_get):
+        self.record('hashtags', 'Python', 12, hits=3)
+        self.record('users', 'twitter', 5, hits=2)
+        self.record('hashtags', 'cold', 10)
+
+        self.assertEqual(self.warmer.warm(), 2)
+        cache = get_response_cache()
+        self.assertEqual(cache.get_entry('hashtags', 'python').count, 20)
+        self.assertIsNotNone(cache.get_entry('users', 'twitter'))
+        self.assertIsNone(cache.get_entry('hashtags', 'cold'))
+
+        # the warmed entries are fresh until the next run
+        calls = mock_get.call_count
+        self.assertEqual(self.warmer.warm(), 0)
+        self.assertEqual(mock_get.call_count, calls)
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_expiring_entries_are_warmed(self, mock_get):
+        self.record('hashtags', 'python', 10)
+        self.warmer.warm()
+        entry = get_response_cache().get_entry('hashtags', 'python')
+        entry.fetched_at -= 26
+
+        self.assertEqual(self.warmer.warm(), 1)
+        self.assertEqual(mock_get.call_count, 2)
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_reserve_is_left_to_requests(self, mock_get):
+        pool = get_token_pool()
+        for token in pool.tokens:
+            pool.limiter.backend.set(
+                pool.get_key(TwitterSearchAPIService.RECENT_SEARCH_API,
+                             token),
+                10,
+                time.time() + 900
+            )
+        self.record('hashtags', 'python', 10)
+        self.record('users', 'twitter', 10)
+
+        self.assertEqual(self.warmer.warm(), 1)
+        self.assertIsNone(get_response_cache().get_entry('hashtags', 'python'))
+
+    def test_run_iterations(self):
+        warmer = Warmer(self.tracker, interval=0)
+        with mock.patch.object(warmer, 'warm', return_value=0) as warm:
+            warmer.run(iterations=3)
+        self.assertEqual(warm.call_count, 3)
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_views_track_first_pages(self, mock_get):
+        client = APIClient()
+        client.get('/hashtags/Python?limit=12')
+        client.get('/hashtags/python?limit=12&cursor=1310517764143165440')
+        client.get('/users/twitter')
+
+        self.assertEqual(self.tracker.top(5), [
+            ('hashtags', 'python', 12),
+            ('users', 'twitter', 30),
+        ])
+
+    @mock.patch('requests.Session.get', side_effect=mocked_twitter_api)
+    def test_command(self, mock_get):
+        self.record('hashtags', 'python', 10)
+        call_command('warm_tweets', iterations=1, stdout=mock.Mock())
+        self.assertIsNotNone(
+            get_response_cache().get_entry('hashtags', 'python')
+        )
+
+    @override_settings(TWEETS_WARM={'BACKEND': None})
+    def test_command_requires_tracking(self):
+        with self.assertRaises(CommandError):
+            call_command('warm_tweets', iterations=1)
@@ -1,7 +1,9 @@
+import datetime
 import os
 import json
 import pathlib
 
+from tweets.entities import Account, Tweet
 from tweets.services import (
     TwitterSearchAPIService,
     TwitterUserAPIService
@@ -9,14 +11,19 @@ from tweets.services import (
 
 
 class MockResponse:
-    """Mock return value of requests.get"""
-    def __init__(self, json_data, status_code):
+    """Mock return value of requests.Session.get"""
+    def __init__(self, json_data, status_code, headers=None):
         self.json_data = json_data
         self.status_code = status_code
+        self.headers = headers or {}
 
     def json(self):
         return self.json_data
 
+    @property
+    def content(self):
+        return json.dumps(self.json_data).encode('utf-8')
+
     @property
     def ok(self):
         return True
@@ -60,6 +67,33 @@ def mocked_twitter_api(*args, **kwargs):
     return MockResponse(None, 404)
 
 
+def mocked_twitter_api_with_filters(*args, **kwargs):
+    """Same as mocked_twitter_api() honoring since_id, max_id and ids
+
+    The search api returns one page only, without next_token.
+    """
+    res = mocked_twitter_api(*args, **kwargs)
+    params = kwargs.get('params') or {}
+    data = res.json_data
+    tweets = data if isinstance(data, list) else data['data']
+
+    if 'since_id' in params:
+        tweets = [x for x in tweets if int(x['id']) > int(params['since_id'])]
+    if 'max_id' in params:
+        tweets = [x for x in tweets if int(x['id']) <= params['max_id']]
+    if 'ids' in params:
+        ids = params['ids'].split(',')
+        tweets = [x for x in tweets if x['id'] in ids]
+
+    if isinstance(data, list):
+        res.json_data = tweets
+    else:
+        res.json_data = dict(data, data=tweets)
+        if 'meta' in data:
+            res.json_data['meta'] = dict(data['meta'], next_token=None)
+    return res
+
+
 def mocked_twitter_api_without_results(*args, **kwargs):
     """simulate twitter search api return """
     # twitter v2 search api returns results below while there's no result found
@@ -83,3 +117,22 @@ def mocked_twitter_api_without_results(*args, **kwargs):
         return MockResponse(return_value, 404)
 
     return MockResponse(None, 404)
+
+
+def load_mocked_data(filename):
+    """Return the parsed content of one of the mocked_data files"""
+    filepath = pathlib.Path().absolute().joinpath(
+        'tweets', 'tests', 'mocked_data', filename
+    )
+    with open(filepath, 'r') as f:
+        return json.loads(f.read())
+
+
+def make_tweets(count):
+    """Build count tweets of one account with the ids '0', '1'..."""
+    account = Account('1', 'Twitter', 'twitter')
+    created_at = datetime.datetime(2020, 9, 23, 17, 8, 34)
+    return [
+        Tweet(str(x), account, created_at, text=f'tweet {x}')
+        for x in range(count)
+    ]
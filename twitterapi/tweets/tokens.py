@@ -0,0 +1,190 @@
+import threading
+import time
+
+from django.conf import settings
+
+from tweets import codec
+from tweets.backends import configured_by
+from tweets.exceptions import RateLimitExceeded
+from tweets.ratelimit import get_rate_limiter
+
+
+class Token:
+    """Bearer token of the pool along with its usage counters
+
+       The token is only ever referred to by its name in the rate limit
+       keys, the logs and the metrics.
+    """
+    __slots__ = (
+        'name', 'value', 'cooldown_until',
+        'requests', 'errors', 'rate_limited', 'unauthorized'
+    )
+
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+        self.cooldown_until = 0
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.unauthorized = 0
+
+    def __repr__(self):
+        return f'<Token {self.name}>'
+
+    @property
+    def headers(self):
+        return {'Authorization': f'Bearer {self.value}'}
+
+
+class TokenPool:
+    """Bearer tokens the requests to the Twitter APIs are spread over
+
+       Each request is sent with the token that has the most requests
+       left in the rate limit budget of its endpoint, so that adding a
+       token adds its whole budget to the deployment. Tokens whose
+       credentials are rejected are left out for AUTH_COOLDOWN seconds.
+       A 429 only exhausts the budget of its endpoint, which the rate
+       limiter keeps, the token still serves the other endpoints.
+    """
+
+    AUTH_ERRORS = (401, 403)
+    # codes of the v1.1 errors rejecting the credentials, the other 401
+    # and 403 are about the resource, e.g. a protected or suspended user
+    AUTH_ERROR_CODES = (32, 89, 99, 215)
+    # the v2 api only answers 401 to the credentials of the app
+    APP_API = 'https://api.twitter.com/2/'
+
+    def __init__(self, tokens, limiter, auth_cooldown=3600):
+        self.tokens = [Token(f'token{i}', x) for i, x in enumerate(tokens)]
+        self.limiter = limiter
+        self.auth_cooldown = auth_cooldown
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.tokens)
+
+    @staticmethod
+    def get_key(endpoint, token):
+        """Key of the rate limit budget of token for endpoint"""
+        return f'{endpoint}#{token.name}'
+
+    def pick(self, endpoint, exclude=()):
+        """Return the token with the largest budget left for endpoint
+
+        When every budget is exhausted the token reset first is picked,
+        the rate limiter then decides whether to wait for it or not.
+
+        :param exclude: names of the tokens already tried
+        :raise RateLimitExceeded: when every token is cooling down
+        """
+        now = time.time()
+        best = None
+        best_score = None
+        for token in self.tokens:
+            if token.cooldown_until > now or token.name in exclude:
+                continue
+
+            budget = self.limiter.get_budget(self.get_key(endpoint, token))
+            if budget is None or budget[1] <= now:
+                # nothing used yet in the current window
+                score = (True, float('inf'), 0)
+            else:
+                remaining, reset = budget
+                score = (remaining > self.limiter.reserve, remaining, -reset)
+
+            if best_score is None or score > best_score:
+                best, best_score = token, score
+
+        if best is None:
+            retry_after = min(x.cooldown_until for x in self.tokens) - now
+            raise RateLimitExceeded(endpoint, max(1, retry_after))
+        return best
+
+    def remaining(self, endpoint):
+        """Return the requests left for endpoint over the usable tokens
+
+        :return: None when a budget is unknown, i.e. the token has not
+                 been used for endpoint in the current window
+        """
+        now = time.time()
+        total = 0
+        for token in self.tokens:
+            if token.cooldown_until > now:
+                continue
+
+            budget = self.limiter.get_budget(self.get_key(endpoint, token))
+            if budget is None or budget[1] <= now:
+                return None
+            total += max(0, budget[0] - self.limiter.reserve)
+        return total
+
+    def is_auth_error(self, endpoint, res):
+        """Whether res rejects the credentials of the token"""
+        if res.status_code not in self.AUTH_ERRORS:
+            return False
+        if res.status_code == 401 and endpoint.startswith(self.APP_API):
+            return True
+
+        try:
+            data = codec.loads(res.content)
+        except (TypeError, ValueError):
+            return False
+        errors = data.get('errors') if isinstance(data, dict) else None
+        return any(
+            isinstance(x, dict) and x.get('code') in self.AUTH_ERROR_CODES
+            for x in errors or ()
+        )
+
+    def record(self, endpoint, token, res):
+        """Count the response of a request sent with token
+
+        Called once the rate limiter has read the headers of res, the
+        budget of a rate limited token for endpoint is then exhausted
+        until its reset.
+
+        :return: whether the request is worth sending again with another
+                 token
+        """
+        auth_error = self.is_auth_error(endpoint, res)
+        with self._lock:
+            token.requests += 1
+            if res.status_code < 400:
+                return False
+
+            token.errors += 1
+            if auth_error:
+                token.unauthorized += 1
+                token.cooldown_until = time.time() + self.auth_cooldown
+            elif res.status_code == 429:
+                token.rate_limited += 1
+            else:
+                return False
+
+        return len(self.tokens) > 1
+
+    def stats(self):
+        """Return the usage counters of every token by name"""
+        now = time.time()
+        with self._lock:
+            return {
+                x.name: {
+                    'requests': x.requests,
+                    'errors': x.errors,
+                    'rate_limited': x.rate_limited,
+                    'unauthorized': x.unauthorized,
+                    'cooldown': max(0, x.cooldown_until - now),
+                }
+                for x in self.tokens
+            }
+
+
+@configured_by('TWITTER_TOKENS', 'TWEETS_TOKEN_POOL', 'TWEETS_RATE_LIMIT')
+def get_token_pool():
+    """Return the pool of the tokens of settings.TWITTER_TOKENS"""
+    conf = settings.TWEETS_TOKEN_POOL
+    return TokenPool(
+        settings.TWITTER_TOKENS,
+        get_rate_limiter(),
+        auth_cooldown=conf.get('AUTH_COOLDOWN', 3600)
+    )
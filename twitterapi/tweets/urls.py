@@ -1,10 +1,21 @@
+from django.conf import settings
 from django.urls import path
 
 from tweets import views
 
 app_name = 'tweets'
 
-urlpatterns = [
-    path('hashtags/<slug:hashtag>', views.TweetsByHashtagApiView.as_view()),
-    path('users/<slug:screen_name>', views.TweetsByUserApiView.as_view())
-]
+if settings.TWEETS_ASYNC_VIEWS:
+    urlpatterns = [
+        path('hashtags/<slug:hashtag>', views.tweets_by_hashtag_async),
+        path('users/<slug:screen_name>', views.tweets_by_user_async),
+        path('batch', views.batch_async)
+    ]
+else:
+    urlpatterns = [
+        path('hashtags/<slug:hashtag>',
+             views.TweetsByHashtagApiView.as_view()),
+        path('users/<slug:screen_name>',
+             views.TweetsByUserApiView.as_view()),
+        path('batch', views.BatchApiView.as_view())
+    ]
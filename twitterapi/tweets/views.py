@@ -1,19 +1,202 @@
+import calendar
+import itertools
 import logging
+import math
+from asgiref.sync import sync_to_async
+from django.http import (
+    HttpResponseNotAllowed,
+    JsonResponse,
+    StreamingHttpResponse
+)
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from rest_framework import status
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
+from tweets import batch
+from tweets.codec import loads
+from tweets.entities import fingerprint, to_dicts
+from tweets.exceptions import RateLimitExceeded
+from tweets.queries import TweetQuery
+from tweets.renderers import NDJSONRenderer, iter_json_array, iter_ndjson
 from tweets.services import TwitterServices
-from tweets.serializers import TweetSerializer
+from tweets.serializers import (
+    BatchItemSerializer,
+    HashtagSerializer,
+    TweetSerializer
+)
+from tweets.warmer import track_request
 
 
-class TweetsByHashtagApiView(APIView):
+# body of the responses sent while twitter's rate limit is exhausted
+RATE_LIMITED_ERROR = {
+    'Too many requests': ['Rate limit of the Twitter API exceeded.']
+}
+# hide the actual error message, the format is the same as the django's
+# default format
+INTERNAL_ERROR = {'Internal server error': ['Unknown error occurred.']}
+
+
+def get_next_link(request, cursor):
+    """Build the Link header pointing to the next page"""
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    url = request.build_absolute_uri(request.path)
+    return f'<{url}?{params.urlencode()}>; rel="next"'
+
+
+def get_validators(max_age, tweets, cursor, format, fields=None):
+    """Build the ETag, Last-Modified and Cache-Control headers of a page
+
+    The ETag only covers what the response shows, the page is compared
+    with the client's copy without rendering it.
+
+    :param max_age: seconds the page is cached for, see
+                    TwitterServices.get_max_age()
+    :param fields: fields of the tweets selected by the request
+    """
+    more = '+' if cursor else ''
+    if fields is not None:
+        format = f'{format}.{".".join(fields)}'
+    headers = {
+        'ETag': f'"{format}-{len(tweets)}{more}-{fingerprint(tweets):08x}"'
+    }
+    if tweets:
+        created_at = max(x.created_at for x in tweets)
+        headers['Last-Modified'] = \
+            http_date(calendar.timegm(created_at.utctimetuple()))
+
+    # the page may change once the cached entry expires
+    headers['Cache-Control'] = \
+        f'max-age={max_age}' if max_age is not None else 'no-cache'
+    return headers
+
+
+def not_modified(request, validators):
+    """Return a 304 when the If-None-Match header matches the page
+
+    Last-Modified is only the date of the newest tweet, the counts of
+    the tweets may have changed since, so If-Modified-Since is ignored.
+    """
+    return get_conditional_response(request, etag=validators['ETag'])
+
+
+def get_params(search_by, data, kwargs):
+    """Build the params of TwitterServices out of the request
+
+    :param data: validated query params
+    :param kwargs: url kwargs
+    """
+    params = dict(
+        search_by=search_by,
+        count=data.get('limit', 30),
+        cursor=data.get('cursor'),
+        sort=data.get('sort'),
+        **kwargs
+    )
+    if search_by == TwitterServices.HASHTAG:
+        query = TweetQuery.from_params(kwargs['hashtag'], data)
+        if query is not None:
+            params['query'] = query
+    return params
+
+
+def is_tracked(params):
+    """Whether the warmer counts the request"""
+    # only the first pages of the plain hashtags and users are warmed
+    return not params['cursor'] and 'query' not in params
+
+
+def get_tracked_count(params):
+    """Count of the tweets the warmer keeps cached for the request"""
+    return TwitterServices.get_window(params['count'], params['sort'])
+
+
+def get_retry_after(error):
+    """Value of the Retry-After header for a RateLimitExceeded error"""
+    return str(math.ceil(error.retry_after))
+
+
+def format_batch_result(result):
+    """Build an item of the batch response out of a batch.Result"""
+    data = {
+        'index': result.index,
+        'type': result.item['type'],
+        'key': result.item['key'],
+    }
+    error = result.error
+    if error is None:
+        data['status'] = status.HTTP_200_OK
+        data['tweets'] = to_dicts(result.tweets, result.item.get('fields'))
+        data['cursor'] = result.cursor
+    elif isinstance(error, RateLimitExceeded):
+        logging.warning(f'Failed to fetch the batch item {data}: {error}')
+        data['status'] = status.HTTP_429_TOO_MANY_REQUESTS
+        data['error'] = RATE_LIMITED_ERROR
+        data['retry_after'] = math.ceil(error.retry_after)
+    else:
+        logging.error(
+            f'Failed to fetch the batch item {data}: {error}',
+            exc_info=error
+        )
+        data['status'] = status.HTTP_500_INTERNAL_SERVER_ERROR
+        data['error'] = INTERNAL_ERROR
+    return data
+
+
+def _log_stream_errors(tweets):
+    """Log the errors raised once the response has started streaming"""
+    try:
+        yield from tweets
+    except Exception as e:
+        # the status code is already sent, the truncated body is the
+        # only way left to tell the client that the stream failed
+        logging.exception(f'Failed to stream the tweets: {e}')
+
+
+class TweetsApiView(APIView):
+    """Base view of the tweets APIs
+
+       The url kwargs are passed to the service selected by search_by,
+       the link to the next page is sent in the Link header. The tweets
+       are streamed when asked with stream=true or when the client
+       accepts application/x-ndjson.
+    """
 
     serializer_class = TweetSerializer
+    renderer_classes = \
+        list(api_settings.DEFAULT_RENDERER_CLASSES) + [NDJSONRenderer]
+    search_by = None
+
+    def stream(self, request, tweets, fields=None):
+        """Build a streaming response out of an iterator of tweets"""
+        tweets = (x.to_dict(fields) for x in tweets)
 
-    def get(self, request, hashtag):
-        '''Retrieving a list of tweets by hashtag'''
-        serializer = self.serializer_class(data=request.query_params)
+        # fetch the first page before answering so that upstream errors
+        # still turn into an error response
+        first = next(tweets, None)
+        if first is not None:
+            tweets = itertools.chain([first], _log_stream_errors(tweets))
+        else:
+            tweets = iter(())
+
+        if request.accepted_renderer.format == NDJSONRenderer.format:
+            return StreamingHttpResponse(
+                iter_ndjson(tweets),
+                content_type=NDJSONRenderer.media_type
+            )
+        return StreamingHttpResponse(
+            iter_json_array(tweets),
+            content_type='application/json'
+        )
+
+    def get(self, request, **kwargs):
+        serializer = self.serializer_class(
+            data=request.query_params,
+            context=kwargs
+        )
 
         # validate the query params
         if not serializer.is_valid():
@@ -22,62 +205,235 @@ class TweetsByHashtagApiView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        fields = serializer.validated_data.get('fields')
+
         # fetch the data via twitter api
         try:
-            count = serializer.validated_data.get('limit', 30)
-            tweets = TwitterServices.get_tweets(
-                search_by=TwitterServices.HASHTAG,
-                hashtag=hashtag,
-                count=count
+            params = get_params(
+                self.search_by,
+                serializer.validated_data,
+                kwargs
             )
-            return Response(tweets)
+            if is_tracked(params):
+                track_request(
+                    self.search_by,
+                    get_tracked_count(params),
+                    kwargs
+                )
+            if serializer.validated_data['stream'] or \
+                    request.accepted_renderer.format == NDJSONRenderer.format:
+                return self.stream(
+                    request,
+                    TwitterServices.iter_tweets(fields=fields, **params),
+                    fields
+                )
+
+            tweets, cursor = TwitterServices.get_page(**params)
+            max_age = TwitterServices.get_max_age(**params)
+        except RateLimitExceeded as e:
+            # nothing was cached for the request, the client is told
+            # when to retry instead of getting an internal error
+            logging.warning(f'Failed to run TwitterServices.get_page: {e}')
+            response = Response(
+                RATE_LIMITED_ERROR,
+                status=status.HTTP_429_TOO_MANY_REQUESTS
+            )
+            response['Retry-After'] = get_retry_after(e)
+            return response
         except Exception as e:
             # logging unexpected errors for debugging
             logging.exception(
-                f'Failed to run TwitterServices.get_tweets_by_hashtag: {e}'
+                f'Failed to run TwitterServices.get_page: {e}'
             )
             # hide the actual error message and return
             # internal server error ensure the error response's
             # format as same as the django's default format
             return Response(
-                {'Internal server error': ['Unknown error occurred.']},
+                INTERNAL_ERROR,
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+        validators = get_validators(
+            max_age,
+            tweets,
+            cursor,
+            request.accepted_renderer.format,
+            fields
+        )
+        response = not_modified(request, validators)
+        if response is None:
+            response = Response(to_dicts(tweets, fields))
+        for header, value in validators.items():
+            response[header] = value
+        if cursor:
+            response['Link'] = get_next_link(request, cursor)
+        return response
 
-class TweetsByUserApiView(APIView):
 
-    serializer_class = TweetSerializer
+class TweetsByHashtagApiView(TweetsApiView):
+    '''Retrieving a list of tweets by hashtag, more hashtags and filters
+    are given in the query params'''
 
-    def get(self, request, screen_name):
-        '''Retrieving a list of tweets by user'''
-        serializer = self.serializer_class(data=request.query_params)
+    serializer_class = HashtagSerializer
+    search_by = TwitterServices.HASHTAG
 
-        # validate the query params
+
+class TweetsByUserApiView(TweetsApiView):
+    '''Retrieving a list of tweets by user'''
+
+    search_by = TwitterServices.USER
+
+
+class BatchApiView(APIView):
+    """Retrieving the tweets of several hashtags and users at once
+
+       The body is a list of {"type": "hashtag" or "user", "key", "limit",
+       "cursor"}, the items are fetched concurrently and each result
+       tells the index of its item, its status and either its tweets or
+       its error. The results are streamed as they are fetched when asked
+       with stream=true or when the client accepts application/x-ndjson.
+    """
+
+    renderer_classes = TweetsApiView.renderer_classes
+
+    def post(self, request):
+        serializer = BatchItemSerializer(
+            data=request.data,
+            many=True,
+            allow_empty=False
+        )
+
+        # validate the items
         if not serializer.is_valid():
             return Response(
                 serializer.errors,
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # fetch the data via twitter api
-        try:
-            count = serializer.validated_data.get('limit', 30)
-            tweets = TwitterServices.get_tweets(
-                search_by=TwitterServices.USER,
-                screen_name=screen_name,
-                count=count
+        items = serializer.validated_data
+        if request.query_params.get('stream') in ('true', 'True', '1') or \
+                request.accepted_renderer.format == NDJSONRenderer.format:
+            results = map(format_batch_result, batch.iter_results(items))
+            return StreamingHttpResponse(
+                # every result is sent as soon as it is fetched
+                iter_ndjson(_log_stream_errors(results), chunk_size=0),
+                content_type=NDJSONRenderer.media_type
             )
-            return Response(tweets)
-        except Exception as e:
-            # logging unexpected errors for debugging
-            logging.exception(
-                f'Failed to run TwitterServices.get_tweets_by_user: {e}'
-            )
-            # hide the actual error message and return
-            # internal server error ensure the error response's
-            # format as same as the django's default format
-            return Response(
-                {'Internal server error': ['Unknown error occurred.']},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+
+        return Response([
+            format_batch_result(x) for x in batch.get_results(items)
+        ])
+
+
+async def _aget_tweets(request, search_by, serializer_class, **kwargs):
+    """Shared body of the async views, mirrors the APIView responses
+
+    Streaming is left to the WSGI views, django iterates the content of
+    streaming responses synchronously under ASGI which would block the
+    event loop on every upstream page.
+    """
+    # django's method decorators do not support coroutines yet
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+
+    serializer = serializer_class(data=request.GET, context=kwargs)
+
+    # validate the query params
+    if not serializer.is_valid():
+        return JsonResponse(
+            serializer.errors,
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    # fetch the data via twitter api
+    try:
+        params = get_params(search_by, serializer.validated_data, kwargs)
+        if is_tracked(params):
+            await sync_to_async(track_request)(
+                search_by, get_tracked_count(params), kwargs
             )
+        tweets, cursor = await TwitterServices.aget_page(**params)
+        max_age = await sync_to_async(TwitterServices.get_max_age)(**params)
+    except RateLimitExceeded as e:
+        logging.warning(f'Failed to run TwitterServices.aget_page: {e}')
+        response = JsonResponse(
+            RATE_LIMITED_ERROR,
+            status=status.HTTP_429_TOO_MANY_REQUESTS
+        )
+        response['Retry-After'] = get_retry_after(e)
+        return response
+    except Exception as e:
+        # logging unexpected errors for debugging
+        logging.exception(
+            f'Failed to run TwitterServices.aget_page: {e}'
+        )
+        return JsonResponse(
+            INTERNAL_ERROR,
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+    fields = serializer.validated_data.get('fields')
+    validators = get_validators(max_age, tweets, cursor, 'json', fields)
+    response = not_modified(request, validators)
+    if response is None:
+        response = JsonResponse(to_dicts(tweets, fields), safe=False)
+    for header, value in validators.items():
+        response[header] = value
+    if cursor:
+        response['Link'] = get_next_link(request, cursor)
+    return response
+
+
+async def tweets_by_hashtag_async(request, hashtag):
+    '''Retrieving a list of tweets by hashtag under ASGI'''
+    return await _aget_tweets(
+        request,
+        TwitterServices.HASHTAG,
+        HashtagSerializer,
+        hashtag=hashtag
+    )
+
+
+async def tweets_by_user_async(request, screen_name):
+    '''Retrieving a list of tweets by user under ASGI'''
+    return await _aget_tweets(
+        request,
+        TwitterServices.USER,
+        TweetSerializer,
+        screen_name=screen_name
+    )
+
+
+async def batch_async(request):
+    '''Retrieving the tweets of several hashtags and users under ASGI
+
+    The results are sent at once, in the order of the items.
+    '''
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+
+    try:
+        data = loads(request.body)
+    except ValueError:
+        return JsonResponse(
+            {'detail': 'JSON parse error'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    serializer = BatchItemSerializer(data=data, many=True, allow_empty=False)
+
+    # validate the items
+    if not serializer.is_valid():
+        return JsonResponse(
+            serializer.errors,
+            status=status.HTTP_400_BAD_REQUEST,
+            safe=False
+        )
+
+    results = await batch.aget_results(serializer.validated_data)
+    return JsonResponse(list(map(format_batch_result, results)), safe=False)
+
+
+# the function views are left out of the CSRF checks like the APIViews,
+# csrf_exempt() would hide that the view is a coroutine function
+batch_async.csrf_exempt = True
@@ -0,0 +1,131 @@
+import logging
+import time
+
+from django.conf import settings
+
+from tweets.cache import get_response_cache
+from tweets.exceptions import RateLimitExceeded
+from tweets.hotkeys import get_hot_key_tracker
+from tweets.services import (
+    TwitterSearchAPIService,
+    TwitterServices,
+    TwitterUserAPIService
+)
+from tweets.tokens import get_token_pool
+
+
+# service and upstream url of the endpoints tracked by the views
+SERVICES = {
+    'hashtags': (TwitterServices.HASHTAG,
+                 TwitterSearchAPIService.RECENT_SEARCH_API),
+    'users': (TwitterServices.USER,
+              TwitterUserAPIService.USER_TIMELINE_API),
+}
+
+
+def track_request(search_by, count, kwargs):
+    """Count a request of the first page of a key for the warmer"""
+    tracker = get_hot_key_tracker()
+    if tracker is not None:
+        endpoint, key_name = TwitterServices.ENDPOINTS[search_by]
+        tracker.record(endpoint, kwargs[key_name], count)
+
+
+class Warmer:
+    """Keep the cached tweets of the hot keys fresh
+
+       Every INTERVAL seconds the TOP most requested keys whose cached
+       entry would expire before the next run are fetched again, so that
+       the requests of the hot keys never wait on Twitter. An endpoint is
+       left alone for the run once its rate limit budget is down to
+       RESERVE requests, which are kept for the cold keys.
+    """
+
+    def __init__(self, tracker, top=20, interval=5, reserve=30):
+        self.tracker = tracker
+        self.top = top
+        self.interval = interval
+        self.reserve = reserve
+
+    def is_fresh(self, endpoint, key, count):
+        """Whether the entry of key still covers count at the next run"""
+        cache = get_response_cache()
+        entry = cache.get_entry(endpoint, key)
+        return entry is not None and entry.covers(count) and \
+            entry.age + self.interval < cache.get_ttl(endpoint)
+
+    def has_budget(self, url):
+        remaining = get_token_pool().remaining(url)
+        return remaining is None or remaining > self.reserve
+
+    def warm(self):
+        """Refresh the hot entries about to expire
+
+        :return: the number of refreshed entries
+        """
+        cache = get_response_cache()
+        limited = set()
+        refreshed = 0
+        for endpoint, key, count in self.tracker.top(self.top):
+            if endpoint not in SERVICES or endpoint in limited or \
+                    cache.get_ttl(endpoint) <= 0 or \
+                    self.is_fresh(endpoint, key, count):
+                continue
+
+            search_by, url = SERVICES[endpoint]
+            key_name = TwitterServices.ENDPOINTS[search_by][1]
+            # the hashtags ingested from the stream never hit the cache
+            if TwitterServices.get_buffered_page(
+                    search_by, count, {key_name: key}) is not None:
+                continue
+            if not self.has_budget(url):
+                limited.add(endpoint)
+                continue
+
+            try:
+                TwitterServices.refresh_page(
+                    search_by,
+                    count=count,
+                    **{key_name: key}
+                )
+            except RateLimitExceeded as e:
+                logging.warning(f'Failed to warm {endpoint}:{key}: {e}')
+                limited.add(endpoint)
+            except Exception as e:
+                logging.exception(f'Failed to warm {endpoint}:{key}: {e}')
+            else:
+                refreshed += 1
+        return refreshed
+
+    def run(self, iterations=None):
+        """Warm the cache every interval, forever by default"""
+        done = 0
+        while iterations is None or done < iterations:
+            started_at = time.monotonic()
+            refreshed = self.warm()
+            logging.info(f'Warmed {refreshed} hot keys')
+            done += 1
+            if iterations is None or done < iterations:
+                time.sleep(max(
+                    0, self.interval - (time.monotonic() - started_at)
+                ))
+
+
+def get_warmer(**kwargs):
+    """Return a warmer configured by settings.TWEETS_WARM
+
+    :param kwargs: overrides of the settings
+    :return: None when the requests are not tracked
+    """
+    tracker = get_hot_key_tracker()
+    if tracker is None:
+        return None
+
+    conf = settings.TWEETS_WARM
+    options = {
+        'top': conf.get('TOP', 20),
+        'interval': conf.get('INTERVAL', 5),
+        'reserve': conf.get('RESERVE', 30),
+    }
+    options.update({k: v for k, v in kwargs.items() if v is not None})
+    return Warmer(tracker, **options)
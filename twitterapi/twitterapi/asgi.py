@@ -12,5 +12,13 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'twitterapi.settings')
+# serve the tweets endpoints with the async views and services
+os.environ.setdefault('TWEETS_ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
+
+# the live endpoints stream server-sent events, which the views of
+# django 3.1 can't do without blocking the event loop
+from tweets.live import LiveApplication  # noqa: E402
+
+application = LiveApplication(application)
@@ -26,10 +26,22 @@ SECRET_KEY = 'on5q#fjpo!u+pgfk8slb622_25u$53w*-rq+fu7)t2p0wcasi6'
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = os.getenv('DEBUG', False) == 'True'
 
+# Settings profile, "full" runs the default django stack while "api" only
+# loads what the stateless tweets endpoints need: no admin, auth,
+# sessions, messages, CSRF, templates or database, see the end of the file
+SETTINGS_PROFILE = os.getenv('DJANGO_SETTINGS_PROFILE', 'full')
+
 if not DEBUG:
     REST_FRAMEWORK = {
         'DEFAULT_RENDERER_CLASSES': (
-            'rest_framework.renderers.JSONRenderer',
+            'tweets.renderers.FastJSONRenderer',
+        )
+    }
+else:
+    REST_FRAMEWORK = {
+        'DEFAULT_RENDERER_CLASSES': (
+            'tweets.renderers.FastJSONRenderer',
+            'rest_framework.renderers.BrowsableAPIRenderer',
         )
     }
 
@@ -78,6 +90,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'twitterapi.wsgi.application'
 
+# serve the tweets endpoints with the async views, enabled by asgi.py
+TWEETS_ASYNC_VIEWS = os.getenv('TWEETS_ASYNC_VIEWS', False) == 'True'
+
 
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
@@ -128,4 +143,195 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, "static")
 
+# Lean profile of the tweets API, every request skips the unused
+# middlewares and every worker the import of the unused apps
+if SETTINGS_PROFILE == 'api':
+    INSTALLED_APPS = ['tweets']
+    MIDDLEWARE = ['django.middleware.security.SecurityMiddleware']
+    TEMPLATES = []
+    DATABASES = {}
+    USE_I18N = False
+    # the requests are neither authenticated nor throttled, which also
+    # keeps django.contrib.auth from being imported
+    REST_FRAMEWORK = {
+        'DEFAULT_RENDERER_CLASSES': (
+            'tweets.renderers.FastJSONRenderer',
+        ),
+        'DEFAULT_PARSER_CLASSES': (
+            'rest_framework.parsers.JSONParser',
+        ),
+        'DEFAULT_AUTHENTICATION_CLASSES': [],
+        'DEFAULT_PERMISSION_CLASSES': [],
+        'DEFAULT_THROTTLE_CLASSES': [],
+        'UNAUTHENTICATED_USER': None,
+    }
+
 TWITTER_TOKEN = os.getenv('TWITTER_TOKEN')
+
+# Bearer tokens the requests to Twitter are spread over, comma separated,
+# TWITTER_TOKEN alone is used when TWITTER_TOKENS is not set
+TWITTER_TOKENS = [
+    x.strip() for x in os.getenv('TWITTER_TOKENS', '').split(',') if x.strip()
+] or [TWITTER_TOKEN]
+
+# AUTH_COOLDOWN is the number of seconds a token whose credentials are
+# rejected is left out of the pool
+TWEETS_TOKEN_POOL = {
+    'AUTH_COOLDOWN': int(os.getenv('TWEETS_TOKEN_AUTH_COOLDOWN', 3600)),
+}
+
+# Max number of tweets returned by one request of the tweets APIs,
+# more than 100 tweets are fetched through several upstream pages
+TWEETS_MAX_LIMIT = int(os.getenv('TWEETS_MAX_LIMIT', 3200))
+
+# Max number of tweets scanned upstream by one search with filters that
+# are evaluated over the tweets, e.g. min_likes
+TWEETS_MAX_SCANNED = int(os.getenv('TWEETS_MAX_SCANNED', 1000))
+
+# Number of the newest tweets ranked by the requests sorted by a count,
+# e.g. sort=likes, the window is fetched and cached like a page
+TWEETS_SORT_WINDOW = int(os.getenv('TWEETS_SORT_WINDOW', 300))
+
+# Connection pool shared by every Twitter API service
+# POOL_MAXSIZE is the number of keep-alive connections kept per host
+TWITTER_HTTP = {
+    'POOL_CONNECTIONS': int(os.getenv('TWITTER_HTTP_POOL_CONNECTIONS', 4)),
+    'POOL_MAXSIZE': int(os.getenv('TWITTER_HTTP_POOL_MAXSIZE', 32)),
+    'CONNECT_TIMEOUT': float(os.getenv('TWITTER_HTTP_CONNECT_TIMEOUT', 3.05)),
+    'READ_TIMEOUT': float(os.getenv('TWITTER_HTTP_READ_TIMEOUT', 10)),
+    'MAX_RETRIES': int(os.getenv('TWITTER_HTTP_MAX_RETRIES', 2)),
+    'BACKOFF_FACTOR': float(os.getenv('TWITTER_HTTP_BACKOFF_FACTOR', 0.3)),
+    # upper bound of concurrent upstream requests of the async client
+    'ASYNC_MAX_CONNECTIONS': int(
+        os.getenv('TWITTER_HTTP_ASYNC_MAX_CONNECTIONS', 500)
+    ),
+}
+
+# Cache of the tweets returned by the hashtag and user endpoints
+# BACKEND is one of lru, django, redis or a dotted path to a backend class
+# entries older than TTL are served for STALE_TTL more seconds while
+# they are refreshed in the background. With INCREMENTAL the refresh only
+# fetches the tweets newer than the cached ones and looks up the counts
+# of the cached tweets older than METRICS_MAX_AGE seconds
+TWEETS_CACHE = {
+    'BACKEND': os.getenv('TWEETS_CACHE_BACKEND', 'lru'),
+    'OPTIONS': {
+        'max_entries': int(os.getenv('TWEETS_CACHE_MAX_ENTRIES', 1024)),
+    },
+    'TTL': {
+        'hashtags': int(os.getenv('TWEETS_CACHE_HASHTAGS_TTL', 30)),
+        'users': int(os.getenv('TWEETS_CACHE_USERS_TTL', 60)),
+    },
+    'STALE_TTL': int(os.getenv('TWEETS_CACHE_STALE_TTL', 300)),
+    'INCREMENTAL': os.getenv('TWEETS_CACHE_INCREMENTAL', '') == 'true',
+    'METRICS_MAX_AGE': int(os.getenv('TWEETS_CACHE_METRICS_MAX_AGE', 300)),
+}
+
+# Concurrent requests of the same key share one upstream call, set
+# LOCK_BACKEND to django to share the call across the workers as well,
+# which requires a CACHES backend shared by the workers
+TWEETS_SINGLE_FLIGHT = {
+    'LOCK_BACKEND': os.getenv('TWEETS_SINGLE_FLIGHT_LOCK') or None,
+    'LOCK_TIMEOUT': int(os.getenv('TWEETS_SINGLE_FLIGHT_LOCK_TIMEOUT', 10)),
+}
+
+# Rate limit budgets of the Twitter API endpoints, read from the
+# x-rate-limit headers. Requests fail with a 429 once a budget is down to
+# RESERVE requests, unless it is reset within MAX_WAIT seconds. BACKEND
+# is local, django (shared by the workers through CACHES) or a dotted path
+TWEETS_RATE_LIMIT = {
+    'BACKEND': os.getenv('TWEETS_RATE_LIMIT_BACKEND', 'local'),
+    'RESERVE': int(os.getenv('TWEETS_RATE_LIMIT_RESERVE', 0)),
+    'MAX_WAIT': float(os.getenv('TWEETS_RATE_LIMIT_MAX_WAIT', 0)),
+}
+
+# The views count the requests of each hashtag and user, manage.py
+# warm_tweets then keeps the cached tweets of the TOP most requested ones
+# fresh every INTERVAL seconds, leaving RESERVE requests of each rate
+# limit budget to the other keys. BACKEND is local, django (shared by the
+# workers through CACHES) or a dotted path, tracking is off when unset.
+# The warmed tweets only reach the workers through a shared TWEETS_CACHE
+TWEETS_WARM = {
+    'BACKEND': os.getenv('TWEETS_WARM_BACKEND') or None,
+    'WINDOW': int(os.getenv('TWEETS_WARM_WINDOW', 300)),
+    'FLUSH_INTERVAL': float(os.getenv('TWEETS_WARM_FLUSH_INTERVAL', 5)),
+    'TOP': int(os.getenv('TWEETS_WARM_TOP', 20)),
+    'INTERVAL': float(os.getenv('TWEETS_WARM_INTERVAL', 5)),
+    'RESERVE': int(os.getenv('TWEETS_WARM_RESERVE', 30)),
+}
+
+# Items accepted by one request of the batch api and upstream fetches
+# run concurrently for it (per worker). With PACK_HASHTAGS the hashtags
+# of a batch are searched together with OR queries
+TWEETS_BATCH = {
+    'MAX_ITEMS': int(os.getenv('TWEETS_BATCH_MAX_ITEMS', 50)),
+    'MAX_CONCURRENCY': int(os.getenv('TWEETS_BATCH_MAX_CONCURRENCY', 8)),
+    'PACK_HASHTAGS': os.getenv('TWEETS_BATCH_PACK_HASHTAGS', 'true') == 'true',
+}
+
+# Tweets fetched upstream are upserted into DATABASE, the pages of the
+# hashtags older than the 7 days of the recent search and the pages that
+# hit an exhausted rate limit are then answered out of it. Needs the
+# tweets migrations, the "api" profile has no database to store into
+TWEETS_STORE = {
+    'ENABLED': os.getenv('TWEETS_STORE_ENABLED', '') == 'true',
+    'DATABASE': os.getenv('TWEETS_STORE_DATABASE', 'default'),
+    'BATCH_SIZE': int(os.getenv('TWEETS_STORE_BATCH_SIZE', 500)),
+}
+
+# Counts of the tweets by id shared by the hashtag and user services, the
+# user timeline only looks up the replies of the tweets missing from it
+# or fetched more than TTL seconds ago. BACKEND is local, django (shared
+# by the workers through CACHES) or a dotted path, it is off when unset
+TWEETS_METRICS_CACHE = {
+    'BACKEND': os.getenv('TWEETS_METRICS_CACHE_BACKEND') or None,
+    'OPTIONS': {
+        'max_entries': int(
+            os.getenv('TWEETS_METRICS_CACHE_MAX_ENTRIES', 100000)
+        ),
+    },
+    'TTL': int(os.getenv('TWEETS_METRICS_CACHE_TTL', 30)),
+}
+
+# Authors of the tweets by id, the tweets of one author share a single
+# account across the responses. With RESOLVE_AUTHORS the recent search
+# no longer expands the authors of every page, the authors missing from
+# the cache or older than TTL seconds are fetched by the users lookup
+TWEETS_ACCOUNT_CACHE = {
+    'MAX_ENTRIES': int(os.getenv('TWEETS_ACCOUNT_CACHE_MAX_ENTRIES', 10000)),
+    'TTL': int(os.getenv('TWEETS_ACCOUNT_CACHE_TTL', 3600)),
+    'RESOLVE_AUTHORS':
+        os.getenv('TWEETS_ACCOUNT_CACHE_RESOLVE_AUTHORS', '') == 'true',
+}
+
+# Hashtags ingested from the filtered stream by `python manage.py
+# ingest_stream`, the first pages of these hashtags are answered out of
+# ring buffers of their SIZE newest tweets without calling twitter. The
+# BACKEND of the buffers is local (the process of the command only),
+# django (shared with the workers through CACHES) or a dotted path, it
+# is off when unset. A buffer not flushed for TTL seconds is dropped
+TWEETS_INGEST = {
+    'BACKEND': os.getenv('TWEETS_INGEST_BACKEND') or None,
+    'HASHTAGS': [
+        x.strip() for x in os.getenv('TWEETS_INGEST_HASHTAGS', '').split(',')
+        if x.strip()
+    ],
+    'SIZE': int(os.getenv('TWEETS_INGEST_SIZE', 300)),
+    'TTL': int(os.getenv('TWEETS_INGEST_TTL', 60)),
+    'FLUSH_INTERVAL': float(os.getenv('TWEETS_INGEST_FLUSH_INTERVAL', 1)),
+    'STALL_TIMEOUT': float(os.getenv('TWEETS_INGEST_STALL_TIMEOUT', 90)),
+}
+
+# Server-sent events of the new tweets of /live/hashtags/<hashtag> and
+# /live/users/<screen_name>, served under ASGI only. The subscribers of a
+# key share one loop reading its COUNT newest tweets every INTERVAL
+# seconds, each of them keeps up to MAX_QUEUE unsent batches. A worker
+# accepts MAX_SUBSCRIBERS connections and sends a keep-alive comment
+# after HEARTBEAT seconds without events
+TWEETS_LIVE = {
+    'COUNT': int(os.getenv('TWEETS_LIVE_COUNT', 100)),
+    'INTERVAL': float(os.getenv('TWEETS_LIVE_INTERVAL', 5)),
+    'MAX_QUEUE': int(os.getenv('TWEETS_LIVE_MAX_QUEUE', 16)),
+    'MAX_SUBSCRIBERS': int(os.getenv('TWEETS_LIVE_MAX_SUBSCRIBERS', 1000)),
+    'HEARTBEAT': float(os.getenv('TWEETS_LIVE_HEARTBEAT', 15)),
+}